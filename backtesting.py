@@ -1,30 +1,190 @@
 # backtesting.py
-import backtrader as bt
-from data import get_historical_data
-from strategy import PineStrategy
+import time
+import numpy as np
+import pandas as pd
+from data import get_ohlcv, parse_start
+from downloader import interval_to_ms
+from resample import index_ms, higher_tf_trend
+from result_cache import get_result_cache, result_key, summarize, bars_fingerprint
+from pine_params import resolve_params, htf_key
+from vector_engine import run_vector_backtest, with_filter_columns
+from incremental import run_incremental, get_snapshot_store
+import instrumentation
+from instrumentation import phase, observe
 
-def run_backtest(symbol='BTCUSDT', timeframe='5m', start_str='1 month ago UTC', strategy_params={}):
+COMMISSION = 0.00055  # 0.055% for example
+# How far an incremental run's window may start before the requested start
+INCREMENTAL_MAX_DRIFT_MS = 86_400_000
+
+def run_backtest(symbol='BTCUSDT', timeframe='5m', start_str='1 month ago UTC', strategy_params={},
+                 base_timeframe=None, engine="backtrader", use_result_cache=True, incremental=False,
+                 progress=None, data_out=None, profile_next=None):
+    # With base_timeframe the bars are resampled locally from the base series.
+    # progress(dict) is called as the run advances; a data_out dict receives
+    # the bars that were tested under 'df' (e.g. to draw the chart from).
+    # profile_next records per-bar next() latencies (backtrader engine only);
+    # by default instrumentation.PROFILE_NEXT decides.
+    if engine not in ("backtrader", "vector"):
+        raise ValueError(f"Unknown engine: {engine}")
+    if incremental:
+        return run_backtest_incremental(symbol, timeframe, start_str, strategy_params, base_timeframe,
+                                        progress, data_out)
+    with phase('backtest.load'):
+        df = get_ohlcv(symbol=symbol, interval=timeframe, start_str=start_str, base_interval=base_timeframe)
+        df = closed_bars(df, timeframe)
+    if data_out is not None:
+        data_out['df'] = df
+    return backtest_frame(df, timeframe, strategy_params, engine, use_result_cache, symbol, progress,
+                          profile_next)
+
+def backtest_frame(df, timeframe, strategy_params={}, engine="backtrader", use_result_cache=True, symbol=None,
+                   progress=None, profile_next=None):
+    # run_backtest on bars that are already loaded
+    if engine not in ("backtrader", "vector"):
+        raise ValueError(f"Unknown engine: {engine}")
+    if progress is not None:
+        progress({'stage': 'loaded', 'bars_total': len(df), 'bars_processed': 0})
+
+    # Both engines produce identical results, so they share cache entries.
+    # A hit has no cerebro to return.
+    cache = None
+    if use_result_cache and len(df):
+        cache = get_result_cache()
+        data_fp = bars_fingerprint(df)
+        key = result_key(data_fp, strategy_params, COMMISSION)
+        with phase('backtest.result_cache'):
+            hit = cache.get(key)
+        if hit is not None:
+            initial_value, final_value, _, trade_log = hit
+            if progress is not None:
+                progress({'stage': 'done', 'bars_total': len(df), 'bars_processed': len(df)})
+            return initial_value, final_value, trade_log, None
+
+    with phase('backtest.prepare'):
+        df = prepare_frame(df, timeframe, strategy_params)
+    if engine == "vector":
+        # Same fills, trades and final value as the backtrader path, computed
+        # with array operations; there is no cerebro to return
+        with phase('backtest.vector'):
+            initial_value, final_value, trade_log = run_vector_backtest(df, strategy_params, commission=COMMISSION)
+        cerebro = None
+    else:
+        initial_value, final_value, trade_log, cerebro = run_backtrader(df, strategy_params, progress=progress,
+                                                                         profile_next=profile_next)
+    if progress is not None:
+        progress({'stage': 'done', 'bars_total': len(df), 'bars_processed': len(df)})
+
+    if cache is not None:
+        t = index_ms(df.index)
+        with phase('backtest.result_cache_store'):
+            cache.put(key, initial_value, final_value, summarize(initial_value, final_value, trade_log),
+                      trade_log, fingerprint=data_fp, params=strategy_params, commission=COMMISSION,
+                      symbol=symbol, timeframe=timeframe, start_ms=int(t[0]), end_ms=int(t[-1]))
+    return initial_value, final_value, trade_log, cerebro
+
+def run_backtest_incremental(symbol='BTCUSDT', timeframe='5m', start_str='1 month ago UTC', strategy_params={},
+                             base_timeframe=None, progress=None, data_out=None):
+    # Refreshes the previous run for the same symbol, timeframe and params by
+    # simulating only the bars closed since. To resume, the window keeps the
+    # previous run's first bar while that is no more than
+    # INCREMENTAL_MAX_DRIFT_MS before the requested start; after that a full
+    # run re-anchors it. Results equal a full run over the same bars, with
+    # either engine, so the vector engine is used and no cerebro is returned.
+    store = get_snapshot_store()
+    key = (symbol, timeframe, base_timeframe, result_key('incremental', strategy_params, COMMISSION))
+    snapshot = store.get(key)
+    requested = parse_start(start_str)
+    # The first bar of a window is the first one opening at or after its start
+    if (snapshot is not None and
+            requested - INCREMENTAL_MAX_DRIFT_MS <= snapshot.anchor_ms < requested + interval_to_ms(timeframe)):
+        start_str = pd.Timestamp(snapshot.anchor_ms, unit='ms').strftime("%Y-%m-%d %H:%M:%S UTC")
+    else:
+        snapshot = None
+    with phase('backtest.load'):
+        df = get_ohlcv(symbol=symbol, interval=timeframe, start_str=start_str, base_interval=base_timeframe)
+        df = closed_bars(df, timeframe)
+    if data_out is not None:
+        data_out['df'] = df
+    if progress is not None:
+        progress({'stage': 'loaded', 'bars_total': len(df),
+                  'bars_processed': snapshot.bars if snapshot is not None else 0})
+    with phase('backtest.prepare'):
+        df = prepare_frame(df, timeframe, strategy_params)
+    with phase('backtest.incremental'):
+        initial_value, final_value, trade_log, snapshot = run_incremental(
+            df, strategy_params, snapshot, commission=COMMISSION)
+    if snapshot is not None:
+        store.put(key, snapshot)
+    if progress is not None:
+        progress({'stage': 'done', 'bars_total': len(df), 'bars_processed': len(df)})
+    return initial_value, final_value, trade_log, None
+
+def closed_bars(df, timeframe, now_ms=None):
+    # Drops the bar that is still forming. Its close keeps changing, so a
+    # relative window like '1 month ago UTC' only yields the same bars (and
+    # result cache hits) between bar boundaries without it.
+    if df.empty:
+        return df
+    now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+    t = index_ms(df.index)
+    return df.iloc[:int(np.searchsorted(t, now_ms - interval_to_ms(timeframe), side='right'))]
+
+def run_backtrader(df, strategy_params={}, indicator_cache=None, progress=None, profile_next=None):
+    # backtrader is only imported by the runs that use it
+    import backtrader as bt
+    from strategy import PineStrategy, ProfiledPineStrategy, ProgressAnalyzer
+    if profile_next is None:
+        profile_next = instrumentation.PROFILE_NEXT
+    strategy = ProfiledPineStrategy if profile_next else PineStrategy
     cerebro = bt.Cerebro()
     cerebro.optreturn = False  # might help if we want certain data
-    cerebro.addstrategy(PineStrategy, **strategy_params)
+    if indicator_cache is not None:
+        cerebro.addstrategy(strategy, indicatorCache=indicator_cache.bind(df), **strategy_params)
+    else:
+        cerebro.addstrategy(strategy, **strategy_params)
+    with phase('backtest.feed'):
+        cerebro.adddata(make_feed(df))
+    if progress is not None:
+        cerebro.addanalyzer(ProgressAnalyzer, callback=progress, total=len(df))
     
-    df = get_historical_data(symbol=symbol, interval=timeframe, start_str=start_str)
-    data = bt.feeds.PandasData(dataname=df)
-    cerebro.adddata(data)
-    
-    cerebro.broker.setcommission(commission=0.00055)  # 0.055% for example
+    cerebro.broker.setcommission(commission=COMMISSION)
 
     initial_value = cerebro.broker.getvalue()
-    results = cerebro.run()
+    with phase('backtest.cerebro_run'):
+        results = cerebro.run()
     final_value = cerebro.broker.getvalue()
     
     strat = results[0]
-    trade_log = getattr(strat, 'trade_log', [])
+    trade_log = strat.trade_log
+    if profile_next:
+        observe('strategy_next_seconds', strat.next_seconds)
     
     return initial_value, final_value, trade_log, cerebro
 
+def prepare_frame(df, timeframe, strategy_params):
+    # Adds the precomputed columns the enabled filters read (see PineData)
+    params = resolve_params(strategy_params)
+    df = with_filter_columns(df, params)
+    if not params['enableHigherTFFilter']:
+        return df
+    # The higher timeframe is derived from df itself instead of another
+    # download. The frame is tagged with what the trend was built for (see
+    # vector_engine._htf_column).
+    key = htf_key(params)
+    out = df.assign(htf_trend=higher_tf_trend(df, timeframe, *key))
+    out.attrs = dict(df.attrs, htf_key=key)
+    return out
+
+def make_feed(df):
+    import backtrader as bt
+    from strategy import PineData, PINE_COLUMNS
+    columns = {name: name if name in df else None for name in PINE_COLUMNS}
+    if any(columns.values()):
+        return PineData(dataname=df, **columns)
+    return bt.feeds.PandasData(dataname=df)
+
 if __name__ == "__main__":
-    init_val, final_val, trades, cerebro = run_backtest()
+    init_val, final_val, trades, cerebro = run_backtest(use_result_cache=False)
     print(f"Initial Value: {init_val}")
     print(f"Final Value: {final_val}")
     print("Trades:")
@@ -0,0 +1,188 @@
+# batch_runner.py
+import os
+import csv
+import time
+import argparse
+import traceback
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+import pandas as pd
+from data import get_ohlcv
+from resample import resample_ohlcv
+from backtesting import backtest_frame, closed_bars
+
+# Backtests over a symbol x timeframe matrix. Downloads (I/O bound) run on a
+# thread pool and backtests (CPU bound) on a process pool, so the next
+# symbols load while earlier ones are being tested. Results stream out as
+# they finish; a failed load or backtest becomes an error row instead of
+# stopping the batch.
+
+SUMMARY_FIELDS = ('symbol', 'timeframe', 'status', 'bars', 'initial_value', 'final_value', 'net_profit',
+                  'trades', 'load_s', 'backtest_s', 'error')
+DEFAULT_IO_WORKERS = 8
+
+
+def load_symbol(symbol, timeframes, start_str, base_timeframe=None):
+    # {timeframe: bars} for one symbol. With a base timeframe the symbol is
+    # downloaded once and every timeframe is resampled from it locally.
+    if base_timeframe:
+        base = get_ohlcv(symbol=symbol, interval=base_timeframe, start_str=start_str)
+        frames = {tf: base if tf == base_timeframe else resample_ohlcv(base, tf) for tf in timeframes}
+    else:
+        frames = {tf: get_ohlcv(symbol=symbol, interval=tf, start_str=start_str) for tf in timeframes}
+    return {tf: closed_bars(df, tf) for tf, df in frames.items()}
+
+
+def backtest_task(symbol, timeframe, df, strategy_params, engine, use_result_cache):
+    # Runs in a pool process; returns a picklable summary row
+    t0 = time.perf_counter()
+    initial_value, final_value, trade_log, _ = backtest_frame(
+        df, timeframe, strategy_params, engine, use_result_cache, symbol)
+    return {
+        'symbol': symbol,
+        'timeframe': timeframe,
+        'status': 'ok',
+        'bars': len(df),
+        'initial_value': initial_value,
+        'final_value': final_value,
+        'net_profit': final_value - initial_value,
+        'trades': len(trade_log),
+        'backtest_s': time.perf_counter() - t0,
+    }
+
+
+def _error_row(symbol, timeframe, exc, **extra):
+    row = {'symbol': symbol, 'timeframe': timeframe, 'status': 'error',
+           'error': ''.join(traceback.format_exception_only(type(exc), exc)).strip()}
+    row.update(extra)
+    return row
+
+
+class BatchRunner:
+    def __init__(self, symbols, timeframes, start_str='1 month ago UTC', strategy_params=None,
+                 base_timeframe=None, engine="vector", io_workers=DEFAULT_IO_WORKERS, cpu_workers=None,
+                 use_result_cache=True):
+        self.symbols = list(symbols)
+        self.timeframes = list(timeframes)
+        self.start_str = start_str
+        self.strategy_params = dict(strategy_params or {})
+        self.base_timeframe = base_timeframe
+        self.engine = engine
+        self.io_workers = io_workers
+        self.cpu_workers = cpu_workers
+        self.use_result_cache = use_result_cache
+        self.timings = {}
+
+    def __iter__(self):
+        # Yields one summary row per (symbol, timeframe) in completion order
+        started = time.perf_counter()
+        load_total = backtest_total = 0.0
+        done = failed = 0
+        with ThreadPoolExecutor(self.io_workers) as io_pool, ProcessPoolExecutor(self.cpu_workers) as cpu_pool:
+            pending = {}
+            for symbol in self.symbols:
+                future = io_pool.submit(self._timed_load, symbol)
+                pending[future] = ('load', symbol, None, None)
+            while pending:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    stage, symbol, timeframe, load_s = pending.pop(future)
+                    if stage == 'load':
+                        try:
+                            frames, load_s = future.result()
+                        except Exception as exc:
+                            for tf in self.timeframes:
+                                failed += 1
+                                yield _error_row(symbol, tf, exc)
+                            continue
+                        load_total += load_s
+                        for tf, df in frames.items():
+                            job = cpu_pool.submit(backtest_task, symbol, tf, df, self.strategy_params,
+                                                  self.engine, self.use_result_cache)
+                            pending[job] = ('backtest', symbol, tf, load_s / len(frames))
+                        continue
+                    try:
+                        row = future.result()
+                    except Exception as exc:
+                        failed += 1
+                        yield _error_row(symbol, timeframe, exc, load_s=load_s)
+                        continue
+                    row['load_s'] = load_s
+                    backtest_total += row['backtest_s']
+                    done += 1
+                    yield row
+        wall = time.perf_counter() - started
+        self.timings = {
+            'wall_s': wall,
+            'load_s': load_total,
+            'backtest_s': backtest_total,
+            'runs': done,
+            'failed': failed,
+            'runs_per_s': done / wall if wall else 0.0,
+        }
+
+    def _timed_load(self, symbol):
+        t0 = time.perf_counter()
+        frames = load_symbol(symbol, self.timeframes, self.start_str, self.base_timeframe)
+        return frames, time.perf_counter() - t0
+
+
+def run_batch(symbols, timeframes, start_str='1 month ago UTC', strategy_params=None, base_timeframe=None,
+              engine="vector", io_workers=DEFAULT_IO_WORKERS, cpu_workers=None, use_result_cache=True,
+              summary_path=None, on_result=None):
+    # Collects BatchRunner's rows into a summary DataFrame, appending each row
+    # to summary_path (CSV) and calling on_result(row) as it arrives.
+    # Returns (summary, timings).
+    runner = BatchRunner(symbols, timeframes, start_str, strategy_params, base_timeframe, engine,
+                         io_workers, cpu_workers, use_result_cache)
+    rows = []
+    out = writer = None
+    if summary_path:
+        out = open(summary_path, 'w', newline='')
+        writer = csv.DictWriter(out, fieldnames=SUMMARY_FIELDS)
+        writer.writeheader()
+    try:
+        for row in runner:
+            rows.append(row)
+            if writer is not None:
+                writer.writerow(row)
+                out.flush()
+            if on_result is not None:
+                on_result(row)
+    finally:
+        if out is not None:
+            out.close()
+    summary = pd.DataFrame(rows, columns=SUMMARY_FIELDS)
+    return summary, runner.timings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backtest a symbol x timeframe matrix")
+    parser.add_argument('--symbols', nargs='+', default=['BTCUSDT', 'ETHUSDT'])
+    parser.add_argument('--symbols-file', help="one symbol per line")
+    parser.add_argument('--timeframes', nargs='+', default=['5m', '15m', '1h'])
+    parser.add_argument('--start', default='1 month ago UTC')
+    parser.add_argument('--base-timeframe', default='1m')
+    parser.add_argument('--engine', default='vector', choices=['vector', 'backtrader'])
+    parser.add_argument('--io-workers', type=int, default=DEFAULT_IO_WORKERS)
+    parser.add_argument('--cpu-workers', type=int, default=os.cpu_count())
+    parser.add_argument('--summary', default='batch_summary.csv')
+    args = parser.parse_args()
+
+    symbols = args.symbols
+    if args.symbols_file:
+        with open(args.symbols_file) as f:
+            symbols = [line.strip() for line in f if line.strip()]
+
+    def show(row):
+        if row['status'] == 'ok':
+            print(f"{row['symbol']:>12} {row['timeframe']:>4}  net {row['net_profit']:>10.2f}  "
+                  f"trades {row['trades']:>4}  load {row['load_s']:.2f}s  test {row['backtest_s']:.2f}s")
+        else:
+            print(f"{row['symbol']:>12} {row['timeframe']:>4}  ERROR {row['error']}")
+
+    _, timings = run_batch(symbols, args.timeframes, args.start, base_timeframe=args.base_timeframe,
+                           engine=args.engine, io_workers=args.io_workers, cpu_workers=args.cpu_workers,
+                           summary_path=args.summary, on_result=show)
+    print(f"{timings['runs']} runs, {timings['failed']} failed in {timings['wall_s']:.1f}s "
+          f"({timings['runs_per_s']:.2f} runs/s); load {timings['load_s']:.1f}s, "
+          f"backtest {timings['backtest_s']:.1f}s summed over workers")
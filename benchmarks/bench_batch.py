@@ -0,0 +1,63 @@
+# benchmarks/bench_batch.py
+# Backtests per second for a grid of parameter sets: run_vector_batch against
+# one run_vector_backtest call per set, and a few backtrader runs for scale.
+# Also checks that the batch returns exactly what the single runs return.
+# Run from the repo root: python -m benchmarks.bench_batch --bars 43200 --sets 64
+import sys
+import time
+import random
+import argparse
+from backtesting import run_backtrader
+from vector_engine import run_vector_backtest, run_vector_batch
+from synthetic import random_walk_ohlcv
+
+
+def param_grid(count, seed=0):
+    rng = random.Random(seed)
+    sets = []
+    for _ in range(count):
+        long_fast = rng.randint(10, 60)
+        short_fast = rng.randint(3, 15)
+        sets.append({
+            'longTermFastLen': long_fast,
+            'longTermSlowLen': long_fast + rng.randint(10, 120),
+            'shortTermFastLen': short_fast,
+            'shortTermSlowLen': short_fast + rng.randint(3, 30),
+            'fixedStopLossPct': rng.choice((0.5, 1.0, 2.0)),
+            'fixedTakeProfitPct': rng.choice((1.0, 2.0, 4.0)),
+        })
+    return sets
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - t0
+
+
+def main(bars=43_200, sets=64, bt_runs=2, chunk_size=32):
+    df = random_walk_ohlcv(bars, start_price=100.0)
+    grid = param_grid(sets)
+
+    batch, batch_s = timed(lambda: run_vector_batch(df, grid, chunk_size=chunk_size))
+    single, single_s = timed(lambda: [run_vector_backtest(df, p) for p in grid])
+    _, bt_s = timed(lambda: [run_backtrader(df, p) for p in grid[:bt_runs]])
+
+    print(f"{bars} bars, {sets} parameter sets")
+    print(f"  batch        {batch_s:8.2f}s  {sets / batch_s:10.1f} backtests/s")
+    print(f"  vector x{sets:<4}{single_s:8.2f}s  {sets / single_s:10.1f} backtests/s")
+    if bt_runs:
+        print(f"  backtrader   {bt_s:8.2f}s  {bt_runs / bt_s:10.1f} backtests/s  ({bt_runs} runs)")
+    mismatches = sum(a != b for a, b in zip(batch, single))
+    print(f"  batch results identical to single runs: {mismatches == 0}")
+    return mismatches
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--bars', type=int, default=43_200)
+    parser.add_argument('--sets', type=int, default=64)
+    parser.add_argument('--bt-runs', type=int, default=2)
+    parser.add_argument('--chunk-size', type=int, default=32)
+    args = parser.parse_args()
+    sys.exit(1 if main(args.bars, args.sets, args.bt_runs, args.chunk_size) else 0)
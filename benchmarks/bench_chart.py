@@ -0,0 +1,67 @@
+# benchmarks/bench_chart.py
+# Size of the price chart's JSON payload and the time to build and serialize
+# it: every bar as one candle against the decimated first view, plus zoomed
+# windows re-rendered from the full-resolution bars. Browser render time
+# grows with the candle count, so candles and bytes stand in for it here.
+# Run from the repo root: python -m benchmarks.bench_chart --bars 43200 129600
+import time
+import argparse
+import plotly.graph_objects as go
+from chart import price_figure, decimate, DEFAULT_MAX_CANDLES
+from synthetic import random_walk_ohlcv
+
+
+def full_figure(df):
+    # What the dashboards sent before: one candle per bar
+    fig = go.Figure(data=[go.Candlestick(x=df.index, open=df['open'], high=df['high'], low=df['low'],
+                                         close=df['close'])])
+    fig.update_layout(template='plotly_dark')
+    return fig
+
+
+def measure(build, repeat=3):
+    # (payload bytes, best build + to_json seconds)
+    best, size = float('inf'), 0
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        payload = build().to_json()
+        best = min(best, time.perf_counter() - t0)
+        size = len(payload)
+    return size, best
+
+
+def check_ohlc(df, max_candles):
+    # The aggregated candles keep the extremes and the first/last prices
+    bars, _ = decimate(df, max_candles)
+    return (bars['high'].max() == df['high'].max() and bars['low'].min() == df['low'].min()
+            and bars['open'].iat[0] == df['open'].iat[0] and bars['close'].iat[-1] == df['close'].iat[-1])
+
+
+def main(bar_counts=(43_200, 129_600), max_candles=DEFAULT_MAX_CANDLES, repeat=3):
+    for bars in bar_counts:
+        df = random_walk_ohlcv(bars)
+        span = df.index[-1] - df.index[0]
+        print(f"{bars} bars")
+        size, seconds = measure(lambda: full_figure(df), repeat)
+        print(f"  full          {bars:>7} candles  {size / 1e6:7.2f} MB  {seconds * 1000:8.1f} ms")
+        size, seconds = measure(lambda: price_figure(df, 'SYNTH', '1m', max_candles=max_candles), repeat)
+        candles = len(decimate(df, max_candles)[0])
+        print(f"  decimated     {candles:>7} candles  {size / 1e6:7.2f} MB  {seconds * 1000:8.1f} ms")
+        for fraction in (0.25, 0.02):
+            x1 = df.index[-1]
+            x0 = x1 - span * fraction
+            x_range = (str(x0), str(x1))
+            size, seconds = measure(lambda: price_figure(df, 'SYNTH', '1m', x_range=x_range,
+                                                         max_candles=max_candles), repeat)
+            candles = len(decimate(df.loc[x0:x1], max_candles)[0])
+            print(f"  zoom {fraction:>5.0%}    {candles:>7} candles  {size / 1e6:7.2f} MB  {seconds * 1000:8.1f} ms")
+        print(f"  aggregation keeps OHLC extremes: {check_ohlc(df, max_candles)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--bars', type=int, nargs='+', default=[43_200, 129_600])
+    parser.add_argument('--max-candles', type=int, default=DEFAULT_MAX_CANDLES)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    main(args.bars, args.max_candles, args.repeat)
@@ -0,0 +1,33 @@
+# benchmarks/bench_ga.py
+# Generations per second of the GA optimizer for different worker counts,
+# on synthetic 5m bars. Early stopping is disabled so every run does the
+# same number of generations; the seed fixes the search path.
+# Run from the repo root: python -m benchmarks.bench_ga --processes 1 2 4 8
+import os
+import time
+import argparse
+from ga_optimization import optimize_frame
+from synthetic import random_walk_ohlcv
+
+
+def main(bars=8640, processes=(1, 2, 4), population=64, generations=10, seed=1):
+    df = random_walk_ohlcv(bars, interval='5m', start_price=100.0)
+    print(f"{bars} bars, population {population}, {generations} generations, {os.cpu_count()} cpus")
+    base = None
+    for procs in processes:
+        t0 = time.perf_counter()
+        best, _ = optimize_frame(df, processes=procs, population_size=population, generations=generations,
+                                 patience=generations + 1, seed=seed)
+        rate = generations / (time.perf_counter() - t0)
+        base = base or rate
+        print(f"  {procs:>3} processes  {rate:8.2f} gens/s  speedup {rate / base:5.2f}x  best {best:.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--bars', type=int, default=8640)
+    parser.add_argument('--processes', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--population', type=int, default=64)
+    parser.add_argument('--generations', type=int, default=10)
+    args = parser.parse_args()
+    main(args.bars, args.processes, args.population, args.generations)
@@ -0,0 +1,77 @@
+# benchmarks/bench_live_api.py
+# Submitting a batch of orders across symbols through the blocking
+# LiveTrader (one call after another) and through AsyncLiveTrader (symbols
+# concurrently, at most --max-in-flight calls out), against the local mock
+# exchange. Reports wall time, call latency percentiles, the most calls
+# seen in flight and that every amount reached the exchange rounded.
+# Run from the repo root: python -m benchmarks.bench_live_api --orders 200
+import time
+import random
+import asyncio
+import argparse
+import numpy as np
+from live_api import LiveTrader, AsyncLiveTrader
+from benchmarks.mock_exchange import MockExchange, SyncMockExchange, SYMBOLS
+
+
+def make_orders(n, seed=0):
+    rng = random.Random(seed)
+    return [{'symbol': rng.choice(SYMBOLS), 'order_type': 'market', 'side': rng.choice(('buy', 'sell')),
+             'amount': rng.uniform(0.001, 2.0)} for _ in range(n)]
+
+
+def on_step(amount, step=0.0001):
+    return abs(amount / step - round(amount / step)) < 1e-6
+
+
+def bench_sync(orders, latency, jitter):
+    exchange = SyncMockExchange(latency=latency, jitter=jitter)
+    trader = LiveTrader(exchange=exchange)
+    latencies = []
+    t0 = time.perf_counter()
+    for order in orders:
+        started = time.perf_counter()
+        trader.create_order(**order)
+        latencies.append(time.perf_counter() - started)
+    elapsed = time.perf_counter() - t0
+    p50, p99 = np.percentile(np.asarray(latencies) * 1e3, (50, 99))
+    return {'seconds': elapsed, 'p50_ms': p50, 'p99_ms': p99, 'max_in_flight': exchange.max_in_flight,
+            'rounded': all(on_step(o['amount']) for o in exchange.orders)}
+
+
+async def bench_async(orders, latency, jitter, max_in_flight, rate_limit_ms):
+    exchange = MockExchange(latency=latency, jitter=jitter, rate_limit_ms=rate_limit_ms)
+    async with AsyncLiveTrader(exchange=exchange, max_in_flight=max_in_flight) as trader:
+        t0 = time.perf_counter()
+        results = await trader.create_orders(orders)
+        elapsed = time.perf_counter() - t0
+        stats = trader.latency_stats()['create_order']
+    failed = [r for r in results if isinstance(r, Exception)]
+    assert not failed, failed[:3]
+    return {'seconds': elapsed, 'p50_ms': stats['p50'], 'p99_ms': stats['p99'],
+            'max_in_flight': exchange.max_in_flight, 'rounded': all(on_step(o['amount']) for o in exchange.orders),
+            'load_markets': exchange.calls.get('load_markets', 0)}
+
+
+def main(n=200, latency=0.05, jitter=0.02, max_in_flight=8, rate_limit_ms=10):
+    orders = make_orders(n)
+    print(f"{n} market orders over {len(SYMBOLS)} symbols, {latency * 1e3:.0f}ms (+{jitter * 1e3:.0f}ms) per call")
+    sync = bench_sync(orders, latency, jitter)
+    print(f"  LiveTrader        {sync['seconds']:7.2f}s  {n / sync['seconds']:7.1f} orders/s  "
+          f"p50 {sync['p50_ms']:6.1f}ms  p99 {sync['p99_ms']:6.1f}ms  in flight {sync['max_in_flight']}  "
+          f"rounded {sync['rounded']}")
+    result = asyncio.run(bench_async(orders, latency, jitter, max_in_flight, rate_limit_ms))
+    print(f"  AsyncLiveTrader   {result['seconds']:7.2f}s  {n / result['seconds']:7.1f} orders/s  "
+          f"p50 {result['p50_ms']:6.1f}ms  p99 {result['p99_ms']:6.1f}ms  in flight {result['max_in_flight']}  "
+          f"rounded {result['rounded']}  load_markets {result['load_markets']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--orders', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--jitter', type=float, default=0.02)
+    parser.add_argument('--max-in-flight', type=int, default=8)
+    parser.add_argument('--rate-limit-ms', type=int, default=10)
+    args = parser.parse_args()
+    main(args.orders, args.latency, args.jitter, args.max_in_flight, args.rate_limit_ms)
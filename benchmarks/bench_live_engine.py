@@ -0,0 +1,54 @@
+# benchmarks/bench_live_engine.py
+# Replays synthetic bars through the live signal engine: checks its trades
+# against the vector engine's backtest of the same bars (prices stay below
+# the starting cash, so the backtest's broker never refuses an order) and
+# reports the cost per bar and the bar-to-order latency.
+# Run from the repo root: python -m benchmarks.bench_live_engine --bars 200000
+import time
+import argparse
+import numpy as np
+from vector_engine import run_vector_backtest
+from live_engine import LiveSignalEngine, ReplayTrader, frame_bars
+from synthetic import regime_switching_ohlcv
+
+PARAM_SETS = [
+    {},
+    {'longTermFastLen': 10, 'longTermSlowLen': 20, 'shortTermFastLen': 2, 'shortTermSlowLen': 4,
+     'fixedStopLossPct': 0.1, 'fixedTakeProfitPct': 0.1},
+    {'longTermFastLen': 20, 'longTermSlowLen': 60, 'shortTermFastLen': 5, 'shortTermSlowLen': 12},
+    {'exitMethod': 'Trailing'},
+    {'longTermFastLen': 20, 'longTermSlowLen': 60, 'shortTermFastLen': 5, 'shortTermSlowLen': 12,
+     'exitMethod': 'ATR'},
+    {'longTermFastLen': 20, 'longTermSlowLen': 60, 'shortTermFastLen': 5, 'shortTermSlowLen': 12,
+     'useAtrStopLoss': True, 'enableSessionFilter': True},
+]
+
+
+def main(bars=200_000, seed=0):
+    df = regime_switching_ohlcv(bars, seed=seed, start_price=100.0)
+    print(f"{bars} bars")
+    for params in PARAM_SETS:
+        _, _, expected = run_vector_backtest(df, params)
+        engine = LiveSignalEngine(ReplayTrader(), 'REPLAY', params)
+        per_bar = np.empty(bars)
+        decisions = []
+        for i, bar in enumerate(frame_bars(df)):
+            t0 = time.perf_counter()
+            order = engine.on_bar(bar, t0)
+            t1 = time.perf_counter()
+            per_bar[i] = t1 - t0
+            if order is not None:
+                decisions.append(t1 - t0)
+        status = "ok" if engine.trade_log == expected else "MISMATCH"
+        p50, p99 = np.percentile(per_bar * 1e6, (50, 99))
+        to_order = np.percentile(np.asarray(decisions) * 1e6, 99) if decisions else float('nan')
+        print(f"  {status:>8}  trades={len(expected):<6} {bars / per_bar.sum():9.0f} bars/s  "
+              f"p50 {p50:5.1f}us  p99 {p99:5.1f}us  bar->order p99 {to_order:6.1f}us  {params}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--bars', type=int, default=200_000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    main(args.bars, args.seed)
@@ -0,0 +1,37 @@
+# benchmarks/bench_monte_carlo.py
+# Times monte_carlo.simulate for each resampling method on a synthetic
+# trade log (normal P&Ls with a slight edge), and prints the percentiles it
+# produces. Times are the best of --repeat runs. Backtest jobs run every
+# method, permutation with monte_carlo.METHOD_SIMULATIONS paths.
+# Run from the repo root: python -m benchmarks.bench_monte_carlo --simulations 10000 --trades 5000
+import time
+import argparse
+import numpy as np
+from monte_carlo import simulate, summarize, METHODS
+
+
+def main(simulations=10_000, trades=5_000, repeat=3, seed=0):
+    pnl = np.random.default_rng(seed).normal(2.0, 50.0, trades)
+    initial_value = 10_000.0
+    print(f"{simulations} simulations x {trades} trades")
+    for method in METHODS:
+        best = float('inf')
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            dist = simulate(pnl, initial_value, method, simulations, seed=seed)
+            best = min(best, time.perf_counter() - t0)
+        s = summarize({method: dist}, initial_value)[method]
+        print(f"  {method:16} {best:6.3f}s  {simulations * trades / best / 1e6:6.1f}M trade-steps/s  "
+              f"final p5/p50/p95 {s['final_equity']['p5']:.0f}/{s['final_equity']['p50']:.0f}/"
+              f"{s['final_equity']['p95']:.0f}  max dd p95 {s['max_drawdown_pct']['p95']:.1%}  "
+              f"ruin {s['risk_of_ruin']:.2%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--simulations', type=int, default=10_000)
+    parser.add_argument('--trades', type=int, default=5_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    main(args.simulations, args.trades, args.repeat, args.seed)
@@ -0,0 +1,73 @@
+# benchmarks/bench_parse.py
+# Peak traced memory of kline parsing: the original list -> 12-column
+# DataFrame -> astype path against parsing pages straight into KlineColumns.
+# Run from the repo root: python -m benchmarks.bench_parse --bars 2000000
+import gc
+import time
+import argparse
+import tracemalloc
+import pandas as pd
+from data import KlineColumns
+from benchmarks.mock_binance import MockBinance
+
+MINUTE_MS = 60_000
+
+
+def make_pages(bars, start_ts=1_600_000_000_000):
+    mock = MockBinance()
+    for first in range(0, bars, 1000):
+        count = min(1000, bars - first)
+        yield [mock.kline(start_ts + (first + i) * MINUTE_MS, MINUTE_MS) for i in range(count)]
+
+
+def legacy_parse(pages):
+    data = []
+    for page in pages:
+        data.extend(page)
+    df = pd.DataFrame(data, columns=[
+        'open_time', 'open', 'high', 'low', 'close', 'volume',
+        'close_time', 'quote_asset_volume', 'number_of_trades',
+        'taker_buy_base_asset_volume', 'taker_buy_quote_asset_volume', 'ignore'
+    ])
+    df['open_time'] = pd.to_datetime(df['open_time'], unit='ms')
+    df.set_index('open_time', inplace=True)
+    df = df[['open', 'high', 'low', 'close', 'volume']].astype(float)
+    return df
+
+
+def columnar_parse(pages, bars):
+    buf = KlineColumns(bars)
+    for page in pages:
+        buf.append_klines(page)
+    return buf.frame()
+
+
+def measure(parse, bars):
+    # Pages are generated lazily inside the traced region, like a download
+    # would hand them over, so only the parser decides how many are alive.
+    gc.collect()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    df = parse(make_pages(bars))
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    final = df.memory_usage(index=True, deep=True).sum()
+    return {'bars': len(df), 'seconds': elapsed, 'peak_bytes': peak, 'final_bytes': int(final),
+            'peak_ratio': peak / final}
+
+
+def bench(bars=500_000):
+    return {
+        'legacy': measure(legacy_parse, bars),
+        'columnar': measure(lambda pages: columnar_parse(pages, bars), bars),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--bars', type=int, default=500_000)
+    args = parser.parse_args()
+    for name, r in bench(args.bars).items():
+        print(f"{name:>9}: {r['bars']} bars  {r['seconds']:.2f}s  peak {r['peak_bytes'] / 2**20:.0f} MiB  "
+              f"final {r['final_bytes'] / 2**20:.0f} MiB  ({r['peak_ratio']:.1f}x)")
@@ -0,0 +1,98 @@
+# benchmarks/bench_shared_memory.py
+# Total proportional set size (PSS) of N workers that each need the whole
+# dataset: attached through SharedOHLCV versus unpickled per worker. The
+# shared total includes the publisher's share of the segment: PSS splits a
+# shared page between every process mapping it, so the workers' own PSS
+# alone grows from half the dataset (1 worker) towards all of it as the
+# publisher's share shrinks, while the pages themselves exist once.
+# Linux only (reads /proc/self/smaps_rollup and /proc/self/smaps).
+# Run from the repo root: python -m benchmarks.bench_shared_memory
+import argparse
+import multiprocessing
+import numpy as np
+import pandas as pd
+from shared_data import SharedOHLCV, attach
+from synthetic import random_walk_ohlcv
+
+_df = None
+
+
+def _pss_bytes():
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            if line.startswith('Pss:'):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def _segment_pss_bytes(name):
+    # PSS of this process's mapping of the shared memory segment `name`
+    total, inside = 0, False
+    with open('/proc/self/smaps') as f:
+        for line in f:
+            fields = line.split()
+            if '-' in fields[0] and ':' not in fields[0]:
+                inside = len(fields) >= 6 and fields[-1].endswith('/' + name.lstrip('/'))
+            elif inside and fields[0] == 'Pss:':
+                total += int(fields[1]) * 1024
+    return total
+
+
+def _init_shared(handle):
+    global _df
+    _df = attach(handle)
+
+
+def _init_copy(df):
+    global _df
+    _df = df
+
+
+def _init_empty():
+    global _df
+    _df = pd.DataFrame({name: np.zeros(1) for name in ('open', 'high', 'low', 'close', 'volume')})
+
+
+def _touch(_):
+    # Read every column the way a backtest would, then report our footprint
+    total = float(_df['close'].to_numpy().sum() + _df['volume'].to_numpy().sum())
+    total += float(_df['open'].to_numpy().sum() + _df['high'].to_numpy().sum() + _df['low'].to_numpy().sum())
+    return _pss_bytes(), total
+
+
+def _run(processes, initializer, initargs, shared=None):
+    # Summed worker PSS, plus the publisher's share of the segment while the
+    # workers still map it
+    ctx = multiprocessing.get_context('spawn')
+    with ctx.Pool(processes, initializer=initializer, initargs=initargs) as pool:
+        results = pool.map(_touch, range(processes), chunksize=1)
+        publisher = _segment_pss_bytes(shared.shm.name) if shared is not None else 0
+    return sum(r[0] for r in results) + publisher
+
+
+def bench(bars=2_000_000, worker_counts=(1, 2, 4, 8)):
+    df = random_walk_ohlcv(bars)
+    dataset_bytes = int(df.memory_usage(index=True).sum())
+    rows = []
+    with SharedOHLCV(df) as shared:
+        for n in worker_counts:
+            # Interpreter + imports dominate a fresh worker; subtract them so
+            # only the memory attributable to the dataset is compared.
+            baseline = _run(n, _init_empty, ())
+            rows.append({
+                'workers': n,
+                'dataset_bytes': dataset_bytes,
+                'shared_pss_bytes': _run(n, _init_shared, (shared.handle,), shared) - baseline,
+                'copied_pss_bytes': _run(n, _init_copy, (df,)) - baseline,
+            })
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--bars', type=int, default=2_000_000)
+    args = parser.parse_args()
+    for r in bench(args.bars):
+        print(f"workers={r['workers']}  dataset {r['dataset_bytes'] / 2**20:.0f} MiB  "
+              f"dataset PSS across workers: shared {r['shared_pss_bytes'] / 2**20:.0f} MiB  "
+              f"copied {r['copied_pss_bytes'] / 2**20:.0f} MiB")
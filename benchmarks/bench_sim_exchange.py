@@ -0,0 +1,67 @@
+# benchmarks/bench_sim_exchange.py
+# Drives the live signal path (LiveSignalEngine -> LiveTrader -> exchange)
+# with bars replayed by the local exchange simulator: throughput in bars and
+# orders per second, bar-to-order latency, and the simulator's balances at
+# the end. Without fees or slippage the engine's trades must equal the
+# vector engine's backtest of the same bars. --speed replays at that many
+# times real time instead of as fast as possible.
+# Run from the repo root: python -m benchmarks.bench_sim_exchange --bars 200000
+import time
+import argparse
+import numpy as np
+from live_api import LiveTrader
+from live_engine import LiveSignalEngine
+from sim_exchange import SimExchange
+from vector_engine import run_vector_backtest
+from synthetic import regime_switching_ohlcv
+
+FAST_PARAMS = {'longTermFastLen': 10, 'longTermSlowLen': 20, 'shortTermFastLen': 2, 'shortTermSlowLen': 4,
+               'fixedStopLossPct': 0.1, 'fixedTakeProfitPct': 0.1}
+
+
+def drive(df, params, speed=None, **sim_kwargs):
+    sim = SimExchange(df, 'BTC/USDT', allow_short=True, **sim_kwargs)
+    engine = LiveSignalEngine(LiveTrader(exchange=sim), 'BTC/USDT', params)
+    to_order = []
+    t0 = time.perf_counter()
+    for bar in sim.replay(speed):
+        received = time.perf_counter()
+        if engine.on_bar(bar, received) is not None:
+            to_order.append(time.perf_counter() - received)
+    elapsed = time.perf_counter() - t0
+    return sim, engine, elapsed, np.asarray(to_order)
+
+
+def report(name, df, sim, engine, elapsed, to_order):
+    p50, p99 = np.percentile(to_order * 1e6, (50, 99)) if len(to_order) else (float('nan'),) * 2
+    balance = sim.fetch_balance()
+    print(f"  {name:28} {len(df) / elapsed:9.0f} bars/s  {len(sim.orders) / elapsed:8.0f} orders/s  "
+          f"bar->order p50 {p50:6.1f}us p99 {p99:6.1f}us  "
+          f"{sim.base} {balance['total'][sim.base]:+.4f}  {sim.quote} {balance['total'][sim.quote]:.2f}")
+
+
+def main(bars=200_000, speed=None, speed_bars=2000):
+    df = regime_switching_ohlcv(bars, start_price=100.0)
+    _, _, expected = run_vector_backtest(df, FAST_PARAMS)
+    print(f"{bars} bars, {len(expected)} trades in the backtest")
+
+    sim, engine, elapsed, to_order = drive(df, FAST_PARAMS, taker_fee=0.0, maker_fee=0.0)
+    report("no fees", df, sim, engine, elapsed, to_order)
+    print(f"  trades match the backtest: {engine.trade_log == expected}")
+    sim, engine, elapsed, to_order = drive(df, FAST_PARAMS, slippage=0.0002)
+    report("0.1% fees, 2bp slippage", df, sim, engine, elapsed, to_order)
+
+    if speed:
+        part = df.iloc[:speed_bars]
+        sim, engine, elapsed, to_order = drive(part, FAST_PARAMS, speed=speed)
+        report(f"{speed:g}x real time", part, sim, engine, elapsed, to_order)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--bars', type=int, default=200_000)
+    parser.add_argument('--speed', type=float, default=None,
+                        help="also replay --speed-bars bars at this many times real time")
+    parser.add_argument('--speed-bars', type=int, default=2000)
+    args = parser.parse_args()
+    main(args.bars, args.speed, args.speed_bars)
@@ -0,0 +1,126 @@
+# benchmarks/bench_trade_log.py
+# Time and memory of the columnar TradeLog against the per-trade nested
+# dicts it replaced, for a parameter set that trades very often: building
+# the log from the vector engine's trades, recording trades one at a time as
+# PineStrategy does, and looking up where the chart markers go. Memory is
+# what the finished log holds on to.
+# Run from the repo root: python -m benchmarks.bench_trade_log --bars 200000
+import time
+import argparse
+import tracemalloc
+import pandas as pd
+import backtrader as bt
+from pine_params import resolve_params
+from strategy import num2ms
+from trade_log import TradeRecorder, DATE_FORMAT
+from vector_engine import (compute_indicators, entry_signals, first_bar, simulate, trade_log_from)
+from chart import marker_points
+from synthetic import random_walk_ohlcv
+
+FAST_PARAMS = {'longTermFastLen': 10, 'longTermSlowLen': 20, 'shortTermFastLen': 2, 'shortTermSlowLen': 4,
+               'fixedStopLossPct': 0.1, 'fixedTakeProfitPct': 0.1}
+
+
+def dict_log(trades, index):
+    # The nested-dict records the engines used to build
+    log = []
+    for entry_bar, exit_bar, side, entry_price, exit_price, pnl, reason in trades:
+        entry_dt = pd.Timestamp(index[entry_bar]).strftime(DATE_FORMAT)
+        exit_dt = pd.Timestamp(index[exit_bar]).strftime(DATE_FORMAT)
+        entry_fill = (entry_price, side, entry_dt)
+        exit_fill = (exit_price, -side, exit_dt)
+        buy, sell = (entry_fill, exit_fill) if side > 0 else (exit_fill, entry_fill)
+        log.append({
+            'Entry Date': entry_dt, 'Exit Date': exit_dt, 'Size': 0, 'Entry Price': entry_price,
+            'Profit': pnl, 'Exit Reason': reason,
+            'Entry Order': {"Type": "Buy", "Price": buy[0], "Size": buy[1], "Datetime": buy[2]},
+            'Exit Order': {"Type": "Sell", "Price": sell[0], "Size": sell[1], "Datetime": sell[2]},
+        })
+    return log
+
+
+def dict_record(nums, trades):
+    # PineStrategy's old notify_order / notify_trade: num2date + strftime per fill
+    log = []
+    for (open_num, close_num), (_, _, side, entry_price, exit_price, pnl, reason) in zip(nums, trades):
+        log.append({
+            'Entry Date': bt.num2date(open_num).strftime(DATE_FORMAT),
+            'Exit Date': bt.num2date(close_num).strftime(DATE_FORMAT),
+            'Size': 0, 'Entry Price': entry_price, 'Profit': pnl, 'Exit Reason': reason,
+            'Entry Order': {"Type": "Buy", "Price": entry_price, "Size": side,
+                            "Datetime": bt.num2date(open_num).strftime(DATE_FORMAT)},
+            'Exit Order': {"Type": "Sell", "Price": exit_price, "Size": -side,
+                           "Datetime": bt.num2date(close_num).strftime(DATE_FORMAT)},
+        })
+    return log
+
+
+def columnar_record(nums, trades):
+    recorder = TradeRecorder()
+    for (open_num, close_num), (_, _, side, entry_price, exit_price, pnl, reason) in zip(nums, trades):
+        open_ms, close_ms = num2ms(open_num), num2ms(close_num)
+        recorder.append(open_ms, close_ms, 0, entry_price, pnl, reason,
+                        (open_ms, entry_price, side), (close_ms, exit_price, -side))
+    return recorder.log()
+
+
+def dict_markers(df, log):
+    # The old per-trade `ts in df.index` / df.loc marker loop
+    xs, ys = [], []
+    for t in log:
+        for column in ('Entry Date', 'Exit Date'):
+            ts = pd.to_datetime(t[column])
+            if ts in df.index:
+                xs.append(ts)
+                ys.append(df.loc[ts, 'close'])
+    return xs, ys
+
+
+def measure(fn):
+    # (result, seconds, bytes the result holds on to); memory is traced in a
+    # second run so it does not slow the timed one
+    t0 = time.perf_counter()
+    fn()
+    seconds = time.perf_counter() - t0
+    tracemalloc.start()
+    result = fn()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, seconds, retained
+
+
+def main(bars=200_000, marker_trades=2000):
+    df = random_walk_ohlcv(bars, start_price=100.0)
+    params = resolve_params(FAST_PARAMS)
+    ind = compute_indicators(df, params)
+    long_sig, short_sig = entry_signals(ind, params, df)
+    _, _, _, trades = simulate(df['open'].to_numpy(), df['close'].to_numpy(), long_sig, short_sig,
+                               first_bar(params), params)
+    nums = [(bt.date2num(df.index[t[0]].to_pydatetime()), bt.date2num(df.index[t[1]].to_pydatetime()))
+            for t in trades]
+    print(f"{bars} bars, {len(trades)} trades")
+
+    rows = []
+    old, old_s, old_mem = measure(lambda: dict_log(trades, df.index))
+    new, new_s, new_mem = measure(lambda: trade_log_from(trades, df.index))
+    rows.append(("vector engine log", old_s, old_mem, new_s, new_mem))
+    _, old_s, old_mem = measure(lambda: dict_record(nums, trades))
+    _, new_s, new_mem = measure(lambda: columnar_record(nums, trades))
+    rows.append(("per-trade recording", old_s, old_mem, new_s, new_mem))
+    # The old marker loop is slow enough to only time it on the first trades
+    _, old_s, old_mem = measure(lambda: dict_markers(df, old[:marker_trades]))
+    _, new_s, new_mem = measure(lambda: (marker_points(df, new.slice(0, marker_trades)['entry_ms']),
+                                         marker_points(df, new.slice(0, marker_trades)['exit_ms'])))
+    rows.append((f"markers ({min(marker_trades, len(new))})", old_s, old_mem, new_s, new_mem))
+    print(f"  {'':20} {'dicts':>10} {'columns':>10} {'dict MB':>9} {'column MB':>10}")
+    for name, old_s, old_mem, new_s, new_mem in rows:
+        print(f"  {name:20} {old_s:9.3f}s {new_s:9.3f}s {old_mem / 1e6:9.2f} {new_mem / 1e6:10.2f}")
+    print(f"  records identical: {new.records() == old}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--bars', type=int, default=200_000)
+    parser.add_argument('--marker-trades', type=int, default=2000)
+    args = parser.parse_args()
+    main(args.bars, args.marker_trades)
@@ -0,0 +1,88 @@
+# benchmarks/check_parity.py
+# Trade-for-trade comparison of the vectorized engine against the backtrader
+# path on synthetic data, with and without the indicator cache. Exits
+# non-zero on the first mismatch.
+# Run from the repo root: python -m benchmarks.check_parity
+import sys
+import argparse
+from backtesting import run_backtrader, prepare_frame
+from vector_engine import run_vector_backtest
+from synthetic import random_walk_ohlcv
+from indicator_cache import IndicatorCache
+
+PARAM_SETS = [
+    {},
+    {'longTermFastLen': 20, 'longTermSlowLen': 60, 'shortTermFastLen': 5, 'shortTermSlowLen': 12},
+    {'longTermFastLen': 30, 'longTermSlowLen': 90, 'shortTermFastLen': 8, 'shortTermSlowLen': 21,
+     'fixedStopLossPct': 0.5, 'fixedTakeProfitPct': 0.8},
+    {'longTermFastLen': 10, 'longTermSlowLen': 25, 'shortTermFastLen': 3, 'shortTermSlowLen': 30,
+     'atrPeriod': 40},
+    {'longTermFastLen': 20, 'longTermSlowLen': 60, 'shortTermFastLen': 5, 'shortTermSlowLen': 12,
+     'exitMethod': 'Trailing'},
+    {'longTermFastLen': 20, 'longTermSlowLen': 60, 'shortTermFastLen': 5, 'shortTermSlowLen': 12,
+     'enableHigherTFFilter': True, 'higherTimeframe': '15m'},
+    {'longTermFastLen': 20, 'longTermSlowLen': 60, 'shortTermFastLen': 5, 'shortTermSlowLen': 12,
+     'exitMethod': 'ATR', 'atrStopLossFactor': 1.5, 'atrTakeProfitFactor': 3.0},
+    {'longTermFastLen': 20, 'longTermSlowLen': 60, 'shortTermFastLen': 5, 'shortTermSlowLen': 12,
+     'useAtrStopLoss': True, 'atrPeriod': 30},
+    {'longTermFastLen': 20, 'longTermSlowLen': 60, 'shortTermFastLen': 5, 'shortTermSlowLen': 12,
+     'useAdxFilter': True, 'useVolumeFilter': True},
+    {'longTermFastLen': 20, 'longTermSlowLen': 60, 'shortTermFastLen': 5, 'shortTermSlowLen': 12,
+     'useRSIFilter': True, 'rsiLongThreshold': 55.0, 'rsiShortThreshold': 45.0, 'exitMethod': 'Trailing'},
+    {'longTermFastLen': 20, 'longTermSlowLen': 60, 'shortTermFastLen': 5, 'shortTermSlowLen': 12,
+     'useAtrFilter': True, 'atrFilterThreshold': 0.001, 'enableSessionFilter': True, 'sessionHours': '2200-0600'},
+]
+
+# Cheap bars let every order fill; expensive ones exercise margin rejections
+# of long entries against the broker's 10000 starting cash.
+START_PRICES = (100.0, 30000.0)
+
+
+def compare(df, params, timeframe='1m', cache=None):
+    df = prepare_frame(df, timeframe, params)
+    bt_init, bt_final, bt_log, _ = run_backtrader(df, params)
+    vec_init, vec_final, vec_log = run_vector_backtest(df, params)
+    problems = []
+    if cache is not None:
+        _, cached_bt_final, cached_bt_log, _ = run_backtrader(df, params, indicator_cache=cache)
+        _, cached_vec_final, cached_vec_log = run_vector_backtest(df, params, cache=cache)
+        if (cached_bt_final, cached_bt_log) != (bt_final, bt_log):
+            problems.append("backtrader run with cached indicators differs")
+        if (cached_vec_final, cached_vec_log) != (vec_final, vec_log):
+            problems.append("vector run with cached indicators differs")
+    if bt_init != vec_init:
+        problems.append(f"initial value {bt_init} != {vec_init}")
+    if bt_final != vec_final:
+        problems.append(f"final value {bt_final} != {vec_final}")
+    if len(bt_log) != len(vec_log):
+        problems.append(f"{len(bt_log)} backtrader trades != {len(vec_log)} vector trades")
+    for k, (a, b) in enumerate(zip(bt_log.records(), vec_log.records())):
+        if a != b:
+            problems.append(f"trade {k}: {a} != {b}")
+            break
+    return problems, len(bt_log)
+
+
+def main(bars=5000, seeds=3):
+    failures = 0
+    cache = IndicatorCache()
+    for start_price in START_PRICES:
+        for seed in range(seeds):
+            df = random_walk_ohlcv(bars, seed=seed, start_price=start_price)
+            for params in PARAM_SETS:
+                problems, trades = compare(df, params, cache=cache)
+                status = "ok" if not problems else "MISMATCH"
+                print(f"{status:>8}  price={start_price:<8} seed={seed} trades={trades:<4} {params}")
+                for p in problems:
+                    print(f"          {p}")
+                failures += bool(problems)
+    print(f"indicator cache: {cache.stats()}")
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--bars', type=int, default=5000)
+    parser.add_argument('--seeds', type=int, default=3)
+    args = parser.parse_args()
+    sys.exit(1 if main(args.bars, args.seeds) else 0)
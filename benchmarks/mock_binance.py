@@ -0,0 +1,102 @@
+# benchmarks/mock_binance.py
+import json
+import time
+import random
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from downloader import interval_to_ms
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class MockBinance:
+    # Local stand-in for /api/v3/klines. Bars are generated deterministically
+    # from their open time, so any two requests agree on overlapping bars.
+    # latency adds a per-request delay and fail_rate makes a fraction of the
+    # requests answer 503, to exercise retries.
+    def __init__(self, latency=0.0, fail_rate=0.0, now_ms=None, seed=0):
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.now_ms = now_ms
+        self.requests = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+
+    def kline(self, open_time, interval_ms):
+        price = 20000.0 + (open_time // interval_ms) % 997
+        return [
+            open_time, f"{price:.2f}", f"{price + 5:.2f}", f"{price - 5:.2f}", f"{price + 1:.2f}",
+            "12.5", open_time + interval_ms - 1, "250000.0", 42, "6.0", "120000.0", "0"
+        ]
+
+    def klines(self, interval, start_ts, end_ts=None, limit=500):
+        step = interval_to_ms(interval)
+        now = self.now_ms if self.now_ms is not None else int(time.time() * 1000)
+        end = now if end_ts is None else min(end_ts, now)
+        t = -(-start_ts // step) * step
+        out = []
+        while t <= end and len(out) < limit:
+            out.append(self.kline(t, step))
+            t += step
+        return out
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                query = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+                with mock._lock:
+                    mock.requests += 1
+                    used = mock.requests * 2
+                    fail = mock._rng.random() < mock.fail_rate
+                if mock.latency:
+                    time.sleep(mock.latency)
+                if fail:
+                    self.send_response(503)
+                    self.end_headers()
+                    return
+                body = json.dumps(mock.klines(
+                    query['interval'], int(query['startTime']),
+                    int(query['endTime']) if 'endTime' in query else None,
+                    int(query.get('limit', 500))
+                )).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('X-MBX-USED-WEIGHT-1M', str(used))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+    def start(self):
+        self._server = _Server(('127.0.0.1', 0), self._handler())
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self.url
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/api/v3/klines"
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,93 @@
+# benchmarks/mock_exchange.py
+import time
+import random
+import asyncio
+from ccxt.base.decimal_to_precision import TICK_SIZE
+
+SYMBOLS = ('BTC/USDT', 'ETH/USDT', 'SOL/USDT', 'BNB/USDT', 'XRP/USDT', 'ADA/USDT', 'DOGE/USDT', 'LTC/USDT')
+
+
+class MockExchange:
+    # Local stand-in for a ccxt async exchange: load_markets, fetch_balance
+    # and create_order answer after `latency` seconds (plus up to `jitter`)
+    # and orders fill at once. Keeps the orders it received and how many
+    # calls were in flight at most.
+    precisionMode = TICK_SIZE
+
+    def __init__(self, symbols=SYMBOLS, latency=0.05, jitter=0.02, rate_limit_ms=0, seed=0):
+        self.rateLimit = rate_limit_ms
+        self.latency = latency
+        self.jitter = jitter
+        self.calls = {}
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.orders = []
+        self._rng = random.Random(seed)
+        self.markets = {
+            symbol: {'symbol': symbol, 'precision': {'amount': 0.0001, 'price': 0.01},
+                     'limits': {'amount': {'min': 0.0001}}}
+            for symbol in symbols
+        }
+
+    def _delay(self):
+        return self.latency + self._rng.random() * self.jitter
+
+    def _enter(self, method):
+        self.calls[method] = self.calls.get(method, 0) + 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def _fill(self, symbol, order_type, side, amount, price=None):
+        order = {'id': str(len(self.orders) + 1), 'symbol': symbol, 'type': order_type, 'side': side,
+                 'amount': amount, 'price': price, 'status': 'closed'}
+        self.orders.append(order)
+        return order
+
+    def _balance(self):
+        return {'USDT': {'free': 1e6, 'used': 0.0, 'total': 1e6}}
+
+    async def _answer(self, method, result, *args):
+        self._enter(method)
+        try:
+            await asyncio.sleep(self._delay())
+            return result(*args)
+        finally:
+            self.in_flight -= 1
+
+    async def load_markets(self, reload=False):
+        return await self._answer('load_markets', lambda: self.markets)
+
+    async def fetch_balance(self):
+        return await self._answer('fetch_balance', self._balance)
+
+    async def create_order(self, symbol, order_type, side, amount, price=None):
+        return await self._answer('create_order', self._fill, symbol, order_type, side, amount, price)
+
+    async def close(self):
+        pass
+
+
+class SyncMockExchange(MockExchange):
+    # The same exchange behind blocking calls, as ccxt's sync classes are
+    def _answer(self, method, result, *args):
+        self._enter(method)
+        try:
+            time.sleep(self._delay())
+            return result(*args)
+        finally:
+            self.in_flight -= 1
+
+    def load_markets(self, reload=False):
+        return self._answer('load_markets', lambda: self.markets)
+
+    def fetch_balance(self):
+        return self._answer('fetch_balance', self._balance)
+
+    def create_market_order(self, symbol, side, amount):
+        return self._answer('create_order', self._fill, symbol, 'market', side, amount)
+
+    def create_limit_order(self, symbol, side, amount, price):
+        return self._answer('create_order', self._fill, symbol, 'limit', side, amount, price)
+
+    def close(self):
+        pass
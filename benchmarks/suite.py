@@ -0,0 +1,362 @@
+# benchmarks/suite.py
+# Offline benchmark suite on deterministic synthetic bars (a regime-switching
+# random walk). `run` times each benchmark and writes the metrics as JSON;
+# `compare` checks a run against a baseline and exits non-zero when a tracked
+# metric got worse by more than the threshold. Times are the best of
+# --repeat runs.
+# Run from the repo root:
+#   python -m benchmarks.suite run --size small --out bench.json
+#   python -m benchmarks.suite compare baseline.json bench.json --threshold 0.2
+import gc
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import backtrader as bt
+import data
+from kline_cache import KlineCache
+from backtesting import run_backtest, make_feed
+from strategy import PineStrategy
+from vector_engine import run_vector_backtest
+from indicator_cache import get_indicator_cache
+from ga_optimization import optimize_frame
+from chart import price_figure, chart_data
+from runs import Run
+from synthetic import regime_switching_ohlcv
+
+# Bars per benchmark for each size; backtrader is too slow for millions
+SIZES = {
+    'small': {'parse': 10_000, 'backtest': 10_000, 'backtrader': 10_000, 'ga': 10_000, 'dashboard': 10_000,
+              'cold_start': 2_000},
+    'medium': {'parse': 500_000, 'backtest': 500_000, 'backtrader': 100_000, 'ga': 100_000,
+               'dashboard': 500_000, 'cold_start': 2_000},
+    'large': {'parse': 5_000_000, 'backtest': 5_000_000, 'backtrader': 500_000, 'ga': 500_000,
+              'dashboard': 5_000_000, 'cold_start': 2_000},
+}
+
+# Metrics compare checks; all of them are lower-is-better
+TRACKED = {
+    'parse': ('us_per_bar',),
+    'backtest': ('vector_us_per_bar', 'backtrader_us_per_bar'),
+    'strategy_next': ('next_us_per_bar',),
+    'ga_generation': ('seconds_per_generation',),
+    'dashboard': ('figure_ms', 'table_page_ms', 'csv_ms'),
+    'cold_start': ('fetch_ms', 'backtest_ms', 'optimize_ms', 'serve_ms'),
+}
+DEFAULT_THRESHOLD = 0.2
+INTERVAL = '1m'
+MINUTE_MS = 60_000
+# Trades often enough to give the trade table and markers some weight
+FAST_PARAMS = {'longTermFastLen': 10, 'longTermSlowLen': 20, 'shortTermFastLen': 2, 'shortTermSlowLen': 4,
+               'fixedStopLossPct': 0.1, 'fixedTakeProfitPct': 0.1}
+
+
+def best_of(repeat, fn):
+    # (best seconds, last result)
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        gc.collect()
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def recent_bars(bars, seed=0):
+    # Synthetic 1m bars ending at the last closed minute, so get_historical_data
+    # treats them as history
+    now = int(time.time() * 1000) // MINUTE_MS * MINUTE_MS
+    start = now - (bars + 1) * MINUTE_MS
+    return regime_switching_ohlcv(bars, INTERVAL, start=start * 1_000_000, seed=seed)
+
+
+class FakeKlines:
+    # Stands in for data.iter_kline_pages: Binance-shaped pages (strings for
+    # prices, like the API) cut from a DataFrame
+    def __init__(self, df, page=1000):
+        self.df = df
+        self.page = page
+        self.open_time = df.index.as_unit('ms').asi8
+        self.columns = [df[name].to_numpy() for name in ('open', 'high', 'low', 'close', 'volume')]
+
+    def __call__(self, symbol, interval, start_ts, end_ts=None, **kwargs):
+        lo = int(self.open_time.searchsorted(start_ts))
+        hi = len(self.open_time) if end_ts is None else int(self.open_time.searchsorted(end_ts, side='right'))
+        for first in range(lo, hi, self.page):
+            last = min(first + self.page, hi)
+            times = self.open_time[first:last].tolist()
+            values = [[repr(v) for v in column[first:last].tolist()] for column in self.columns]
+            yield [[t, o, h, l, c, v, t + MINUTE_MS - 1, "0", 0, "0", "0", "0"]
+                   for t, o, h, l, c, v in zip(times, *values)]
+
+    def feed_seconds(self):
+        # Time spent just producing the pages, to take out of the timings
+        t0 = time.perf_counter()
+        for _ in self('SYNTH', INTERVAL, int(self.open_time[0])):
+            pass
+        return time.perf_counter() - t0
+
+
+class offline_data:
+    # Context manager: data downloads come from FakeKlines and the kline cache
+    # lives in a temporary directory
+    def __init__(self, fake):
+        self.fake = fake
+
+    def __enter__(self):
+        self.saved = data.iter_kline_pages, data._default_cache
+        self.root = tempfile.mkdtemp(prefix='bench-klines-')
+        data.iter_kline_pages = self.fake
+        data._default_cache = KlineCache(self.root)
+        return self
+
+    def reset_cache(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+        data._default_cache = KlineCache(self.root)
+
+    def __exit__(self, *exc):
+        data.iter_kline_pages, data._default_cache = self.saved
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+def bench_parse(sizes, repeat):
+    bars = sizes['parse']
+    df = recent_bars(bars)
+    fake = FakeKlines(df)
+    feed = min(fake.feed_seconds() for _ in range(repeat))
+    start = f"{df.index[0]} UTC"
+    with offline_data(fake):
+        seconds, out = best_of(repeat, lambda: data.get_historical_data('SYNTH', INTERVAL, start, use_cache=False))
+    assert len(out) == bars, f"parsed {len(out)} of {bars} bars"
+    parse = max(seconds - feed, 0.0)
+    return {'bars': bars, 'seconds': parse, 'feed_seconds': feed, 'us_per_bar': parse / bars * 1e6}
+
+
+def bench_backtest(sizes, repeat):
+    # run_backtest from download to trade log, on a cold kline cache
+    out = {}
+    for engine, key in (('vector', 'backtest'), ('backtrader', 'backtrader')):
+        bars = sizes[key]
+        df = recent_bars(bars)
+        fake = FakeKlines(df)
+        feed = min(fake.feed_seconds() for _ in range(repeat))
+        start = f"{df.index[0]} UTC"
+        with offline_data(fake) as offline:
+            def run():
+                offline.reset_cache()
+                return run_backtest('SYNTH', INTERVAL, start, {}, engine=engine, use_result_cache=False)
+            seconds, (_, final_value, trade_log, _) = best_of(repeat, run)
+        seconds = max(seconds - feed, 0.0)
+        out[f'{engine}_bars'] = bars
+        out[f'{engine}_seconds'] = seconds
+        out[f'{engine}_us_per_bar'] = seconds / bars * 1e6
+        out[f'{engine}_trades'] = len(trade_log)
+    return out
+
+
+class TimedPineStrategy(PineStrategy):
+    # PineStrategy with its next() timed
+    def __init__(self):
+        super().__init__()
+        self.next_seconds = 0.0
+        self.next_calls = 0
+
+    def next(self):
+        t0 = time.perf_counter()
+        super().next()
+        self.next_seconds += time.perf_counter() - t0
+        self.next_calls += 1
+
+
+def bench_strategy_next(sizes, repeat):
+    bars = sizes['backtrader']
+    df = regime_switching_ohlcv(bars, INTERVAL)
+    best = None
+    for _ in range(repeat):
+        cerebro = bt.Cerebro()
+        cerebro.addstrategy(TimedPineStrategy)
+        cerebro.adddata(make_feed(df))
+        t0 = time.perf_counter()
+        strat = cerebro.run()[0]
+        total = time.perf_counter() - t0
+        if best is None or strat.next_seconds < best[0]:
+            best = (strat.next_seconds, strat.next_calls, total)
+    next_seconds, calls, total = best
+    return {'bars': bars, 'next_calls': calls, 'next_us_per_bar': next_seconds / max(calls, 1) * 1e6,
+            'run_us_per_bar': total / bars * 1e6}
+
+
+def bench_ga_generation(sizes, repeat, population=40):
+    # One generation after the initial population, evaluated in-process on a
+    # cold indicator cache
+    bars = sizes['ga']
+    df = regime_switching_ohlcv(bars, INTERVAL)
+    best = float('inf')
+    for _ in range(repeat):
+        get_indicator_cache().invalidate()
+        marks = []
+        optimize_frame(df, processes=1, population_size=population, generations=2, patience=3, seed=1,
+                       progress=lambda p: marks.append(p['elapsed']))
+        best = min(best, marks[1] - marks[0])
+    return {'bars': bars, 'population': population, 'seconds_per_generation': best}
+
+
+def bench_dashboard(sizes, repeat):
+    # Price figure (built and serialized), one sorted trade table page and the
+    # full CSV export, from a run the way the dashboards hold it
+    bars = sizes['dashboard']
+    df = regime_switching_ohlcv(bars, INTERVAL)
+    _, _, trade_log = run_vector_backtest(df, FAST_PARAMS)
+    run = Run({'id': 'bench', 'kind': 'backtest', 'params': {'symbol': 'SYNTH', 'timeframe': INTERVAL},
+               'result': {'initial_value': 0.0, 'final_value': 0.0, 'trade_log': trade_log.to_columns(),
+                          'chart': chart_data(df)}})
+    figure, payload = best_of(repeat, lambda: price_figure(run.bars, 'SYNTH', INTERVAL, run.trade_log).to_json())
+    sort_by = [{'column_id': 'Profit', 'direction': 'desc'}]
+    table, _ = best_of(repeat, lambda: run.trade_page(5, 10, sort_by))
+    csv, _ = best_of(repeat, lambda: sum(len(chunk) for chunk in run.csv_chunks()))
+    return {'bars': bars, 'trades': len(trade_log), 'figure_ms': figure * 1e3, 'figure_bytes': len(payload),
+            'table_page_ms': table * 1e3, 'csv_ms': csv * 1e3}
+
+
+# cli.py subcommands as the cold-start benchmark runs them: a fresh
+# interpreter each time, over bars already in the kline cache
+COLD_START_COMMANDS = {
+    'fetch': ['fetch', '--symbols', 'SYNTH', '--timeframes', '5m'],
+    'backtest': ['backtest', '--symbol', 'SYNTH', '--timeframe', '5m', '--no-result-cache'],
+    'optimize': ['optimize', '--symbol', 'SYNTH', '--timeframe', '5m', '--no-result-cache', '--processes', '1',
+                 '--population', '8', '--generations', '1', '--seed', '1'],
+    'serve': ['serve'],
+}
+HEAVY_MODULES = ('pandas', 'dateparser', 'backtrader', 'deap', 'ccxt', 'plotly', 'dash', 'flask')
+# Run in the child: downloads return nothing (the cache is already filled)
+# and serving stops once the app is built
+COLD_START_CHILD = '''
+import sys, json
+if sys.argv[1] == 'serve':
+    import dash
+    dash.Dash.run = lambda self, *args, **kwargs: None
+else:
+    import data
+    data.iter_kline_pages = lambda *args, **kwargs: iter(())
+import cli
+cli.main(sys.argv[1:])
+print(json.dumps(sorted(m for m in %r if m in sys.modules)))
+''' % (HEAVY_MODULES,)
+
+
+def bench_cold_start(sizes, repeat):
+    # Wall time of each subcommand in a new process, from interpreter start
+    # to exit, and the heavy modules it ended up importing
+    bars = sizes['cold_start']
+    df = recent_bars(bars)
+    start = f"{df.index[0]} UTC"
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    out = {'bars': bars}
+    with offline_data(FakeKlines(df)) as offline:
+        data.get_historical_data('SYNTH', INTERVAL, start)
+        env = dict(os.environ, CRYPTO_BACKTESTER_CACHE=offline.root)
+
+        def spawn(args):
+            return subprocess.run([sys.executable, '-c', *args], cwd=root, env=env, capture_output=True,
+                                  text=True, check=True).stdout
+
+        out['python_ms'] = best_of(repeat, lambda: spawn(['pass']))[0] * 1e3
+        for name, argv in COLD_START_COMMANDS.items():
+            if name != 'serve':
+                argv = argv + ['--start', start]
+            seconds, stdout = best_of(repeat, lambda: spawn([COLD_START_CHILD, *argv]))
+            out[f'{name}_ms'] = seconds * 1e3
+            out[f'{name}_heavy_imports'] = ' '.join(json.loads(stdout.strip().splitlines()[-1])) or '-'
+    return out
+
+
+BENCHMARKS = {
+    'parse': bench_parse,
+    'backtest': bench_backtest,
+    'strategy_next': bench_strategy_next,
+    'ga_generation': bench_ga_generation,
+    'dashboard': bench_dashboard,
+    'cold_start': bench_cold_start,
+}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(size='small', only=None, repeat=3, out=None):
+    sizes = SIZES[size]
+    results = {}
+    for name, bench in BENCHMARKS.items():
+        if only and name not in only:
+            continue
+        t0 = time.perf_counter()
+        results[name] = bench(sizes, repeat)
+        metrics = ', '.join(f"{k}={v:.4g}" if isinstance(v, (int, float)) else f"{k}={v}"
+                            for k, v in results[name].items())
+        print(f"{name:>14} ({time.perf_counter() - t0:6.1f}s)  {metrics}")
+    report = {
+        'meta': {'size': size, 'repeat': repeat, 'commit': git_commit(), 'python': platform.python_version(),
+                 'machine': platform.machine(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S')},
+        'benchmarks': results,
+    }
+    if out:
+        with open(out, 'w') as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    # Returns the regressions: (benchmark, metric, baseline, current, change)
+    regressions = []
+    if baseline['meta'].get('size') != current['meta'].get('size'):
+        print(f"warning: comparing size {baseline['meta'].get('size')} against {current['meta'].get('size')}")
+    for name, metrics in TRACKED.items():
+        base, cur = baseline['benchmarks'].get(name), current['benchmarks'].get(name)
+        if base is None or cur is None:
+            continue
+        for metric in metrics:
+            if metric not in base or metric not in cur or not base[metric]:
+                continue
+            change = cur[metric] / base[metric] - 1.0
+            flag = "REGRESSED" if change > threshold else "ok"
+            print(f"{flag:>10}  {name}.{metric}: {base[metric]:.4g} -> {cur[metric]:.4g} ({change:+.1%})")
+            if change > threshold:
+                regressions.append((name, metric, base[metric], cur[metric], change))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmark suite with regression gates")
+    commands = parser.add_subparsers(dest='command', required=True)
+    run_cmd = commands.add_parser('run', help="run the benchmarks and write JSON")
+    run_cmd.add_argument('--size', choices=list(SIZES), default='small')
+    run_cmd.add_argument('--only', nargs='+', choices=list(BENCHMARKS))
+    run_cmd.add_argument('--repeat', type=int, default=3)
+    run_cmd.add_argument('--out', default='bench_results.json')
+    compare_cmd = commands.add_parser('compare', help="fail if tracked metrics regressed")
+    compare_cmd.add_argument('baseline')
+    compare_cmd.add_argument('current')
+    compare_cmd.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                             help="allowed relative slowdown, e.g. 0.2 for 20%%")
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        run(args.size, args.only, args.repeat, args.out)
+    else:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        regressions = compare(baseline, current, args.threshold)
+        print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,144 @@
+# chart.py
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from instrumentation import timed
+
+# Price charts that stay small in the browser. The first view aggregates
+# consecutive bars into at most max_candles candles (first open, highest
+# high, lowest low, last close), so a month of 1m bars ships as a couple of
+# thousand candles instead of ~43k. When the user zooms, the dashboard asks
+# for the visible window again and gets it at full resolution once it fits
+# under the cap. The full-resolution bars stay on the server (see runs.py).
+
+DEFAULT_MAX_CANDLES = 2000
+OHLC = ('open', 'high', 'low', 'close')
+MONTE_CARLO_COLORS = ('#FFC107', '#17BECF', '#E377C2')
+
+
+def chart_data(df):
+    # Bars for the price chart, JSON-friendly
+    data = {'open_time': [int(t) for t in df.index.as_unit('ms').asi8]}
+    for name in OHLC:
+        data[name] = df[name].tolist()
+    return data
+
+
+def chart_frame(data):
+    # Inverse of chart_data
+    index = pd.DatetimeIndex(np.asarray(data['open_time'], dtype=np.int64).view('datetime64[ms]'))
+    return pd.DataFrame({name: np.asarray(data[name], dtype=np.float64) for name in OHLC}, index=index)
+
+
+def decimate(df, max_candles=DEFAULT_MAX_CANDLES):
+    # OHLC-preserving aggregation of runs of `step` consecutive bars; each
+    # candle sits at its first bar's time. Returns (bars, step).
+    n = len(df)
+    if n <= max_candles:
+        return df, 1
+    step = -(-n // max_candles)
+    starts = np.arange(0, n, step)
+    ends = np.r_[starts[1:], n] - 1
+    out = pd.DataFrame({
+        'open': df['open'].to_numpy()[starts],
+        'high': np.maximum.reduceat(df['high'].to_numpy(), starts),
+        'low': np.minimum.reduceat(df['low'].to_numpy(), starts),
+        'close': df['close'].to_numpy()[ends],
+    }, index=df.index[starts])
+    if 'volume' in df:
+        out['volume'] = np.add.reduceat(df['volume'].to_numpy(), starts)
+    return out, step
+
+
+def relayout_range(relayout):
+    # The x range a Graph's relayoutData asks for: (x0, x1), (None, None) to
+    # reset to the full range, or None when the x axis did not change. The
+    # {'autosize': True} a Graph sends when it first renders is not a reset;
+    # answering it would render the figure a second time.
+    if not relayout:
+        return None
+    if 'xaxis.range[0]' in relayout and 'xaxis.range[1]' in relayout:
+        return relayout['xaxis.range[0]'], relayout['xaxis.range[1]']
+    if 'xaxis.range' in relayout:
+        x0, x1 = relayout['xaxis.range']
+        return x0, x1
+    if relayout.get('xaxis.autorange'):
+        return None, None
+    return None
+
+
+def window(df, x0=None, x1=None):
+    # Bars between x0 and x1, plus one bar either side so the edges of the
+    # view are not blank
+    if x0 is None and x1 is None:
+        return df
+    index = df.index
+    lo = index.searchsorted(pd.Timestamp(x0)) - 1 if x0 is not None else 0
+    hi = index.searchsorted(pd.Timestamp(x1), side='right') + 1 if x1 is not None else len(index)
+    return df.iloc[max(lo, 0):hi]
+
+
+def marker_points(df, times_ms):
+    # (x, y) at the close of the bars opening at times_ms; times that are not
+    # a bar of df are left out. One index lookup for all of them.
+    pos = df.index.get_indexer(pd.DatetimeIndex(times_ms.view('datetime64[ms]')))
+    pos = pos[pos >= 0]
+    return df.index[pos], df['close'].to_numpy()[pos]
+
+
+def trade_markers(df, trade_log):
+    # Entry/exit points of a TradeLog's trades within df
+    entries_x, entries_y = marker_points(df, trade_log['entry_ms'])
+    exits_x, exits_y = marker_points(df, trade_log['exit_ms'])
+    return [
+        go.Scatter(x=entries_x, y=entries_y, mode='markers', name='Entries',
+                   marker=dict(symbol='triangle-up', color='green', size=12)),
+        go.Scatter(x=exits_x, y=exits_y, mode='markers', name='Exits',
+                   marker=dict(symbol='triangle-down', color='red', size=12)),
+    ]
+
+
+@timed('chart.figure')
+def price_figure(df, symbol, timeframe, trade_log=None, x_range=None, max_candles=DEFAULT_MAX_CANDLES):
+    # Candlesticks for the visible part of df (all of it without x_range),
+    # decimated to max_candles
+    x0, x1 = x_range or (None, None)
+    view = window(df, x0, x1)
+    bars, step = decimate(view, max_candles)
+    fig = go.Figure(data=[go.Candlestick(
+        x=bars.index,
+        open=bars['open'],
+        high=bars['high'],
+        low=bars['low'],
+        close=bars['close'],
+        name='Price'
+    )])
+    if trade_log is not None and len(trade_log):
+        fig.add_traces(trade_markers(view, trade_log))
+    title = f"{symbol} Price Chart ({timeframe})"
+    if step > 1:
+        title += f" - {step} bars per candle, zoom in for full resolution"
+    # uirevision keeps the user's zoom when the zoomed figure comes back
+    fig.update_layout(template='plotly_dark', title=title, uirevision=f"{symbol}/{timeframe}")
+    fig.update_xaxes(rangeslider_visible=False)
+    if x0 is not None and x1 is not None:
+        fig.update_xaxes(range=[x0, x1])
+    return fig
+
+
+@timed('chart.monte_carlo_figure')
+def monte_carlo_figure(histograms):
+    # Final equity and max drawdown (% of peak) distributions per Monte Carlo
+    # method, from the bin counts a backtest job stored (monte_carlo.histograms)
+    from plotly.subplots import make_subplots
+    fig = make_subplots(rows=1, cols=2, subplot_titles=("Final Equity", "Max Drawdown (%)"))
+    for k, (method, hists) in enumerate(histograms.items()):
+        color = MONTE_CARLO_COLORS[k % len(MONTE_CARLO_COLORS)]
+        for col, metric, scale in ((1, 'final_equity', 1), (2, 'max_drawdown_pct', 100)):
+            counts, edges = hists[metric]['counts'], np.asarray(hists[metric]['edges']) * scale
+            fig.add_trace(go.Bar(x=(edges[:-1] + edges[1:]) / 2, y=counts, width=np.diff(edges),
+                                 name=method, legendgroup=method, showlegend=col == 1,
+                                 marker_color=color, opacity=0.6), row=1, col=col)
+    fig.update_layout(template='plotly_dark', barmode='overlay', title="Monte Carlo Simulations")
+    fig.update_yaxes(title_text="Simulations", row=1, col=1)
+    return fig
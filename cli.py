@@ -0,0 +1,149 @@
+# cli.py
+import sys
+import json
+import argparse
+
+# crypto-backtester: one entry point for downloading bars, backtesting,
+# optimizing and serving the dashboards. Only the standard library is
+# imported up front; each subcommand imports what its own path needs, so a
+# vector backtest never loads backtrader, DEAP or Dash, and --help is
+# instant. Run from the repo root: python cli.py backtest --symbol ETHUSDT
+# (benchmarks/suite.py's cold_start benchmark times each subcommand).
+
+PROG = 'crypto-backtester'
+
+
+def parse_param(text):
+    # name=value, the value read as JSON when it parses (numbers, true/false)
+    # and as a string otherwise, e.g. exitMethod=Trailing
+    name, sep, value = text.partition('=')
+    if not sep or not name:
+        raise argparse.ArgumentTypeError(f"expected name=value, got {text!r}")
+    try:
+        return name, json.loads(value)
+    except ValueError:
+        return name, value
+
+
+def strategy_params(args):
+    params = {}
+    if args.params_file:
+        with open(args.params_file) as f:
+            params.update(json.load(f))
+    params.update(dict(args.param or ()))
+    return params
+
+
+def fetch(args):
+    from data import get_ohlcv
+    from backtesting import closed_bars
+    for symbol in args.symbols:
+        for timeframe in args.timeframes:
+            df = closed_bars(get_ohlcv(symbol=symbol, interval=timeframe, start_str=args.start,
+                                       base_interval=args.base_timeframe), timeframe)
+            span = f"{df.index[0]} .. {df.index[-1]}" if len(df) else "no bars"
+            print(f"{symbol:>12} {timeframe:>4}  {len(df):>8} bars  {span}")
+    return 0
+
+
+def backtest(args):
+    from backtesting import run_backtest
+    from result_cache import summarize
+    initial_value, final_value, trade_log, _ = run_backtest(
+        args.symbol, args.timeframe, args.start, strategy_params(args), base_timeframe=args.base_timeframe,
+        engine=args.engine, use_result_cache=not args.no_result_cache, incremental=args.incremental)
+    for name, value in summarize(initial_value, final_value, trade_log).items():
+        print(f"{name:>18}: {value:.2f}" if isinstance(value, float) else f"{name:>18}: {value}")
+    if args.trades:
+        trade_log.frame().to_csv(args.trades, index=False)
+        print(f"{len(trade_log)} trades written to {args.trades}")
+    return 0
+
+
+def optimize(args):
+    from ga_optimization import run_optimization
+
+    def report(p):
+        print(f"gen {p['generation']:>3}  best {p['best_value']:.2f}  "
+              f"evals {p['evaluations']}  {p['gens_per_sec']:.2f} gens/s")
+    value, params = run_optimization(
+        args.symbol, args.timeframe, args.start, base_timeframe=args.base_timeframe,
+        strategy_params=strategy_params(args), processes=args.processes, population_size=args.population,
+        generations=args.generations, patience=args.patience, seed=args.seed, progress=report,
+        use_result_cache=not args.no_result_cache)
+    print(f"best final value {value:.2f}")
+    print(json.dumps(params, indent=2))
+    return 0
+
+
+def serve(args):
+    if args.app == 'main':
+        from main import app
+    else:
+        from dashboard import app
+    app.run(host=args.host, port=args.port, debug=args.debug)
+    return 0
+
+
+def _data_arguments(parser, symbols=False):
+    if symbols:
+        parser.add_argument('--symbols', nargs='+', default=['BTCUSDT'])
+        parser.add_argument('--timeframes', nargs='+', default=['5m'])
+    else:
+        parser.add_argument('--symbol', default='BTCUSDT')
+        parser.add_argument('--timeframe', default='5m')
+    parser.add_argument('--start', default='1 month ago UTC')
+    parser.add_argument('--base-timeframe', default='1m',
+                        help="resample from this cached series; equal to the timeframe to download it directly")
+
+
+def _strategy_arguments(parser):
+    parser.add_argument('--param', action='append', type=parse_param, metavar='NAME=VALUE',
+                        help="PineStrategy parameter, repeatable")
+    parser.add_argument('--params-file', help="JSON object of PineStrategy parameters")
+    parser.add_argument('--no-result-cache', action='store_true')
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog=PROG, description="Crypto strategy backtester")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    cmd = commands.add_parser('fetch', help="download bars into the local kline cache")
+    _data_arguments(cmd, symbols=True)
+    cmd.set_defaults(handler=fetch)
+
+    cmd = commands.add_parser('backtest', help="backtest PineStrategy on one symbol")
+    _data_arguments(cmd)
+    _strategy_arguments(cmd)
+    cmd.add_argument('--engine', default='vector', choices=['vector', 'backtrader'])
+    cmd.add_argument('--incremental', action='store_true', help="resume from the last run's snapshot")
+    cmd.add_argument('--trades', metavar='CSV', help="write the trade log here")
+    cmd.set_defaults(handler=backtest)
+
+    cmd = commands.add_parser('optimize', help="search PineStrategy parameters with the genetic optimizer")
+    _data_arguments(cmd)
+    _strategy_arguments(cmd)
+    cmd.add_argument('--processes', type=int, default=None, help="pool size; 1 evaluates in this process")
+    cmd.add_argument('--population', type=int, default=40)
+    cmd.add_argument('--generations', type=int, default=25)
+    cmd.add_argument('--patience', type=int, default=6)
+    cmd.add_argument('--seed', type=int, default=None)
+    cmd.set_defaults(handler=optimize)
+
+    cmd = commands.add_parser('serve', help="run a dashboard")
+    cmd.add_argument('--app', choices=['dashboard', 'main'], default='dashboard',
+                     help="multi-page dashboard or the all-in-one page")
+    cmd.add_argument('--host', default='127.0.0.1')
+    cmd.add_argument('--port', type=int, default=8050)
+    cmd.add_argument('--debug', action='store_true')
+    cmd.set_defaults(handler=serve)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
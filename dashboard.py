@@ -2,15 +2,21 @@
 import dash
 from dash import dcc, html, Input, Output, State, dash_table
 import plotly.graph_objects as go
-import pandas as pd
 import json
-from backtesting import run_backtest
-from ga_optimization import run_optimization
-from data import get_historical_data
+from jobs import get_job_queue, FAILED, CANCELLED, FINISHED
+from chart import price_figure, relayout_range, monte_carlo_figure
+from runs import get_run_store, add_routes, trades_csv_url, monte_carlo_url, DEFAULT_PAGE_SIZE
+from instrumentation import timed, add_metrics_route
+from trade_log import TABLE_COLUMNS
 
 # Create Dash app with multi-page structure; expose the Flask server.
 app = dash.Dash(__name__, suppress_callback_exceptions=True)
 server = app.server
+add_routes(server)
+add_metrics_route(server)
+
+# Every timeframe in the dropdown is resampled locally from cached 1m bars.
+BASE_TIMEFRAME = '1m'
 
 # Default strategy parameters used for backtesting.
 DEFAULT_PARAMS = {
@@ -72,9 +78,17 @@ def render_dashboard():
                     html.Button("Run Backtest", id="run-backtest", n_clicks=0,
                                 style={'padding': '10px 20px', 'fontSize': '16px', 'marginRight': '10px'}),
                     html.Button("Run Optimization", id="run-optimization", n_clicks=0,
+                                style={'padding': '10px 20px', 'fontSize': '16px', 'marginRight': '10px'}),
+                    html.Button("Cancel", id="cancel-job", n_clicks=0,
                                 style={'padding': '10px 20px', 'fontSize': '16px'})
                 ], style={'display': 'inline-block'})
-            ], style={'textAlign': 'center', 'marginBottom': '40px'}),
+            ], style={'textAlign': 'center', 'marginBottom': '20px'}),
+
+            # Background job status, refreshed by the poll interval
+            html.Div(id='job-status', style={'textAlign': 'center', 'marginBottom': '20px'}),
+            html.Div(id='cancel-status', style={'display': 'none'}),
+            dcc.Interval(id='job-poll', interval=1000, disabled=True),
+            dcc.Store(id='job-id-store'),
 
             # Chart
             dcc.Loading(
@@ -88,11 +102,6 @@ def render_dashboard():
                 dcc.Link("View Backtest Results", href="/results",
                          style={'fontSize': '18px', 'padding': '10px', 'color': '#FFC107'})
             ], style={'textAlign': 'center'}),
-
-            # Hidden stores to hold data for results page.
-            dcc.Store(id='params-used-store'),    # Store the actual parameters used
-            dcc.Store(id='metrics-store'),        # Store the final portfolio metrics
-            dcc.Store(id='trade-log-store'),      # Store the entire trade log
         ]
     )
 
@@ -105,11 +114,29 @@ def render_results():
         children=[
             html.H1("Backtest Results", style={'textAlign': 'center', 'marginBottom': '30px'}),
             html.Div(id='results-container', style={'marginBottom': '30px'}),
-            # Download CSV
+            # Trade log, paged and sorted on the server (see runs.py)
             html.Div([
-                html.Button("Download Trade Log CSV", id="download-btn", n_clicks=0,
-                            style={'padding': '10px 20px', 'fontSize': '16px', 'marginTop': '20px'}),
-                dcc.Download(id="download-trade-log")
+                html.H3("Complete Trade Log:"),
+                dash_table.DataTable(
+                    id='trade-table',
+                    columns=[{"name": title, "id": title} for title, _ in TABLE_COLUMNS],
+                    data=[],
+                    page_action='custom',
+                    page_current=0,
+                    page_size=DEFAULT_PAGE_SIZE,
+                    page_count=1,
+                    sort_action='custom',
+                    sort_mode='multi',
+                    sort_by=[],
+                    style_table={'overflowX': 'auto'},
+                    style_cell={'textAlign': 'left', 'backgroundColor': '#222', 'color': '#FFC107'}
+                )
+            ], id='trade-table-div', style={'display': 'none'}),
+            # Download CSV, streamed from the server's copy of the run
+            html.Div([
+                html.A(html.Button("Download Trade Log CSV", id="download-btn", n_clicks=0,
+                                   style={'padding': '10px 20px', 'fontSize': '16px', 'marginTop': '20px'}),
+                       id="download-link", href="", download="trade_log.csv")
             ], style={'textAlign': 'center'}),
             html.Br(),
             # Link to go back
@@ -125,12 +152,16 @@ def render_results():
 # ------------------------
 app.layout = html.Div([
     dcc.Location(id='url', refresh=False),
+    # Id of the run on screen; the run itself stays on the server (runs.py).
+    # Kept here so the results page still has it after navigating.
+    dcc.Store(id='run-id-store', storage_type='session'),
     html.Div(id='page-content')
 ])
 
 # Routing callback
 @app.callback(Output('page-content', 'children'),
               Input('url', 'pathname'))
+@timed('callback.display_page')
 def display_page(pathname):
     if pathname == '/results':
         return render_results()
@@ -138,152 +169,209 @@ def display_page(pathname):
         return render_dashboard()
 
 # ------------------------
-# MAIN CALLBACK: RUN BACKTEST OR OPT, UPDATE STORES & CHART
+# MAIN CALLBACKS: SUBMIT A JOB, POLL IT, UPDATE STORES & CHART
 # ------------------------
 @app.callback(
-    [Output("params-used-store", "data"),
-     Output("metrics-store", "data"),
-     Output("trade-log-store", "data"),
-     Output("price-chart", "figure")],
+    [Output("job-id-store", "data"),
+     Output("job-poll", "disabled")],
     [Input("run-backtest", "n_clicks"),
      Input("run-optimization", "n_clicks")],
     [State("symbol", "value"),
-     State("timeframe", "value")]
+     State("timeframe", "value")],
+    prevent_initial_call=True
 )
-def update_backtest_stores(n_backtest, n_optimization, symbol, timeframe):
-    ctx = dash.callback_context
-    if not ctx.triggered:
-        return None, None, None, go.Figure()
-    
-    button_id = ctx.triggered[0]['prop_id'].split('.')[0]
-    used_params = None
-    metrics_data = None
-    trade_log_data = None
-    fig = go.Figure()
-
+@timed('callback.submit_job')
+def submit_job(n_backtest, n_optimization, symbol, timeframe):
+    # Returns immediately; the job runs in the background job queue
+    button_id = dash.callback_context.triggered[0]['prop_id'].split('.')[0]
     if button_id == "run-backtest":
-        # 1) We store the actual parameters used (for debugging)
-        used_params = DEFAULT_PARAMS.copy()
-        used_params["Symbol"] = symbol
-        used_params["Timeframe"] = timeframe
-        
-        # 2) Run the backtest
-        init_val, final_val, trade_log, cerebro = run_backtest(
-            symbol=symbol, timeframe=timeframe, start_str='1 month ago UTC',
-            strategy_params=DEFAULT_PARAMS
-        )
-        net_profit = final_val - init_val
-        
-        metrics_data = {
-            "Initial Value": init_val,
-            "Final Value": final_val,
-            "Net Profit": net_profit,
-            "Number of Trades": len(trade_log)
-        }
-        # Store the trade log
-        trade_log_data = trade_log if trade_log else []
+        job_id = get_job_queue().submit(
+            'backtest', symbol=symbol, timeframe=timeframe, start_str='1 month ago UTC',
+            strategy_params=DEFAULT_PARAMS, base_timeframe=BASE_TIMEFRAME, incremental=True)
+    else:
+        job_id = get_job_queue().submit('optimization', symbol=symbol, timeframe=timeframe,
+                                        base_timeframe=BASE_TIMEFRAME)
+    return job_id, False
+
+@app.callback(
+    Output("cancel-status", "children"),
+    Input("cancel-job", "n_clicks"),
+    State("job-id-store", "data"),
+    prevent_initial_call=True
+)
+@timed('callback.cancel_job')
+def cancel_job(n_clicks, job_id):
+    if job_id:
+        get_job_queue().cancel(job_id)
+    return job_id
+
+def describe_progress(job):
+    progress = job.get('progress') or {}
+    if 'generation' in progress:
+        return (f"generation {progress['generation']}, best {progress['best_value']:.2f}, "
+                f"{progress['gens_per_sec']:.2f} gens/s")
+    if progress.get('bars_total'):
+        return f"{progress.get('stage', '')}: {progress['bars_processed']}/{progress['bars_total']} bars"
+    return ""
 
-        # Build chart
-        df = get_historical_data(symbol=symbol, interval=timeframe, start_str='1 month ago UTC')
-        fig = go.Figure(data=[go.Candlestick(
-            x=df.index,
-            open=df['open'],
-            high=df['high'],
-            low=df['low'],
-            close=df['close']
-        )])
-        fig.update_layout(template='plotly_dark', title=f"{symbol} Price Chart ({timeframe})")
+@app.callback(
+    [Output("run-id-store", "data"),
+     Output("price-chart", "figure"),
+     Output("job-status", "children"),
+     Output("job-poll", "disabled", allow_duplicate=True)],
+    Input("job-poll", "n_intervals"),
+    State("job-id-store", "data"),
+    prevent_initial_call=True
+)
+@timed('callback.poll_job')
+def poll_job(n_intervals, job_id):
+    no_update = dash.no_update
+    job = get_job_queue().status(job_id) if job_id else None
+    if job is None:
+        return no_update, no_update, "", True
+    if job['status'] not in FINISHED:
+        return no_update, no_update, f"{job['kind']} {job['status']} {describe_progress(job)}", False
+    if job['status'] == FAILED:
+        return no_update, no_update, f"{job['kind']} failed: {job['error']}", True
+    if job['status'] == CANCELLED:
+        return no_update, no_update, f"{job['kind']} cancelled", True
 
-    elif button_id == "run-optimization":
-        used_params = {"Mode": "Optimization"}  # or store the best params if you want
-        best_val, best_params = run_optimization(symbol=symbol, timeframe=timeframe)
-        metrics_data = {
-            "Best Portfolio Value": best_val,
-            "Best Strategy Params": best_params
-        }
-        # We won't store a trade log here (since optimization won't produce a single trade log).
-        trade_log_data = []
+    run = get_run_store().get(job['id'])
+    if run.kind == 'backtest':
+        # The chart uses the bars the backtest already loaded, decimated
+        # until the user zooms in
+        fig = (price_figure(run.bars, run.symbol, run.timeframe, run.trade_log) if run.bars is not None
+               else go.Figure())
+        return run.id, fig, "backtest done", True
+    # An optimization has no single trade log or chart
+    return run.id, no_update, "optimization done", True
 
-    return used_params, metrics_data, trade_log_data, fig
+@app.callback(
+    Output("price-chart", "figure", allow_duplicate=True),
+    Input("price-chart", "relayoutData"),
+    State("run-id-store", "data"),
+    prevent_initial_call=True
+)
+@timed('callback.zoom_chart')
+def zoom_chart(relayout, run_id):
+    # Re-renders the chart for the new x range from the bars kept server-side
+    x_range = relayout_range(relayout)
+    run = get_run_store().get(run_id) if x_range is not None else None
+    if run is None or run.bars is None:
+        return dash.no_update
+    return price_figure(run.bars, run.symbol, run.timeframe, run.trade_log, x_range)
 
 # ------------------------
 # RESULTS PAGE CALLBACK
 # ------------------------
+def monte_carlo_display(run, style):
+    # Percentiles per resampling method and the distributions behind them,
+    # as the backtest job computed them
+    summary = run.monte_carlo['summary']
+    cell = {'padding': '4px 12px', 'textAlign': 'right'}
+    header = ["Method", "Final Equity p5", "p50", "p95", "Max Drawdown p50", "p95", "Risk of Ruin",
+              "P(Loss)"]
+    rows = [html.Tr([html.Th(h, style=cell) for h in header])]
+    for method, s in summary.items():
+        values = [method.replace('_', ' '),
+                  f"{s['final_equity']['p5']:.2f}", f"{s['final_equity']['p50']:.2f}",
+                  f"{s['final_equity']['p95']:.2f}",
+                  f"{s['max_drawdown_pct']['p50']:.1%}", f"{s['max_drawdown_pct']['p95']:.1%}",
+                  f"{s['risk_of_ruin']:.1%}", f"{s['probability_of_loss']:.1%}"]
+        rows.append(html.Tr([html.Td(v, style=cell) for v in values]))
+    simulations = next(iter(summary.values()))['simulations']
+    return html.Div([
+        html.H3(f"Monte Carlo ({simulations} simulations per method):"),
+        html.Table(rows, style={'margin': '0 auto'}),
+        dcc.Graph(figure=monte_carlo_figure(run.monte_carlo['histograms'])),
+        html.A("Summary as JSON", href=monte_carlo_url(run.id), style={'color': '#FFC107'}),
+    ], style=style)
+
 @app.callback(
-    Output("results-container", "children"),
-    [Input("params-used-store", "data"),
-     Input("metrics-store", "data"),
-     Input("trade-log-store", "data")],
+    [Output("results-container", "children"),
+     Output("trade-table-div", "style"),
+     Output("trade-table", "page_current")],
+    Input("run-id-store", "data"),
 )
-def display_backtest_results(used_params, metrics_data, trade_log_data):
+@timed('callback.display_backtest_results')
+def display_backtest_results(run_id):
+    border = {'marginBottom': '20px', 'padding': '10px', 'border': '1px solid #FFC107'}
+    run = get_run_store().get(run_id)
     # If there's no data, show a fallback.
-    if not used_params and not metrics_data and not trade_log_data:
+    if run is None:
         return html.Div([
             html.P("No backtest or optimization data is available.")
-        ], style={'textAlign': 'center', 'padding': '10px', 'border': '1px solid #FFC107'})
+        ], style={'textAlign': 'center', 'padding': '10px', 'border': '1px solid #FFC107'}), {'display': 'none'}, 0
 
     # Display parameters used in JSON format
+    if run.kind == 'backtest':
+        used_params = dict(run.params['strategy_params'])
+        used_params["Symbol"] = run.symbol
+        used_params["Timeframe"] = run.timeframe
+    else:
+        used_params = {"Mode": "Optimization"}
     params_display = html.Div([
         html.H3("Parameters Used:"),
         html.Pre(json.dumps(used_params, indent=2))
-    ], style={'marginBottom': '20px', 'padding': '10px', 'border': '1px solid #FFC107'})
+    ], style=border)
 
     # Display metrics
-    metrics_display = html.Div()
-    if metrics_data:
-        if "Number of Trades" in metrics_data:
-            # Means we did a backtest
-            metrics_display = html.Div([
-                html.H3("Backtest Metrics:"),
-                html.P(f"Initial Value: {metrics_data.get('Initial Value', 0):.2f}"),
-                html.P(f"Final Value: {metrics_data.get('Final Value', 0):.2f}"),
-                html.P(f"Net Profit: {metrics_data.get('Net Profit', 0):.2f}"),
-                html.P(f"Number of Trades: {metrics_data.get('Number of Trades', 0)}")
-            ], style={'marginBottom': '20px', 'padding': '10px', 'border': '1px solid #FFC107'})
-        elif "Best Strategy Params" in metrics_data:
-            # Means we did an optimization
-            bval = metrics_data.get("Best Portfolio Value", 0)
-            bparams = metrics_data.get("Best Strategy Params", {})
-            metrics_display = html.Div([
-                html.H3("Optimization Metrics:"),
-                html.P(f"Best Portfolio Value: {bval:.2f}"),
-                html.Pre(json.dumps(bparams, indent=2))
-            ], style={'marginBottom': '20px', 'padding': '10px', 'border': '1px solid #FFC107'})
-
-    # Display trade log
-    trades_display = html.Div()
-    if trade_log_data and len(trade_log_data) > 0:
-        trades_display = html.Div([
-            html.H3("Complete Trade Log:"),
-            dash_table.DataTable(
-                columns=[{"name": col, "id": col} for col in trade_log_data[0].keys()],
-                data=trade_log_data,
-                style_table={'overflowX': 'auto'},
-                style_cell={'textAlign': 'left', 'backgroundColor': '#222', 'color': '#FFC107'},
-                page_size=10
-            )
-        ], style={'marginBottom': '20px', 'padding': '10px', 'border': '1px solid #FFC107'})
+    if run.kind == 'backtest':
+        init_val, final_val = run.result['initial_value'], run.result['final_value']
+        metrics_display = html.Div([
+            html.H3("Backtest Metrics:"),
+            html.P(f"Initial Value: {init_val:.2f}"),
+            html.P(f"Final Value: {final_val:.2f}"),
+            html.P(f"Net Profit: {final_val - init_val:.2f}"),
+            html.P(f"Number of Trades: {len(run.trade_log)}")
+        ], style=border)
     else:
-        trades_display = html.Div([
-            html.P("No trades were executed or no trade log is available.")
-        ], style={'textAlign': 'center', 'padding': '10px', 'border': '1px solid #FFC107'})
+        metrics_display = html.Div([
+            html.H3("Optimization Metrics:"),
+            html.P(f"Best Portfolio Value: {run.result['best_value']:.2f}"),
+            html.Pre(json.dumps(run.result['best_params'], indent=2))
+        ], style=border)
+
+    # The trade table pages through the run on the server
+    if len(run.trade_log) > 0:
+        if run.monte_carlo is not None:
+            return html.Div([params_display, metrics_display, monte_carlo_display(run, border)]), border, 0
+        return html.Div([params_display, metrics_display]), border, 0
+    trades_display = html.Div([
+        html.P("No trades were executed or no trade log is available.")
+    ], style={'textAlign': 'center', 'padding': '10px', 'border': '1px solid #FFC107'})
+    return html.Div([params_display, metrics_display, trades_display]), {'display': 'none'}, 0
 
-    return html.Div([params_display, metrics_display, trades_display])
+@app.callback(
+    [Output("trade-table", "data"),
+     Output("trade-table", "page_count")],
+    [Input("run-id-store", "data"),
+     Input("trade-table", "page_current"),
+     Input("trade-table", "page_size"),
+     Input("trade-table", "sort_by")]
+)
+@timed('callback.trade_table_page')
+def trade_table_page(run_id, page_current, page_size, sort_by):
+    # One page of the run's trades; only that page travels to the browser
+    run = get_run_store().get(run_id)
+    if run is None:
+        return [], 1
+    return run.trade_page(page_current or 0, page_size, sort_by)
 
 # ------------------------
 # CSV Download Callback
 # ------------------------
 @app.callback(
-    Output("download-trade-log", "data"),
-    Input("download-btn", "n_clicks"),
-    State("trade-log-store", "data"),
-    prevent_initial_call=True
+    Output("download-link", "href"),
+    Input("run-id-store", "data")
 )
-def download_trade_log(n_clicks, trade_log_data):
-    if not trade_log_data or len(trade_log_data) == 0:
-        return None
-    df = pd.DataFrame(trade_log_data)
-    return dcc.send_data_frame(df.to_csv, "trade_log.csv", index=False)
+@timed('callback.download_trade_log')
+def download_trade_log(run_id):
+    # Points the download button at the run's streamed CSV
+    run = get_run_store().get(run_id)
+    if run is None or run.kind != 'backtest':
+        return ""
+    return trades_csv_url(run_id)
 
 if __name__ == "__main__":
     app.run_server(debug=True)
@@ -1,39 +1,226 @@
 # data.py
-import requests
+import time
+import threading
+import numpy as np
 import pandas as pd
-import dateparser
+from kline_cache import KlineCache
+from downloader import get_downloader, interval_to_ms, DEFAULT_CONCURRENCY, KLINE_LIMIT
+from resample import Resampler, resample_ohlcv, index_ms
+from instrumentation import phase, record_phase, count
 
-def get_historical_data(symbol='BTCUSDT', interval='5m', start_str='1 month ago UTC'):
-    # Public Binance endpoint approach
-    base_url = "https://api.binance.com/api/v3/klines"
+BINANCE_KLINES_URL = "https://api.binance.com/api/v3/klines"
+# A bar whose close time is this close to "now" is still forming
+OPEN_BAR_GRACE_MS = 1000
+VALUE_COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+
+_default_cache = None
+
+
+def get_cache():
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = KlineCache()
+    return _default_cache
+
+
+def parse_start(start_str):
+    # dateparser takes a third of a second to import; only this needs it
+    import dateparser
     start_dt = dateparser.parse(start_str)
-    start_ts = int(start_dt.timestamp() * 1000)
-    
-    data = []
-    limit = 1000
-    while True:
-        params = {
-            'symbol': symbol,
-            'interval': interval,
-            'startTime': start_ts,
-            'limit': limit
-        }
-        resp = requests.get(base_url, params=params)
-        klines = resp.json()
-        if not klines:
-            break
-        data.extend(klines)
-        last_open_time = klines[-1][0]
-        if len(klines) < limit:
-            break
-        start_ts = last_open_time + 1
-    
-    df = pd.DataFrame(data, columns=[
-        'open_time', 'open', 'high', 'low', 'close', 'volume',
-        'close_time', 'quote_asset_volume', 'number_of_trades',
-        'taker_buy_base_asset_volume', 'taker_buy_quote_asset_volume', 'ignore'
-    ])
-    df['open_time'] = pd.to_datetime(df['open_time'], unit='ms')
-    df.set_index('open_time', inplace=True)
-    df = df[['open', 'high', 'low', 'close', 'volume']].astype(float)
-    return df
+    return int(start_dt.timestamp() * 1000)
+
+
+def iter_kline_pages(symbol, interval, start_ts, end_ts=None, base_url=BINANCE_KLINES_URL,
+                     concurrency=DEFAULT_CONCURRENCY):
+    # Page-aligned windows fetched concurrently over a pooled session
+    downloader = get_downloader(base_url, concurrency)
+    return downloader.iter_pages(symbol, interval, start_ts, end_ts)
+
+
+def fetch_klines(symbol, interval, start_ts, end_ts=None, base_url=BINANCE_KLINES_URL,
+                 concurrency=DEFAULT_CONCURRENCY):
+    downloader = get_downloader(base_url, concurrency)
+    return downloader.fetch(symbol, interval, start_ts, end_ts)
+
+
+class KlineColumns:
+    # Growable column buffers that raw kline pages are parsed into directly.
+    # The five price/volume columns share one (5, capacity) float64 block so
+    # the final DataFrame can wrap it without a copy. Bars whose close time is
+    # before closed_before are counted as closed; the rest are volatile.
+    def __init__(self, capacity=KLINE_LIMIT, closed_before=None):
+        capacity = max(int(capacity), 1)
+        self.open_time = np.empty(capacity, dtype=np.int64)
+        self.values = np.empty((len(VALUE_COLUMNS), capacity), dtype=np.float64)
+        self.closed_before = closed_before
+        self.n = 0
+        self.n_closed = 0
+        self.closed_end = None
+
+    def __len__(self):
+        return self.n
+
+    def reserve(self, needed):
+        capacity = len(self.open_time)
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2)
+        open_time = np.empty(capacity, dtype=np.int64)
+        open_time[:self.n] = self.open_time[:self.n]
+        values = np.empty((len(VALUE_COLUMNS), capacity), dtype=np.float64)
+        values[:, :self.n] = self.values[:, :self.n]
+        self.open_time, self.values = open_time, values
+
+    def append_klines(self, klines):
+        if self.n and klines and klines[0][0] <= self.open_time[self.n - 1]:
+            # Pages can overlap at their edges
+            last = self.open_time[self.n - 1]
+            klines = [k for k in klines if k[0] > last]
+        k = len(klines)
+        if not k:
+            return
+        self.reserve(self.n + k)
+        rows = slice(self.n, self.n + k)
+        self.open_time[rows] = [row[0] for row in klines]
+        self.values[:, rows] = np.array([row[1:6] for row in klines], dtype=np.float64).T
+        if self.n_closed == self.n:
+            if self.closed_before is None:
+                closed = k
+            else:
+                closed = 0
+                while closed < k and klines[closed][6] < self.closed_before:
+                    closed += 1
+            if closed:
+                self.n_closed += closed
+                self.closed_end = int(klines[closed - 1][6])
+        self.n += k
+
+    def append_columns(self, columns, closed_end):
+        # Bars loaded from the cache are closed by construction
+        k = len(columns['open_time'])
+        self.reserve(self.n + k)
+        rows = slice(self.n, self.n + k)
+        self.open_time[rows] = columns['open_time']
+        for i, name in enumerate(VALUE_COLUMNS):
+            self.values[i, rows] = columns[name]
+        self.n += k
+        self.n_closed = self.n
+        self.closed_end = closed_end
+
+    def columns(self, stop=None):
+        stop = self.n if stop is None else stop
+        columns = {'open_time': self.open_time[:stop]}
+        for i, name in enumerate(VALUE_COLUMNS):
+            columns[name] = self.values[i, :stop]
+        return columns
+
+    def frame(self, start_ts=None):
+        first = 0
+        if start_ts is not None:
+            first = int(np.searchsorted(self.open_time[:self.n], start_ts, side='left'))
+        index = pd.DatetimeIndex(self.open_time[first:self.n].view('datetime64[ms]'),
+                                 name='open_time', copy=False)
+        return pd.DataFrame(self.values[:, first:self.n].T, index=index,
+                            columns=list(VALUE_COLUMNS), copy=False)
+
+
+def _estimate_rows(interval, start_ts, end_ts):
+    try:
+        return max((end_ts - start_ts) // interval_to_ms(interval) + 1, 1)
+    except ValueError:
+        return KLINE_LIMIT
+
+
+def get_historical_data(symbol='BTCUSDT', interval='5m', start_str='1 month ago UTC',
+                        base_url=BINANCE_KLINES_URL, cache=None, use_cache=True,
+                        concurrency=DEFAULT_CONCURRENCY):
+    start_ts = parse_start(start_str)
+    now_ms = int(time.time() * 1000)
+
+    def append(buf, start, end=None):
+        # Waiting for pages and parsing them interleave, so each is summed
+        # over the pages and recorded as one phase
+        started = time.perf_counter()
+        download = parse = 0.0
+        pages = iter(iter_kline_pages(symbol, interval, start, end, base_url=base_url,
+                                      concurrency=concurrency))
+        while True:
+            t0 = time.perf_counter()
+            page = next(pages, None)
+            t1 = time.perf_counter()
+            download += t1 - t0
+            if page is None:
+                break
+            buf.append_klines(page)
+            parse += time.perf_counter() - t1
+        record_phase('data.download', download, started)
+        record_phase('data.parse', parse, started)
+
+    if not use_cache:
+        buf = KlineColumns(_estimate_rows(interval, start_ts, now_ms))
+        append(buf, start_ts)
+        return buf.frame()
+
+    cache = cache or get_cache()
+    with phase('data.cache_load'):
+        cached, meta = cache.load(symbol, interval)
+    count('cache_lookups_total', cache='kline', result='miss' if cached is None else 'hit')
+    buf = KlineColumns(closed_before=now_ms - OPEN_BAR_GRACE_MS)
+
+    if cached is None:
+        cov_start = start_ts
+        buf.reserve(_estimate_rows(interval, start_ts, now_ms))
+        append(buf, start_ts)
+        changed = buf.n_closed > 0
+    else:
+        cov_start = min(start_ts, meta['start'])
+        buf.reserve(_estimate_rows(interval, cov_start, now_ms))
+        if start_ts < meta['start']:
+            append(buf, start_ts, meta['start'] - 1)
+        buf.append_columns(cached, meta['end'])
+        # Only the bars after the last closed one are refetched; the still-open
+        # bar is never persisted, so it is always part of this request.
+        append(buf, meta['end'] + 1)
+        changed = start_ts < meta['start'] or buf.n_closed > len(cached['open_time'])
+
+    if changed:
+        with phase('data.cache_store'):
+            cache.store(symbol, interval, buf.columns(buf.n_closed), cov_start, buf.closed_end)
+    return buf.frame(start_ts)
+
+
+_resamplers = {}
+_resamplers_lock = threading.Lock()
+
+
+def resample_base(base, interval, key=None):
+    # resample_ohlcv(base, interval), kept up to date per key across calls:
+    # a refreshed base series only rebuilds the resampled bars from the last,
+    # possibly unfinished, one on. Without a key (or a base the kept series
+    # cannot continue) the whole base is resampled.
+    if base.empty:
+        return resample_ohlcv(base, interval)
+    with _resamplers_lock:
+        resampler = _resamplers.get(key) if key is not None else None
+        if resampler is None or not resampler.covers(base):
+            resampler = Resampler(interval)
+            if key is not None:
+                _resamplers[key] = resampler
+        resampler.update(base)
+        resampler.trim(index_ms(base.index[:1])[0])
+        return resampler.frame()
+
+
+def get_ohlcv(symbol='BTCUSDT', interval='5m', start_str='1 month ago UTC', base_interval=None, **kwargs):
+    # With a base_interval the requested timeframe is derived locally from the
+    # cached base series, so switching timeframes needs no extra download.
+    # Closed bars in the default kline cache never change, so resampled bars
+    # built from them are kept per (symbol, base_interval, interval).
+    if not base_interval or base_interval == interval:
+        return get_historical_data(symbol=symbol, interval=interval, start_str=start_str, **kwargs)
+    base = get_historical_data(symbol=symbol, interval=base_interval, start_str=start_str, **kwargs)
+    key = None
+    if kwargs.get('cache') is None and kwargs.get('use_cache', True):
+        key = (kwargs.get('base_url', BINANCE_KLINES_URL), symbol, base_interval, interval)
+    with phase('data.resample'):
+        return resample_base(base, interval, key)
@@ -0,0 +1,205 @@
+# downloader.py
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+
+KLINE_LIMIT = 1000
+DEFAULT_CONCURRENCY = 8
+
+INTERVAL_MS = {
+    '1s': 1000,
+    '1m': 60_000,
+    '3m': 3 * 60_000,
+    '5m': 5 * 60_000,
+    '15m': 15 * 60_000,
+    '30m': 30 * 60_000,
+    '1h': 3_600_000,
+    '2h': 2 * 3_600_000,
+    '4h': 4 * 3_600_000,
+    '6h': 6 * 3_600_000,
+    '8h': 8 * 3_600_000,
+    '12h': 12 * 3_600_000,
+    '1d': 86_400_000,
+    '3d': 3 * 86_400_000,
+    '1w': 7 * 86_400_000,
+}
+
+# HTTP statuses worth retrying; 418/429 mean we are being rate limited
+RETRY_STATUSES = {418, 429, 500, 502, 503, 504}
+
+
+def interval_to_ms(interval):
+    try:
+        return INTERVAL_MS[interval]
+    except KeyError:
+        raise ValueError(f"Unsupported interval: {interval}")
+
+
+class WeightThrottle:
+    # Binance reports the request weight used in the current minute through
+    # X-MBX-USED-WEIGHT-1M; stop issuing requests once we get close to the
+    # limit and resume at the next minute boundary.
+    HEADER = 'X-MBX-USED-WEIGHT-1M'
+
+    def __init__(self, limit=6000, headroom=0.9):
+        self.limit = limit
+        self.headroom = headroom
+        self._lock = threading.Lock()
+        self._minute = 0
+        self._used = 0
+        self._blocked_until = 0.0
+
+    def wait(self):
+        while True:
+            with self._lock:
+                now = time.time()
+                delay = self._blocked_until - now
+                if delay <= 0:
+                    minute = int(now // 60)
+                    if minute != self._minute:
+                        self._minute, self._used = minute, 0
+                    if self._used < self.limit * self.headroom:
+                        return
+                    delay = (minute + 1) * 60 - now
+            time.sleep(delay)
+
+    def update(self, headers):
+        used = headers.get(self.HEADER)
+        if used is None:
+            return
+        with self._lock:
+            minute = int(time.time() // 60)
+            if minute != self._minute:
+                self._minute, self._used = minute, 0
+            self._used = max(self._used, int(used))
+
+    def back_off(self, seconds):
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.time() + seconds)
+
+
+class KlineDownloader:
+    def __init__(self, base_url, concurrency=DEFAULT_CONCURRENCY, retries=5,
+                 backoff=0.5, weight_limit=6000, timeout=10):
+        self.base_url = base_url
+        self.concurrency = max(1, int(concurrency))
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.throttle = WeightThrottle(limit=weight_limit)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def close(self):
+        self.session.close()
+
+    def _get(self, params):
+        for attempt in range(self.retries + 1):
+            self.throttle.wait()
+            try:
+                resp = self.session.get(self.base_url, params=params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.retries:
+                    raise
+                time.sleep(self.backoff * 2 ** attempt)
+                continue
+            self.throttle.update(resp.headers)
+            if resp.status_code in RETRY_STATUSES and attempt < self.retries:
+                retry_after = resp.headers.get('Retry-After')
+                if retry_after is not None:
+                    self.throttle.back_off(float(retry_after))
+                else:
+                    time.sleep(self.backoff * 2 ** attempt)
+                continue
+            resp.raise_for_status()
+            return resp.json()
+
+    def _fetch_window(self, symbol, interval, start_ts, end_ts, step=None):
+        # A window normally fits in one page; keep paging in case the
+        # exchange returns fewer bars per request than asked for.
+        data = []
+        while True:
+            params = {
+                'symbol': symbol,
+                'interval': interval,
+                'startTime': start_ts,
+                'limit': KLINE_LIMIT
+            }
+            if end_ts is not None:
+                params['endTime'] = end_ts
+            klines = self._get(params)
+            if not klines:
+                break
+            data.extend(klines)
+            last_open_time = klines[-1][0]
+            if len(klines) < KLINE_LIMIT:
+                break
+            if end_ts is not None and last_open_time + (step or 1) > end_ts:
+                break
+            start_ts = last_open_time + 1
+        return data
+
+    def windows(self, interval, start_ts, end_ts):
+        span = interval_to_ms(interval) * KLINE_LIMIT
+        return [(s, min(s + span - 1, end_ts)) for s in range(start_ts, end_ts + 1, span)]
+
+    def iter_pages(self, symbol, interval, start_ts, end_ts=None):
+        # Yields the raw pages of each window in chronological order while
+        # later windows are still downloading.
+        if interval not in INTERVAL_MS:
+            yield self._fetch_window(symbol, interval, start_ts, end_ts)
+            return
+        if end_ts is None:
+            end_ts = int(time.time() * 1000)
+        step = interval_to_ms(interval)
+        windows = self.windows(interval, start_ts, end_ts)
+        if self.concurrency == 1 or len(windows) == 1:
+            for s, e in windows:
+                yield self._fetch_window(symbol, interval, s, e, step)
+            return
+        # Keep a bounded number of windows in flight so finished pages are
+        # consumed (and freed) before the rest of the range is requested.
+        max_pending = self.concurrency * 2
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            pending = deque()
+            try:
+                for s, e in windows:
+                    pending.append(pool.submit(self._fetch_window, symbol, interval, s, e, step))
+                    if len(pending) >= max_pending:
+                        yield pending.popleft().result()
+                while pending:
+                    yield pending.popleft().result()
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def fetch(self, symbol, interval, start_ts, end_ts=None):
+        data = []
+        last_open_time = None
+        for page in self.iter_pages(symbol, interval, start_ts, end_ts):
+            # Windows do not overlap, but drop any repeated edge bar anyway
+            if last_open_time is not None:
+                page = [k for k in page if k[0] > last_open_time]
+            if page:
+                data.extend(page)
+                last_open_time = page[-1][0]
+        return data
+
+
+_downloaders = {}
+_downloaders_lock = threading.Lock()
+
+
+def get_downloader(base_url, concurrency=DEFAULT_CONCURRENCY):
+    # One pooled session per endpoint and concurrency level
+    key = (base_url, concurrency)
+    with _downloaders_lock:
+        downloader = _downloaders.get(key)
+        if downloader is None:
+            downloader = _downloaders[key] = KlineDownloader(base_url, concurrency=concurrency)
+        return downloader
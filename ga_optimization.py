@@ -1,43 +1,284 @@
 # ga_optimization.py
+import math
+import time
 import random
 import multiprocessing
-from deap import base, creator, tools, algorithms
-import backtrader as bt
-from data import get_historical_data
-from strategy import PineStrategy
-from backtesting import run_backtest
+from data import get_ohlcv
+from pine_params import PINE_PARAMS, resolve_params
+from backtesting import COMMISSION, closed_bars
+from vector_engine import run_vector_batch, DEFAULT_CASH
+from indicator_cache import get_indicator_cache
+from result_cache import get_result_cache, result_key, summarize, bars_fingerprint
+from shared_data import SharedOHLCV, attach
 
+# (PineStrategy param, low, high, type). Genes evolve as floats and are
+# decoded onto the strategy params. An int param's gene spans
+# [low - 0.5, high + 0.5) and is rounded half up, so every value in
+# low..high, the two ends included, gets a unit-wide slice of the gene.
 PARAM_BOUNDARIES = [
-    # ... your param boundaries
+    ('longTermFastLen', 20, 100, int),
+    ('longTermSlowLen', 100, 300, int),
+    ('shortTermFastLen', 5, 20, int),
+    ('shortTermSlowLen', 15, 60, int),
+    ('fixedStopLossPct', 0.5, 5.0, float),
+    ('fixedTakeProfitPct', 1.0, 10.0, float),
 ]
 
-creator.create("FitnessMax", base.Fitness, weights=(1.0,))
-creator.create("Individual", list, fitness=creator.FitnessMax)
-toolbox = base.Toolbox()
+# (fast, slow) params whose decoded values must satisfy fast < slow;
+# anything else is an inverted crossover not worth a backtest
+ORDERED_PAIRS = [
+    ('longTermFastLen', 'longTermSlowLen'),
+    ('shortTermFastLen', 'shortTermSlowLen'),
+]
+
+for _name, *_ in PARAM_BOUNDARIES:
+    if _name not in PINE_PARAMS:
+        raise ValueError(f"PARAM_BOUNDARIES names unknown PineStrategy parameter {_name}")
+
+_POSITION = {bound[0]: i for i, bound in enumerate(PARAM_BOUNDARIES)}
+_PAIR_POSITIONS = [(_POSITION[fast], _POSITION[slow]) for fast, slow in ORDERED_PAIRS]
+
+def gene_bounds(bound):
+    _, low, high, kind = bound
+    return (low - 0.5, high + 0.5) if kind is int else (low, high)
+
+def _decode_gene(gene, bound):
+    _, low, high, kind = bound
+    if kind is int:
+        return min(max(int(math.floor(gene + 0.5)), low), high)
+    return float(min(max(gene, low), high))
+
+def is_ordered(ind):
+    return all(_decode_gene(ind[f], PARAM_BOUNDARIES[f]) < _decode_gene(ind[s], PARAM_BOUNDARIES[s])
+               for f, s in _PAIR_POSITIONS)
 
 def random_gene(bound):
-    return random.uniform(bound[0], bound[1])
+    return random.uniform(*gene_bounds(bound))
 
 def create_individual():
-    return [random_gene(bound) for bound in PARAM_BOUNDARIES]
+    # Drawn again until every ordered pair is in order, so the initial
+    # population is uniform over the valid combinations
+    while True:
+        ind = [random_gene(bound) for bound in PARAM_BOUNDARIES]
+        if is_ordered(ind):
+            return ind
+
+def clamp(ind):
+    # Crossover and mutation can step outside the bounds, and can invert an
+    # ordered pair: then the slow gene is moved just above the fast one
+    # (or, where the slow range ends first, the fast one just below it)
+    for i, bound in enumerate(PARAM_BOUNDARIES):
+        low, high = gene_bounds(bound)
+        ind[i] = min(max(ind[i], low), high)
+    for f, s in _PAIR_POSITIONS:
+        fast = _decode_gene(ind[f], PARAM_BOUNDARIES[f])
+        slow = _decode_gene(ind[s], PARAM_BOUNDARIES[s])
+        if fast >= slow:
+            if fast + 1 <= PARAM_BOUNDARIES[s][2]:
+                ind[s] = float(fast + 1)
+            else:
+                ind[f] = float(slow - 1)
+    return ind
+
+def decode(ind):
+    return {bound[0]: _decode_gene(gene, bound) for gene, bound in zip(ind, PARAM_BOUNDARIES)}
+
+# Dataset the parent published through shared memory, attached once per
+# worker, and the fixed params every individual is evaluated with
+_worker_df = None
+_worker_params = {}
+
+def init_worker(handle, base_params=None):
+    global _worker_df, _worker_params
+    _worker_df = attach(handle)
+    _worker_params = dict(base_params or {})
+
+def make_pool(shared, processes=None, base_params=None):
+    # Workers map the parent's SharedOHLCV read-only instead of each
+    # downloading or unpickling their own copy of the bars.
+    return multiprocessing.Pool(processes, initializer=init_worker, initargs=(shared.handle, base_params))
+
+# Individuals per evaluation task: enough for run_vector_batch to share the
+# signal masks of repeated EMA pairs, few enough to keep a pool busy
+EVAL_BATCH_SIZE = 8
+
+def eval_batch(inds):
+    # Final portfolio values of a batch of individuals, as one
+    # run_vector_batch over the shared bars. Each worker keeps its own
+    # indicator cache, so EMA periods seen before are not recomputed.
+    param_sets = [dict(_worker_params, **decode(ind)) for ind in inds]
+    results = run_vector_batch(_worker_df, param_sets, commission=COMMISSION, with_trades=False,
+                               cache=get_indicator_cache())
+    return [(final_value,) for _, final_value, _ in results]
+
+_toolbox = None
+
+def get_toolbox():
+    # DEAP's creator classes and toolbox, set up on first use rather than at
+    # import, so importing this module (e.g. for PARAM_BOUNDARIES) or a pool
+    # worker, which only ever sees plain gene lists, skips it. Classes that
+    # already exist are kept: creating them again would replace them.
+    global _toolbox
+    if _toolbox is None:
+        from deap import base, creator, tools
+        if not hasattr(creator, "FitnessMax"):
+            creator.create("FitnessMax", base.Fitness, weights=(1.0,))
+        if not hasattr(creator, "Individual"):
+            creator.create("Individual", list, fitness=creator.FitnessMax)
+        toolbox = base.Toolbox()
+        toolbox.register("individual", tools.initIterate, creator.Individual, create_individual)
+        toolbox.register("population", tools.initRepeat, list, toolbox.individual)
+        toolbox.register("evaluate", eval_batch)
+        toolbox.register("mate", tools.cxBlend, alpha=0.5)
+        # A tenth of each range, so wide and narrow params mutate alike
+        toolbox.register("mutate", tools.mutGaussian, mu=0,
+                         sigma=[(high - low) / 10 for _, low, high, _ in PARAM_BOUNDARIES], indpb=0.2)
+        toolbox.register("select", tools.selTournament, tournsize=3)
+        toolbox.register("map", map)
+        _toolbox = toolbox
+    return _toolbox
+
+class Scores:
+    # Fitness already known for decoded params: this run's evaluations, backed
+    # by the persistent result cache (shared with run_backtest) when given one
+    def __init__(self, result_cache=None, data_fp=None, base_params=None):
+        self.local = {}
+        self.result_cache = result_cache
+        self.data_fp = data_fp
+        self.base_params = dict(base_params or {})
+
+    def __len__(self):
+        return len(self.local)
+
+    def _params(self, key):
+        return dict(self.base_params, **dict(zip((b[0] for b in PARAM_BOUNDARIES), key)))
+
+    def get(self, key):
+        if key not in self.local and self.result_cache is not None:
+            hit = self.result_cache.get(result_key(self.data_fp, self._params(key), COMMISSION),
+                                        need_trades=False)
+            if hit is not None:
+                self.local[key] = (hit[1],)
+        return self.local.get(key)
+
+    def put(self, key, fit):
+        self.local[key] = fit
+        if self.result_cache is not None:
+            params = self._params(key)
+            self.result_cache.put(result_key(self.data_fp, params, COMMISSION), DEFAULT_CASH, fit[0],
+                                  summarize(DEFAULT_CASH, fit[0]), fingerprint=self.data_fp, params=params,
+                                  commission=COMMISSION)
+
+def evaluate_population(individuals, scores):
+    # Individuals that decode to params already scored reuse the score; each
+    # new params set is evaluated once, in batches of EVAL_BATCH_SIZE through
+    # toolbox.map.
+    toolbox = get_toolbox()
+    pending = {}
+    for ind in individuals:
+        key = tuple(decode(ind).values())
+        fit = scores.get(key)
+        if fit is not None:
+            ind.fitness.values = fit
+        else:
+            pending.setdefault(key, []).append(ind)
+    keys = list(pending)
+    batches = [keys[i:i + EVAL_BATCH_SIZE] for i in range(0, len(keys), EVAL_BATCH_SIZE)]
+    genes = [[list(pending[key][0]) for key in batch] for batch in batches]
+    for batch, fits in zip(batches, toolbox.map(toolbox.evaluate, genes)):
+        for key, fit in zip(batch, fits):
+            scores.put(key, fit)
+            for ind in pending[key]:
+                ind.fitness.values = fit
+    return len(keys)
+
+def evolve(population_size=40, generations=25, patience=6, cxpb=0.6, mutpb=0.3, seed=None,
+           progress=None, scores=None):
+    # eaSimple with deduplicated evaluation and early stopping once the best
+    # individual has not improved for `patience` generations. toolbox.map
+    # must already be registered (a pool's map or the builtin).
+    from deap import tools, algorithms
+    toolbox = get_toolbox()
+    if seed is not None:
+        random.seed(seed)
+    population = toolbox.population(n=population_size)
+    hof = tools.HallOfFame(1)
+    scores = scores if scores is not None else Scores()
+    started = time.perf_counter()
+    evaluations = evaluate_population(population, scores)
+    hof.update(population)
+    best, stalled = hof[0].fitness.values[0], 0
+
+    for gen in range(1, generations + 1):
+        offspring = toolbox.select(population, len(population))
+        offspring = [clamp(ind) for ind in algorithms.varAnd(offspring, toolbox, cxpb, mutpb)]
+        evaluations += evaluate_population([ind for ind in offspring if not ind.fitness.valid], scores)
+        population[:] = offspring
+        hof.update(population)
+
+        if hof[0].fitness.values[0] > best:
+            best, stalled = hof[0].fitness.values[0], 0
+        else:
+            stalled += 1
+        elapsed = time.perf_counter() - started
+        if progress is not None:
+            progress({
+                'generation': gen,
+                'best_value': best,
+                'evaluations': evaluations,
+                'unique_params': len(scores),
+                'elapsed': elapsed,
+                'gens_per_sec': gen / elapsed if elapsed else 0.0,
+            })
+        if stalled >= patience:
+            break
+    return float(best), decode(hof[0])
 
-toolbox.register("individual", tools.initIterate, creator.Individual, create_individual)
-toolbox.register("population", tools.initRepeat, list, toolbox.individual)
+def run_optimization(symbol='BTCUSDT', timeframe='5m', start_str='1 month ago UTC', base_timeframe=None,
+                     strategy_params=None, processes=None, population_size=40, generations=25, patience=6,
+                     seed=None, progress=None, use_result_cache=True):
+    # strategy_params are held fixed; PARAM_BOUNDARIES are searched. Returns
+    # the best final portfolio value and the params that produced it.
+    # Scores are shared with run_backtest through the result cache.
+    strategy_params = dict(strategy_params or {})
+    check_params(strategy_params)
+    df = get_ohlcv(symbol=symbol, interval=timeframe, start_str=start_str, base_interval=base_timeframe)
+    df = closed_bars(df, timeframe)
+    result_cache = get_result_cache() if use_result_cache else None
+    return optimize_frame(df, strategy_params, processes, population_size, generations, patience,
+                          seed, progress, result_cache)
 
-def eval_individual(ind):
-    # ... run a single backtest with these parameters
-    # ... return final portfolio value as fitness
-    return (0,)
+def check_params(strategy_params):
+    # Raises ValueError for base params the optimizer can't search around
+    if resolve_params(strategy_params)['enableHigherTFFilter']:
+        # The HTF trend depends on the long EMA lengths being searched
+        raise ValueError("The optimizer does not support enableHigherTFFilter")
 
-toolbox.register("evaluate", eval_individual)
-toolbox.register("mate", tools.cxBlend, alpha=0.5)
-toolbox.register("mutate", tools.mutGaussian, mu=0, sigma=1.0, indpb=0.2)
-toolbox.register("select", tools.selTournament, tournsize=3)
 
-def run_optimization(symbol='BTCUSDT', timeframe='5m'):
-    # ... run your GA, return best_value, best_params
-    return 100000, {"Some Param": 123}
+def optimize_frame(df, strategy_params=None, processes=None, population_size=40, generations=25, patience=6,
+                   seed=None, progress=None, result_cache=None):
+    global _worker_df, _worker_params
+    check_params(strategy_params)
+    toolbox = get_toolbox()
+    scores = Scores(result_cache, bars_fingerprint(df) if result_cache is not None else None, strategy_params)
+    kwargs = dict(population_size=population_size, generations=generations, patience=patience,
+                  seed=seed, progress=progress, scores=scores)
+    if processes == 1:
+        # Evaluate in this process; handy for profiling and small searches
+        _worker_df, _worker_params = df, dict(strategy_params or {})
+        toolbox.register("map", map)
+        return evolve(**kwargs)
+    with SharedOHLCV(df) as shared:
+        with make_pool(shared, processes, strategy_params) as pool:
+            toolbox.register("map", pool.map)
+            try:
+                return evolve(**kwargs)
+            finally:
+                toolbox.register("map", map)
 
 if __name__ == "__main__":
-    val, params = run_optimization()
+    def report(p):
+        print(f"gen {p['generation']:>3}  best {p['best_value']:.2f}  "
+              f"evals {p['evaluations']}  {p['gens_per_sec']:.2f} gens/s")
+    val, params = run_optimization(progress=report)
     print(val, params)
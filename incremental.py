@@ -0,0 +1,167 @@
+# incremental.py
+import threading
+from collections import OrderedDict
+import numpy as np
+import indicators
+from pine_params import resolve_params
+from result_cache import result_key, bars_fingerprint
+from resample import index_ms
+from vector_engine import (compute_indicators, entry_signals, first_bar, simulate, portfolio_value,
+                           trade_log_from, with_filter_columns, DEFAULT_CASH, DEFAULT_COMMISSION)
+
+# Resumable vectorized backtests. A snapshot holds everything PineStrategy
+# and the broker carry from one bar to the next: the last two values of each
+# EMA (the crossover looks one bar back), the ATR and previous close, cash,
+# the open position, a signal still waiting for its fill, and the trades so
+# far. Resuming on the same bars plus newly appended ones simulates only the
+# new bars and gives exactly what a full run over all of them gives.
+# Snapshots are anchored at their first bar, so a resumed run always starts
+# where the snapshot's run started. Entry filter masks are whole-series
+# arrays (see vector_engine.filter_masks) and are recomputed over all bars.
+
+EMA_KEYS = (('emaLongFast', 'longTermFastLen'), ('emaLongSlow', 'longTermSlowLen'),
+            ('emaShortFast', 'shortTermFastLen'), ('emaShortSlow', 'shortTermSlowLen'))
+
+
+class Snapshot:
+    def __init__(self, anchor_ms, bars, data_fp, params_key, initial_cash, emas, atr, last_close, cash,
+                 broker, trades, log):
+        self.anchor_ms = anchor_ms
+        self.bars = bars
+        self.data_fp = data_fp
+        self.params_key = params_key
+        self.initial_cash = initial_cash
+        self.emas = emas
+        self.atr = atr
+        self.last_close = last_close
+        self.cash = cash
+        self.broker = broker
+        self.trades = trades
+        # trade_log_from(trades) for the snapshot's bars, kept so a resume
+        # only formats the new trades
+        self.log = log
+
+    def matches(self, df, params_key, initial_cash):
+        # Same params and the snapshot's bars are an unchanged prefix of df
+        if params_key != self.params_key or initial_cash != self.initial_cash or len(df) < self.bars:
+            return False
+        if index_ms(df.index[:1])[0] != self.anchor_ms:
+            return False
+        return bars_fingerprint(df.iloc[:self.bars]) == self.data_fp
+
+
+def _take(df, params_key, initial_cash, ind, cash, broker, trades, log):
+    # Snapshot at df's last bar; ind holds indicator arrays ending there
+    return Snapshot(
+        anchor_ms=int(index_ms(df.index[:1])[0]),
+        bars=len(df),
+        data_fp=bars_fingerprint(df),
+        params_key=params_key,
+        initial_cash=initial_cash,
+        emas={name: (float(ind[name][-2]), float(ind[name][-1])) for name, _ in EMA_KEYS},
+        atr=float(ind['atr'][-1]) if 'atr' in ind else None,
+        last_close=float(df['close'].iat[-1]),
+        cash=cash,
+        broker=broker,
+        trades=trades,
+        log=log,
+    )
+
+
+def run_incremental(df, strategy_params=None, snapshot=None, commission=DEFAULT_COMMISSION, cash=DEFAULT_CASH,
+                    cache=None):
+    # Returns (initial_value, final_value, trade_log, snapshot). Pass the
+    # returned snapshot back with the same bars plus new ones to continue.
+    # Without a usable snapshot (other params, other data, or too little
+    # history) the whole frame is simulated. snapshot is None when there is
+    # too little history to resume from.
+    params = resolve_params(strategy_params)
+    key = result_key('incremental', params, commission)
+    open_ = df['open'].to_numpy(dtype=np.float64)
+    close = df['close'].to_numpy(dtype=np.float64)
+    n = len(close)
+
+    if snapshot is not None and snapshot.matches(df, key, cash):
+        m = snapshot.bars
+        if m == n:
+            return _result(df, snapshot)
+        # Indicators continue from the snapshot. The stored EMA values sit at
+        # bars m-2 and m-1, so the crossover test on bar m-1 can be redone
+        # (its signal may have been waiting for bar m to fill).
+        ind = {}
+        for name, period_param in EMA_KEYS:
+            prev2, prev1 = snapshot.emas[name]
+            ind[name] = np.r_[prev2, prev1, indicators.ema_from(prev1, close[m:], int(params[period_param]))]
+        if snapshot.atr is not None:
+            # Laid out over all n bars; the exits read it from bar m-1 on
+            ind['atr'] = np.r_[np.full(m - 1, np.nan), snapshot.atr, indicators.atr_from(
+                snapshot.atr, snapshot.last_close, df['high'].to_numpy()[m:], df['low'].to_numpy()[m:],
+                close[m:], int(params['atrPeriod']))]
+        # Filter masks come from all bars, so the slice keeps their warm-up
+        tail = with_filter_columns(df, params, cache).iloc[m - 2:]
+        long_tail, short_tail = entry_signals(ind, params, tail)
+        long_sig = np.zeros(n, dtype=bool)
+        short_sig = np.zeros(n, dtype=bool)
+        long_sig[m - 1:] = long_tail[1:]
+        short_sig[m - 1:] = short_tail[1:]
+        broker = dict(snapshot.broker)
+        final_cash, _, _, trades = simulate(
+            open_, close, long_sig, short_sig, broker['resume_at'], params, commission, snapshot.cash,
+            state=broker, atr=ind.get('atr'))
+        return _result(df, _take(df, key, cash, ind, final_cash, broker, snapshot.trades + trades,
+                                  snapshot.log + trade_log_from(trades, df.index)))
+
+    ind = compute_indicators(df, params, cache)
+    long_sig, short_sig = entry_signals(ind, params, df, cache)
+    broker = {}
+    start = first_bar(params)
+    final_cash, pos, entry_price, trades = simulate(
+        open_, close, long_sig, short_sig, start, params, commission, cash, state=broker, atr=ind.get('atr'))
+    if n < start + 2:
+        # Indicators are not seeded yet; nothing worth resuming from
+        final_value = portfolio_value(final_cash, pos, entry_price, close[-1]) if n else cash
+        return cash, final_value, trade_log_from(trades, df.index), None
+    return _result(df, _take(df, key, cash, ind, final_cash, broker, trades, trade_log_from(trades, df.index)))
+
+
+def _result(df, snapshot):
+    broker = snapshot.broker
+    final_value = portfolio_value(snapshot.cash, broker['pos'], broker['entry_price'], snapshot.last_close)
+    return snapshot.initial_cash, final_value, snapshot.log, snapshot
+
+
+class SnapshotStore:
+    # Latest snapshot per (symbol, timeframe, base timeframe, params); kept in
+    # memory, least recently used first out
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            snapshot = self._entries.get(key)
+            if snapshot is not None:
+                self._entries.move_to_end(key)
+            return snapshot
+
+    def put(self, key, snapshot):
+        with self._lock:
+            self._entries[key] = snapshot
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_default_store = None
+
+
+def get_snapshot_store():
+    global _default_store
+    if _default_store is None:
+        _default_store = SnapshotStore()
+    return _default_store
@@ -0,0 +1,157 @@
+# indicator_cache.py
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+import indicators
+from resample import index_ms
+from instrumentation import count
+
+# Indicator series keyed by (dataset fingerprint, indicator name, period), so
+# parameter sets that share a period share one computed array. Entries are
+# read-only float64 arrays with the same values (bit for bit) and NaN warm-up
+# as the backtrader indicators they replace. Least recently used entries are
+# evicted once the cached arrays exceed max_bytes.
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# name -> (compute(columns, period), backtrader minperiod(period))
+INDICATORS = {
+    'ema': (lambda c, p: indicators.ema(c['close'], p), lambda p: p),
+    'atr': (lambda c, p: indicators.atr(c['high'], c['low'], c['close'], p), indicators.minperiod_atr),
+    'rsi': (lambda c, p: indicators.rsi(c['close'], p), indicators.minperiod_rsi),
+    'adx': (lambda c, p: indicators.adx(c['high'], c['low'], c['close'], p), indicators.minperiod_adx),
+    'volume_ma': (lambda c, p: indicators.sma(c['volume'], p), lambda p: p),
+}
+SOURCE_COLUMNS = ('high', 'low', 'close', 'volume')
+
+
+def fingerprint(df, columns=SOURCE_COLUMNS):
+    # Content hash of the bars: the same candles give the same key no matter
+    # which frame object (or process) they come from. By default only the
+    # columns the indicators read are hashed; see result_cache.bars_fingerprint
+    # for the key of anything that also depends on the fills.
+    h = hashlib.blake2b(digest_size=16)
+    h.update(np.ascontiguousarray(index_ms(df.index)))
+    for name in columns:
+        h.update(np.ascontiguousarray(df[name].to_numpy(dtype=np.float64)))
+    return h.hexdigest()
+
+
+def minperiod(name, period):
+    return INDICATORS[name][1](int(period))
+
+
+class IndicatorCache:
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def bind(self, df, key=None):
+        # Per-dataset view; the fingerprint is computed once here
+        return BoundIndicators(self, df, key or fingerprint(df))
+
+    def get(self, key, name, period, compute):
+        entry = (key, name, int(period))
+        with self._lock:
+            values = self._entries.get(entry)
+            if values is not None:
+                self._entries.move_to_end(entry)
+                self.hits += 1
+            else:
+                self.misses += 1
+        count('cache_lookups_total', cache='indicator', result='hit' if values is not None else 'miss')
+        if values is not None:
+            return values
+        values = np.asarray(compute(), dtype=np.float64)
+        values.flags.writeable = False
+        with self._lock:
+            if entry not in self._entries and values.nbytes <= self.max_bytes:
+                self._entries[entry] = values
+                self.nbytes += values.nbytes
+                self._evict()
+        return values
+
+    def resize(self, max_bytes):
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def _evict(self):
+        while self.nbytes > self.max_bytes and self._entries:
+            _, values = self._entries.popitem(last=False)
+            self.nbytes -= values.nbytes
+            self.evictions += 1
+
+    def invalidate(self, key=None):
+        # Drop one dataset's entries, or everything
+        with self._lock:
+            for entry in [e for e in self._entries if key is None or e[0] == key]:
+                self.nbytes -= self._entries.pop(entry).nbytes
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'entries': len(self._entries),
+            'bytes': self.nbytes,
+            'max_bytes': self.max_bytes,
+        }
+
+    def reset_stats(self):
+        self.hits = self.misses = self.evictions = 0
+
+
+class BoundIndicators:
+    # IndicatorCache lookups for one dataset: ema(50), atr(14), ...
+    def __init__(self, cache, df, key):
+        self.cache = cache
+        self.key = key
+        self._df = df
+        self._columns = None
+
+    def _source(self):
+        if self._columns is None:
+            self._columns = {name: self._df[name].to_numpy(dtype=np.float64) for name in SOURCE_COLUMNS}
+        return self._columns
+
+    def get(self, name, period):
+        compute = INDICATORS[name][0]
+        return self.cache.get(self.key, name, period, lambda: compute(self._source(), int(period)))
+
+    def ema(self, period):
+        return self.get('ema', period)
+
+    def atr(self, period):
+        return self.get('atr', period)
+
+    def rsi(self, period):
+        return self.get('rsi', period)
+
+    def adx(self, period):
+        return self.get('adx', period)
+
+    def volume_ma(self, period):
+        return self.get('volume_ma', period)
+
+
+_default_cache = None
+
+
+def get_indicator_cache():
+    # Process-wide cache; optimizer workers each get their own
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = IndicatorCache()
+    return _default_cache
@@ -0,0 +1,121 @@
+# indicators.py
+import math
+import numpy as np
+
+# Whole-array versions of the backtrader indicators PineStrategy uses. They
+# follow backtrader's "once" implementations operation for operation (SMA seed
+# via math.fsum, then prev * (1 - alpha) + x * alpha), so values agree bit for
+# bit and a vectorized backtest takes exactly the same decisions. Bars before
+# an indicator's minimum period are NaN.
+
+
+def _smooth(values, period, alpha, first=0):
+    # Exponential smoothing seeded with the SMA of the first `period` valid values
+    values = np.asarray(values, dtype=np.float64)
+    out = np.full(len(values), np.nan)
+    seed_at = first + period - 1
+    if period < 1 or seed_at >= len(values):
+        return out
+    prev = math.fsum(values[first:seed_at + 1].tolist()) / period
+    out[seed_at] = prev
+    out[seed_at + 1:] = _continue(prev, values[seed_at + 1:], alpha)
+    return out
+
+
+def _continue(prev, values, alpha):
+    # The recurrence is inherently sequential; a tight loop over Python floats
+    # with a bound append is the cheapest exact way to run it
+    alpha1 = 1.0 - alpha
+    smoothed = []
+    append = smoothed.append
+    for x in np.asarray(values, dtype=np.float64).tolist():
+        prev = prev * alpha1 + x * alpha
+        append(prev)
+    return np.array(smoothed, dtype=np.float64)
+
+
+def ema(values, period):
+    return _smooth(values, period, 2.0 / (1.0 + period))
+
+
+def ema_from(prev, values, period):
+    # Continues an EMA whose last value was prev over newly appended values
+    return _continue(prev, values, 2.0 / (1.0 + period))
+
+
+def smma(values, period, first=0):
+    # Wilder's smoothing (backtrader's SmoothedMovingAverage)
+    return _smooth(values, period, 1.0 / period, first)
+
+
+def true_range(high, low, close):
+    high, low, close = (np.asarray(a, dtype=np.float64) for a in (high, low, close))
+    tr = np.full(len(close), np.nan)
+    prev_close = close[:-1]
+    tr[1:] = np.maximum(high[1:], prev_close) - np.minimum(low[1:], prev_close)
+    return tr
+
+
+def atr(high, low, close, period):
+    return smma(true_range(high, low, close), period, first=1)
+
+
+def atr_from(prev, prev_close, high, low, close, period):
+    # Continues an ATR over new bars; prev_close is the close before them
+    close = np.asarray(close, dtype=np.float64)
+    tr = true_range(np.r_[np.nan, high], np.r_[np.nan, low], np.r_[prev_close, close])[1:]
+    return _continue(prev, tr, 1.0 / period)
+
+
+def sma(values, period):
+    # backtrader's SMA takes an exact math.fsum of every window
+    values = np.asarray(values, dtype=np.float64)
+    out = np.full(len(values), np.nan)
+    if period < 1 or period > len(values):
+        return out
+    src = values.tolist()
+    out[period - 1:] = [math.fsum(src[i - period + 1:i + 1]) / period
+                        for i in range(period - 1, len(src))]
+    return out
+
+
+def rsi(values, period):
+    # Wilder's RSI: SMMA of up and down moves, rs = maup / madown
+    values = np.asarray(values, dtype=np.float64)
+    change = np.full(len(values), np.nan)
+    change[1:] = values[1:] - values[:-1]
+    maup = smma(np.maximum(change, 0.0), period, first=1)
+    madown = smma(np.maximum(-change, 0.0), period, first=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return 100.0 - 100.0 / (1.0 + maup / madown)
+
+
+def adx(high, low, close, period):
+    # Average directional index with Wilder smoothing throughout
+    high, low = np.asarray(high, dtype=np.float64), np.asarray(low, dtype=np.float64)
+    upmove = np.full(len(high), np.nan)
+    downmove = np.full(len(high), np.nan)
+    upmove[1:] = high[1:] - high[:-1]
+    downmove[1:] = low[:-1] - low[1:]
+    plus_dm = np.where((upmove > downmove) & (upmove > 0.0), upmove, 0.0)
+    minus_dm = np.where((downmove > upmove) & (downmove > 0.0), downmove, 0.0)
+    rng = atr(high, low, close, period)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        di_plus = 100.0 * smma(plus_dm, period, first=1) / rng
+        di_minus = 100.0 * smma(minus_dm, period, first=1) / rng
+        dx = np.abs(di_plus - di_minus) / (di_plus + di_minus)
+    return 100.0 * smma(dx, period, first=period)
+
+
+def minperiod_rsi(period):
+    return period + 1
+
+
+def minperiod_adx(period):
+    return 2 * period
+
+
+def minperiod_atr(period):
+    # TrueRange needs the previous close, so ATR is valid one bar later than
+    # its period would suggest
+    return period + 1
@@ -0,0 +1,213 @@
+# instrumentation.py
+import os
+import time
+import threading
+import contextvars
+from functools import wraps
+from contextlib import contextmanager
+import numpy as np
+
+# Phase timers, counters and latency histograms on the hot paths: kline
+# downloads and parsing, feed building, cerebro.run(), figure building,
+# cache lookups. Everything recorded goes to the process-wide registry,
+# served as Prometheus text at /metrics, and to the profile of the run in
+# progress, if there is one; jobs attach that profile to their result as
+# JSON. Jobs run in pool processes, so the dashboard process merges each
+# finished job's profile into its own registry.
+
+# Per-bar PineStrategy.next() latencies cost a timer call per bar, so they
+# are only collected on request (run_backtest(profile_next=True) or this)
+PROFILE_NEXT = os.environ.get('BACKTEST_PROFILE_NEXT', '') == '1'
+
+PHASE_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+NEXT_BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 1e-3, 1e-2)
+ORDER_BUCKETS = (1e-5, 5e-5, 1e-4, 5e-4, 1e-3, 5e-3, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+CALL_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# name -> (type, help, histogram buckets)
+METRICS = {
+    'phase_seconds': ('histogram', "Wall time of instrumented phases", PHASE_BUCKETS),
+    'strategy_next_seconds': ('histogram', "Latency of one PineStrategy.next() call", NEXT_BUCKETS),
+    'exchange_call_seconds': ('histogram', "Latency of one exchange API call, by method", CALL_BUCKETS),
+    'bar_to_order_seconds': ('histogram', "From a closed bar arriving to its order being decided / acknowledged",
+                             ORDER_BUCKETS),
+    'cache_lookups_total': ('counter', "Cache lookups by cache and outcome", None),
+    'jobs_finished_total': ('counter', "Background jobs finished by kind and status", None),
+}
+
+
+def _labels(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _label_text(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in pairs) + '}'
+
+
+def _le(bound):
+    return f"{bound:g}"
+
+
+class Registry:
+    # Counters and histograms keyed by (name, labels); histogram buckets are
+    # stored per bucket and only made cumulative for the Prometheus text
+    def __init__(self):
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, values, **labels):
+        # One value or an array of them
+        buckets = METRICS[name][2]
+        values = np.asarray(values, dtype=np.float64).ravel()
+        counts = np.bincount(np.searchsorted(buckets, values), minlength=len(buckets) + 1)
+        self._add_histogram((name, _labels(labels)), counts, float(values.sum()), len(values))
+
+    def _add_histogram(self, key, counts, total, n):
+        with self._lock:
+            entry = self._histograms.get(key)
+            if entry is None:
+                entry = self._histograms[key] = [np.zeros(len(counts), dtype=np.int64), 0.0, 0]
+            entry[0] += counts
+            entry[1] += total
+            entry[2] += n
+
+    def snapshot(self):
+        # JSON-friendly; merge() takes it back
+        with self._lock:
+            return {
+                'counters': [{'name': name, 'labels': dict(labels), 'value': value}
+                             for (name, labels), value in self._counters.items()],
+                'histograms': [{'name': name, 'labels': dict(labels), 'buckets': counts.tolist(),
+                                'sum': total, 'count': n}
+                               for (name, labels), (counts, total, n) in self._histograms.items()],
+            }
+
+    def merge(self, snapshot):
+        for c in snapshot.get('counters', ()):
+            self.inc(c['name'], c['value'], **c['labels'])
+        for h in snapshot.get('histograms', ()):
+            self._add_histogram((h['name'], _labels(h['labels'])), np.asarray(h['buckets'], dtype=np.int64),
+                                h['sum'], h['count'])
+
+    def prometheus(self):
+        # Text exposition format 0.0.4
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = [(key, (counts.copy(), total, n))
+                          for key, (counts, total, n) in sorted(self._histograms.items(), key=lambda kv: kv[0])]
+        lines = []
+        for name, (kind, help_text, buckets) in METRICS.items():
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+            if kind == 'counter':
+                lines += [f"{name}{_label_text(labels)} {value}" for (n, labels), value in counters if n == name]
+                continue
+            for (n, labels), (counts, total, count) in histograms:
+                if n != name:
+                    continue
+                cumulative = np.cumsum(counts)
+                for bound, c in zip(buckets, cumulative):
+                    lines.append(f"{name}_bucket{_label_text(labels, [('le', _le(bound))])} {c}")
+                lines.append(f"{name}_bucket{_label_text(labels, [('le', '+Inf')])} {cumulative[-1]}")
+                lines.append(f"{name}_sum{_label_text(labels)} {total!r}")
+                lines.append(f"{name}_count{_label_text(labels)} {count}")
+        return '\n'.join(lines) + '\n'
+
+
+class Profile:
+    # What one run recorded: a timeline of its phases (start offsets and
+    # durations in seconds, nested phases included) and its own registry
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = []
+        self.metrics = Registry()
+
+    def add_phase(self, name, seconds, started=None):
+        start = (started if started is not None else time.perf_counter() - seconds) - self.started
+        self.phases.append({'phase': name, 'start': round(start, 6), 'seconds': round(seconds, 6)})
+
+    def to_dict(self):
+        return {'total_seconds': round(time.perf_counter() - self.started, 6), 'phases': self.phases,
+                **self.metrics.snapshot()}
+
+
+_default_registry = None
+_current_profile = contextvars.ContextVar('profile', default=None)
+
+
+def get_registry():
+    global _default_registry
+    if _default_registry is None:
+        _default_registry = Registry()
+    return _default_registry
+
+
+@contextmanager
+def profile():
+    # Collects what is recorded inside the block, in this thread, into a
+    # fresh Profile
+    p = Profile()
+    token = _current_profile.set(p)
+    try:
+        yield p
+    finally:
+        _current_profile.reset(token)
+
+
+def count(name, value=1, **labels):
+    get_registry().inc(name, value, **labels)
+    p = _current_profile.get()
+    if p is not None:
+        p.metrics.inc(name, value, **labels)
+
+
+def observe(name, values, **labels):
+    get_registry().observe(name, values, **labels)
+    p = _current_profile.get()
+    if p is not None:
+        p.metrics.observe(name, values, **labels)
+
+
+def record_phase(name, seconds, started=None):
+    # For time that is summed up piecewise, e.g. across pages of a download
+    observe('phase_seconds', seconds, phase=name)
+    p = _current_profile.get()
+    if p is not None:
+        p.add_phase(name, seconds, started)
+
+
+@contextmanager
+def phase(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_phase(name, time.perf_counter() - started, started)
+
+
+def timed(name):
+    # Decorator form of phase(), e.g. for Dash callbacks
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with phase(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def add_metrics_route(server):
+    # Prometheus scrape endpoint on the Flask server behind a Dash app
+    from flask import Response
+
+    @server.route("/metrics")
+    def metrics():
+        return Response(get_registry().prometheus(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,301 @@
+# jobs.py
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from kline_cache import DEFAULT_CACHE_DIR
+from chart import chart_data
+from instrumentation import profile, phase, count, get_registry
+
+# Background backtests and optimizations for the dashboards. Submitting
+# returns a job id at once; the job runs on a small process pool and writes
+# its status, progress and result to an on-disk SQLite store, which the UI
+# polls. At most max_concurrent jobs run at a time, the rest wait in the
+# pool's queue. Cancelling a queued job drops it; a running job stops at its
+# next progress report. Each job records a profile (see instrumentation),
+# which a finished result carries under 'profile' and which is merged into
+# the submitting process's metrics. Every job records its owner, the
+# process that submitted it (and whose pool runs it); a new queue fails
+# only the unfinished jobs whose owner is gone, so several processes can
+# share one store.
+
+DEFAULT_MAX_CONCURRENT = 2
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = 'queued', 'running', 'done', 'failed', 'cancelled'
+FINISHED = (DONE, FAILED, CANCELLED)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT,
+    status TEXT,
+    params TEXT,
+    progress TEXT,
+    result TEXT,
+    error TEXT,
+    cancel_requested INTEGER DEFAULT 0,
+    owner TEXT,
+    created REAL,
+    started REAL,
+    finished REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_created ON jobs (created);
+"""
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def _boot_id():
+    # Changes on reboot, so pids recorded before it are not mistaken for live ones
+    try:
+        with open('/proc/sys/kernel/random/boot_id') as f:
+            return f.read().strip()
+    except OSError:
+        return ''
+
+
+def process_owner(pid=None):
+    return f"{socket.gethostname()}|{_boot_id()}|{pid or os.getpid()}"
+
+
+def _pid_alive(pid):
+    if os.name != 'posix':
+        # No side-effect-free probe here; assume it is alive
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def owner_alive(owner):
+    # Owners on another host can't be checked and count as alive; rows
+    # written before owners were recorded count as gone
+    if not owner:
+        return False
+    host, boot, pid = owner.rsplit('|', 2)
+    if host != socket.gethostname():
+        return True
+    return boot == _boot_id() and _pid_alive(int(pid))
+
+
+class JobStore:
+    def __init__(self, path=None):
+        self.path = path or os.path.join(DEFAULT_CACHE_DIR, 'jobs.sqlite')
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with self._conn() as conn:
+            conn.executescript(SCHEMA)
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(jobs)")]
+            if 'owner' not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def create(self, kind, params, owner=None):
+        job_id = uuid.uuid4().hex
+        with self._conn() as conn:
+            conn.execute("INSERT INTO jobs (id, kind, status, params, progress, owner, created) "
+                         "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         (job_id, kind, QUEUED, json.dumps(params), json.dumps({}), owner or process_owner(),
+                          time.time()))
+        return job_id
+
+    def get(self, job_id):
+        row = self._conn().execute(
+            "SELECT id, kind, status, params, progress, result, error, cancel_requested, owner, created, "
+            "started, finished FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(('id', 'kind', 'status', 'params', 'progress', 'result', 'error', 'cancel_requested',
+                        'owner', 'created', 'started', 'finished'), row))
+        for field in ('params', 'progress', 'result'):
+            job[field] = json.loads(job[field]) if job[field] is not None else None
+        job['cancel_requested'] = bool(job['cancel_requested'])
+        return job
+
+    def list(self, limit=50):
+        ids = self._conn().execute("SELECT id FROM jobs ORDER BY created DESC LIMIT ?", (limit,)).fetchall()
+        return [self.get(job_id) for (job_id,) in ids]
+
+    def start(self, job_id):
+        # Atomically queued -> running; False if it was cancelled meanwhile
+        with self._conn() as conn:
+            cur = conn.execute("UPDATE jobs SET status = ?, started = ? WHERE id = ? AND status = ?",
+                               (RUNNING, time.time(), job_id, QUEUED))
+        return cur.rowcount == 1
+
+    def set_progress(self, job_id, progress):
+        # Returns whether cancellation has been requested
+        with self._conn() as conn:
+            conn.execute("UPDATE jobs SET progress = ? WHERE id = ?", (json.dumps(progress), job_id))
+            row = conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def finish(self, job_id, status, result=None, error=None):
+        with self._conn() as conn:
+            conn.execute("UPDATE jobs SET status = ?, result = ?, error = ?, finished = ? WHERE id = ?",
+                         (status, json.dumps(result) if result is not None else None, error, time.time(),
+                          job_id))
+
+    def request_cancel(self, job_id):
+        with self._conn() as conn:
+            conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ?", (job_id,))
+            # A job that has not started yet is cancelled right away
+            conn.execute("UPDATE jobs SET status = ?, finished = ? WHERE id = ? AND status = ?",
+                         (CANCELLED, time.time(), job_id, QUEUED))
+
+    def fail_unfinished(self, error="interrupted"):
+        # Jobs left queued or running by a process that is gone; jobs of
+        # live owners (this process included) are left alone
+        with self._conn() as conn:
+            rows = conn.execute("SELECT id, owner FROM jobs WHERE status IN (?, ?)", (QUEUED, RUNNING)).fetchall()
+            orphans = [(job_id,) for job_id, owner in rows if not owner_alive(owner)]
+            conn.executemany(
+                "UPDATE jobs SET status = ?, error = ?, finished = ? WHERE id = ? AND status IN (?, ?)",
+                [(FAILED, error, time.time(), job_id, QUEUED, RUNNING) for (job_id,) in orphans])
+        return len(orphans)
+
+    def purge(self, older_than_s=7 * 86400):
+        with self._conn() as conn:
+            return conn.execute("DELETE FROM jobs WHERE finished IS NOT NULL AND finished < ?",
+                                (time.time() - older_than_s,)).rowcount
+
+
+def _reporter(store, job_id):
+    def report(progress):
+        if store.set_progress(job_id, progress):
+            raise JobCancelled()
+    return report
+
+
+def monte_carlo_result(trade_log, initial_value):
+    # Summary and histograms of the trades' Monte Carlo distributions, with a
+    # fixed seed so a run always shows the same numbers; None without trades
+    from monte_carlo import monte_carlo, summarize, histograms
+    if not len(trade_log):
+        return None
+    with phase('job.monte_carlo'):
+        results = monte_carlo(trade_log, initial_value, seed=0)
+        return {'summary': summarize(results, initial_value), 'histograms': histograms(results)}
+
+
+def backtest_job(store, job_id, kwargs):
+    from backtesting import run_backtest
+    data = {}
+    initial_value, final_value, trade_log, _ = run_backtest(
+        progress=_reporter(store, job_id), data_out=data, **kwargs)
+    monte_carlo = monte_carlo_result(trade_log, initial_value)
+    # The bars the backtest ran on come back with the result so the chart
+    # does not load them a second time
+    with phase('job.serialize'):
+        return {
+            'initial_value': initial_value,
+            'final_value': final_value,
+            'trade_log': trade_log.to_columns(),
+            'chart': chart_data(data['df']) if 'df' in data else None,
+            'monte_carlo': monte_carlo,
+        }
+
+
+def optimization_job(store, job_id, kwargs):
+    from ga_optimization import run_optimization
+    best_value, best_params = run_optimization(progress=_reporter(store, job_id), **kwargs)
+    return {'best_value': best_value, 'best_params': best_params}
+
+
+JOB_KINDS = {
+    'backtest': backtest_job,
+    'optimization': optimization_job,
+}
+
+
+def _run(store_path, job_id, kind, kwargs):
+    # Entry point in the pool process. Returns what the job's profile
+    # recorded, for the submitting process to merge.
+    store = JobStore(store_path)
+    if not store.start(job_id):
+        return None
+    with profile() as p:
+        try:
+            result = JOB_KINDS[kind](store, job_id, kwargs)
+        except JobCancelled:
+            status, result, error = CANCELLED, None, None
+        except Exception as exc:
+            status, result, error = FAILED, None, f"{type(exc).__name__}: {exc}"
+        else:
+            status, error = DONE, None
+        count('jobs_finished_total', kind=kind, status=status)
+    recorded = p.to_dict()
+    if result is not None:
+        result['profile'] = recorded
+    store.finish(job_id, status, result=result, error=error)
+    return recorded
+
+
+def _merge_profile(future):
+    if not future.cancelled() and future.exception() is None and future.result() is not None:
+        get_registry().merge(future.result())
+
+
+class JobQueue:
+    def __init__(self, store=None, max_concurrent=DEFAULT_MAX_CONCURRENT):
+        self.store = store or JobStore()
+        self.store.fail_unfinished()
+        self.max_concurrent = max_concurrent
+        self._pool = None
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind, **kwargs):
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Unknown job kind: {kind}")
+        job_id = self.store.create(kind, kwargs)
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(self.max_concurrent)
+            future = self._pool.submit(_run, self.store.path, job_id, kind, kwargs)
+            future.add_done_callback(_merge_profile)
+            self._futures[job_id] = future
+            self._futures = {k: f for k, f in self._futures.items() if not f.done()}
+        return job_id
+
+    def status(self, job_id):
+        return self.store.get(job_id)
+
+    def cancel(self, job_id):
+        self.store.request_cancel(job_id)
+        with self._lock:
+            future = self._futures.get(job_id)
+        if future is not None:
+            future.cancel()
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=wait, cancel_futures=True)
+                self._pool = None
+
+
+_default_queue = None
+
+
+def get_job_queue():
+    global _default_queue
+    if _default_queue is None:
+        _default_queue = JobQueue()
+    return _default_queue
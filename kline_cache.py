@@ -0,0 +1,76 @@
+# kline_cache.py
+import os
+import json
+import shutil
+import numpy as np
+
+# Columnar on-disk store for closed klines, one directory per (symbol, interval).
+# Every column is a separate .npy file so loads are a handful of memory maps,
+# and meta.json records which time range has already been fetched.
+COLUMNS = ('open_time', 'open', 'high', 'low', 'close', 'volume')
+DTYPES = {'open_time': np.int64}
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    'CRYPTO_BACKTESTER_CACHE',
+    os.path.join(os.path.expanduser('~'), '.cache', 'crypto_backtester')
+)
+
+
+class KlineCache:
+    def __init__(self, root=None):
+        self.root = os.path.join(root or DEFAULT_CACHE_DIR, 'klines')
+
+    def _dir(self, symbol, interval):
+        return os.path.join(self.root, f"{symbol.upper()}_{interval}")
+
+    def load(self, symbol, interval):
+        # Returns (columns, meta) or (None, None) when nothing usable is cached.
+        path = self._dir(symbol, interval)
+        meta_path = os.path.join(path, 'meta.json')
+        if not os.path.exists(meta_path):
+            return None, None
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            columns = {
+                name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r')
+                for name in COLUMNS
+            }
+        except (OSError, ValueError):
+            return None, None
+        # A crash between column writes leaves mismatched lengths; treat as a miss.
+        if any(len(col) != meta['rows'] for col in columns.values()):
+            return None, None
+        return columns, meta
+
+    def store(self, symbol, interval, columns, start, end):
+        # start/end are the covered range in ms: everything in [start, end] has
+        # been fetched and every bar in it is closed.
+        path = self._dir(symbol, interval)
+        os.makedirs(path, exist_ok=True)
+        # meta.json goes last so a partial write never looks complete
+        meta_path = os.path.join(path, 'meta.json')
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        for name in COLUMNS:
+            tmp = os.path.join(path, f"{name}.tmp.npy")
+            np.save(tmp, np.ascontiguousarray(columns[name], dtype=DTYPES.get(name, np.float64)))
+            os.replace(tmp, os.path.join(path, f"{name}.npy"))
+        meta = {'start': int(start), 'end': int(end), 'rows': int(len(columns['open_time']))}
+        tmp = meta_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp, meta_path)
+
+    def clear(self, symbol=None, interval=None):
+        if symbol is None:
+            shutil.rmtree(self.root, ignore_errors=True)
+            return
+        if interval is None:
+            prefix = f"{symbol.upper()}_"
+            if os.path.isdir(self.root):
+                for name in os.listdir(self.root):
+                    if name.startswith(prefix):
+                        shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+            return
+        shutil.rmtree(self._dir(symbol, interval), ignore_errors=True)
@@ -1,14 +1,30 @@
 # live_api.py
+import time
+import asyncio
+from collections import deque
+import numpy as np
 import ccxt
+from ccxt.base.decimal_to_precision import decimal_to_precision, TRUNCATE, ROUND, NO_PADDING
+from instrumentation import observe
+
+# How long the markets/precision table is used before it is reloaded
+MARKETS_TTL_S = 3600
+DEFAULT_MAX_IN_FLIGHT = 8
+# Call latencies kept per method for latency_stats()
+LATENCY_SAMPLES = 10_000
+
 
 class LiveTrader:
-    def __init__(self, exchange_name='binance', api_key='', secret=''):
-        exchange_class = getattr(ccxt, exchange_name)
-        self.exchange = exchange_class({
-            'apiKey': api_key,
-            'secret': secret,
-            'enableRateLimit': True,
-        })
+    def __init__(self, exchange_name='binance', api_key='', secret='', exchange=None):
+        # exchange: an already configured ccxt exchange (or a stand-in for one)
+        if exchange is None:
+            exchange_class = getattr(ccxt, exchange_name)
+            exchange = exchange_class({
+                'apiKey': api_key,
+                'secret': secret,
+                'enableRateLimit': True,
+            })
+        self.exchange = exchange
 
     def fetch_balance(self):
         return self.exchange.fetch_balance()
@@ -21,6 +37,164 @@ class LiveTrader:
         else:
             raise ValueError("Unsupported order type")
 
+    def fetch_order(self, order_id, symbol=None):
+        return self.exchange.fetch_order(order_id, symbol)
+
+
+class RateLimiter:
+    # Spaces request starts at least interval seconds apart
+    def __init__(self, interval):
+        self.interval = interval
+        self._next = 0.0
+
+    async def wait(self):
+        now = time.monotonic()
+        delay = self._next - now
+        self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class AsyncLiveTrader:
+    # LiveTrader on ccxt's asyncio support. One exchange instance (and so one
+    # HTTP session) serves every call. At most max_in_flight requests are out
+    # at a time, started no closer together than the exchange's rateLimit;
+    # the rest wait their turn. Markets and their precision are loaded once,
+    # kept for markets_ttl seconds (refreshed in the background while the
+    # trader is used as an async context manager), and order amounts and
+    # prices are rounded locally against them. Use as
+    #   async with AsyncLiveTrader(api_key=..., secret=...) as trader:
+    #       await trader.create_orders([...])
+    def __init__(self, exchange_name='binance', api_key='', secret='', exchange=None,
+                 max_in_flight=DEFAULT_MAX_IN_FLIGHT, markets_ttl=MARKETS_TTL_S):
+        if exchange is None:
+            import ccxt.async_support as ccxt_async
+            # Requests are spaced here, so ccxt's own throttle stays off
+            exchange = getattr(ccxt_async, exchange_name)({
+                'apiKey': api_key,
+                'secret': secret,
+                'enableRateLimit': False,
+            })
+        self.exchange = exchange
+        self.markets_ttl = markets_ttl
+        self._markets = None
+        self._markets_loaded = 0.0
+        self._markets_lock = asyncio.Lock()
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._limiter = RateLimiter(getattr(exchange, 'rateLimit', 0) / 1000.0)
+        self._refresh_task = None
+        self.latencies = {}
+
+    async def __aenter__(self):
+        await self.markets()
+        self._refresh_task = asyncio.ensure_future(self._refresh_markets())
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            self._refresh_task = None
+        if hasattr(self.exchange, 'close'):
+            await self.exchange.close()
+
+    async def _call(self, method, *args):
+        async with self._slots:
+            await self._limiter.wait()
+            started = time.perf_counter()
+            try:
+                return await getattr(self.exchange, method)(*args)
+            finally:
+                seconds = time.perf_counter() - started
+                samples = self.latencies.get(method)
+                if samples is None:
+                    samples = self.latencies[method] = deque(maxlen=LATENCY_SAMPLES)
+                samples.append(seconds)
+                observe('exchange_call_seconds', seconds, method=method)
+
+    def _fresh(self):
+        return self._markets is not None and time.monotonic() - self._markets_loaded <= self.markets_ttl
+
+    async def markets(self, reload=False):
+        # The markets table, loaded on first use and once it is stale
+        if not reload and self._fresh():
+            return self._markets
+        async with self._markets_lock:
+            # Whoever held the lock may have just loaded it
+            if reload or not self._fresh():
+                self._markets = await self._call('load_markets', True)
+                self._markets_loaded = time.monotonic()
+        return self._markets
+
+    async def _refresh_markets(self):
+        while True:
+            await asyncio.sleep(self.markets_ttl)
+            try:
+                await self.markets(reload=True)
+            except Exception:
+                # The old table stays in use until a reload succeeds
+                pass
+
+    def round_order(self, market, amount, price=None):
+        # (amount, price) as the exchange accepts them: the amount truncated
+        # to the market's amount precision, the price rounded to its tick.
+        # Raises ValueError below the market's minimum amount.
+        mode = getattr(self.exchange, 'precisionMode', None)
+        precision = market.get('precision') or {}
+        if precision.get('amount') is not None:
+            amount = float(decimal_to_precision(amount, TRUNCATE, precision['amount'], mode, NO_PADDING))
+        if price is not None and precision.get('price') is not None:
+            price = float(decimal_to_precision(price, ROUND, precision['price'], mode, NO_PADDING))
+        min_amount = ((market.get('limits') or {}).get('amount') or {}).get('min')
+        if amount <= 0 or (min_amount is not None and amount < min_amount):
+            raise ValueError(f"Order amount {amount} for {market['symbol']} is below the minimum {min_amount}")
+        return amount, price
+
+    async def fetch_balance(self):
+        return await self._call('fetch_balance')
+
+    async def create_order(self, symbol, order_type, side, amount, price=None):
+        if order_type not in ('market', 'limit'):
+            raise ValueError("Unsupported order type")
+        markets = await self.markets()
+        if symbol not in markets:
+            raise ValueError(f"Unknown symbol: {symbol}")
+        amount, price = self.round_order(markets[symbol], amount, price if order_type == 'limit' else None)
+        return await self._call('create_order', symbol, order_type, side, amount, price)
+
+    async def create_orders(self, orders):
+        # orders: dicts of create_order arguments. Orders for different
+        # symbols go out concurrently; those for the same symbol one after
+        # another, in the given order. Returns the results in the given
+        # order, with the exception in place of an order that failed.
+        results = [None] * len(orders)
+        by_symbol = {}
+        for i, order in enumerate(orders):
+            by_symbol.setdefault(order['symbol'], []).append(i)
+
+        async def submit(positions):
+            for i in positions:
+                try:
+                    results[i] = await self.create_order(**orders[i])
+                except Exception as exc:
+                    results[i] = exc
+
+        await asyncio.gather(*(submit(positions) for positions in by_symbol.values()))
+        return results
+
+    def latency_stats(self, percentiles=(50, 90, 99)):
+        # Per method: call count and latency percentiles in milliseconds
+        stats = {}
+        for method, samples in self.latencies.items():
+            ms = np.asarray(samples) * 1e3
+            stats[method] = {'count': len(ms), **{f'p{p}': float(v) for p, v in
+                                                  zip(percentiles, np.percentile(ms, percentiles))},
+                             'max': float(ms.max())}
+        return stats
+
+
 if __name__ == "__main__":
     trader = LiveTrader(api_key='YOUR_API_KEY', secret='YOUR_SECRET')
     print(trader.fetch_balance())
@@ -0,0 +1,335 @@
+# live_engine.py
+import json
+import math
+import time
+from collections import deque
+from ccxt.base.errors import BaseError
+from instrumentation import observe, count
+from pine_params import resolve_params, needs_atr
+from vector_engine import first_bar, session_bounds, STAKE
+from trade_log import TradeRecorder
+from downloader import interval_to_ms
+
+# PineStrategy's entry and exit rules on live bars. Each closed bar updates
+# the four EMAs and, for the ATR exits, the ATR in constant time (same
+# seeding and recurrence as indicators.py, so values match a backtest bit
+# for bit), the rules are evaluated on it, and an entry or exit goes out as a
+# market order through a LiveTrader. Of the entry filters only the session
+# filter is supported. The position and P&L change only once the exchange
+# confirms the order: on the next bar an order that is not yet closed is
+# looked up with fetch_order, and its filled amount and average price are
+# used (a fill without an average price, as ReplayTrader reports, counts as
+# filled at that bar's open). Rejected or failed orders are counted under
+# live_order_errors_total and leave the position as it was; no other order
+# goes out while one is still working. long_only skips the short entries,
+# for spot accounts. Replaying a backtest's bars gives the same trades as
+# run_backtest as long as its broker never refuses an order for lack of
+# cash.
+
+BINANCE_WS_URL = "wss://stream.binance.com:9443/ws"
+# Order statuses after which nothing more fills
+FINAL_STATUSES = ('closed', 'canceled', 'rejected', 'expired')
+
+
+class Smoother:
+    # Exponential smoothing seeded with the SMA of the first `period` values,
+    # one value at a time: indicators._smooth without the arrays
+    def __init__(self, period, alpha):
+        self.period = period
+        self.alpha = alpha
+        self.alpha1 = 1.0 - alpha
+        self.value = None
+        self.prev = None
+        self._seed = []
+
+    def update(self, x):
+        self.prev = self.value
+        if self.value is not None:
+            self.value = self.value * self.alpha1 + x * self.alpha
+        else:
+            self._seed.append(x)
+            if len(self._seed) == self.period:
+                self.value = math.fsum(self._seed) / self.period
+                self._seed = None
+        return self.value
+
+
+def ema_state(period):
+    return Smoother(period, 2.0 / (1.0 + period))
+
+
+class ATRState:
+    # Wilder-smoothed true range; the first bar has no previous close
+    def __init__(self, period):
+        self.smoother = Smoother(period, 1.0 / period)
+        self.prev_close = None
+
+    @property
+    def value(self):
+        return self.smoother.value
+
+    def update(self, high, low, close):
+        prev_close, self.prev_close = self.prev_close, close
+        if prev_close is None:
+            return None
+        return self.smoother.update(max(high, prev_close) - min(low, prev_close))
+
+
+class LiveSignalEngine:
+    # trader: a LiveTrader (or anything with its create_order). Bars are
+    # (open time ms, open, high, low, close, volume) tuples of closed bars,
+    # oldest first.
+    def __init__(self, trader, symbol, strategy_params=None, amount=STAKE, long_only=False):
+        params = resolve_params(strategy_params)
+        unsupported = [name for name in ('enableHigherTFFilter', 'useAdxFilter', 'useVolumeFilter',
+                                         'useRSIFilter', 'useAtrFilter') if params[name]]
+        if unsupported:
+            raise ValueError(f"The live engine does not support {', '.join(unsupported)}")
+        self.trader = trader
+        self.symbol = symbol
+        self.amount = amount
+        self.long_only = long_only
+        self.params = params
+        self.emaLongFast = ema_state(int(params['longTermFastLen']))
+        self.emaLongSlow = ema_state(int(params['longTermSlowLen']))
+        self.emaShortFast = ema_state(int(params['shortTermFastLen']))
+        self.emaShortSlow = ema_state(int(params['shortTermSlowLen']))
+        self.atr = ATRState(int(params['atrPeriod'])) if needs_atr(params) else None
+        self.session = session_bounds(params['sessionHours']) if params['enableSessionFilter'] else None
+        self.first_bar = first_bar(params)
+        self.bars = 0
+        self.last_close = None
+        # Open position: +amount long, -amount short, with its entry fill
+        self.position = 0
+        self.entry_price = None
+        self.entry_ms = None
+        # Best close since the entry fill, for the trailing stop
+        self.extreme = None
+        # Order sent and not settled yet: (side, order, exit reason or None)
+        self.pending = None
+        # Most recent order errors as (stage, message)
+        self.errors = deque(maxlen=100)
+        self.trades = TradeRecorder()
+
+    @property
+    def trade_log(self):
+        return self.trades.log()
+
+    def signals(self):
+        # (long, short) entry signals on the latest bar
+        lf, ls = self.emaLongFast.value, self.emaLongSlow.value
+        sf, ss = self.emaShortFast.value, self.emaShortSlow.value
+        sf1, ss1 = self.emaShortFast.prev, self.emaShortSlow.prev
+        if None in (lf, ls, sf, ss, sf1, ss1) or self.bars <= self.first_bar:
+            return False, False
+        long_signal = lf > ls and sf > ss and sf1 <= ss1
+        short_signal = lf < ls and sf < ss and sf1 >= ss1
+        return long_signal, short_signal
+
+    def exit_reason(self, close):
+        # Same rules and arithmetic as PineStrategy._exit_check
+        if not self.position:
+            return None
+        p = self.params
+        is_long = self.position > 0
+        method = p['exitMethod']
+        if method == "Trailing":
+            if is_long:
+                self.extreme = max(self.extreme, close)
+                hit = close <= self.extreme * (1 - p['fixedTrailingPct'] / 100)
+            else:
+                self.extreme = min(self.extreme, close)
+                hit = close >= self.extreme * (1 + p['fixedTrailingPct'] / 100)
+            return "Trailing Stop" if hit else None
+        entry_price = self.entry_price
+        if method == "ATR":
+            stop_dist = p['atrStopLossFactor'] * self.atr.value
+            target_dist = p['atrTakeProfitFactor'] * self.atr.value
+            if is_long:
+                stop, target = entry_price - stop_dist, entry_price + target_dist
+            else:
+                stop, target = entry_price + stop_dist, entry_price - target_dist
+        elif method == "Fixed":
+            if is_long:
+                stop = entry_price * (1 - p['fixedStopLossPct'] / 100)
+                target = entry_price * (1 + p['fixedTakeProfitPct'] / 100)
+            else:
+                stop = entry_price * (1 + p['fixedStopLossPct'] / 100)
+                target = entry_price * (1 - p['fixedTakeProfitPct'] / 100)
+            if p['useAtrStopLoss']:
+                stop_dist = p['atrStopLossFactor'] * self.atr.value
+                stop = entry_price - stop_dist if is_long else entry_price + stop_dist
+        else:
+            return None
+        if is_long:
+            if close <= stop:
+                return "Stop Loss"
+            if close >= target:
+                return "Take Profit"
+        else:
+            if close >= stop:
+                return "Stop Loss"
+            if close <= target:
+                return "Take Profit"
+        return None
+
+    def in_session(self, open_ms):
+        if self.session is None:
+            return True
+        start, end = self.session
+        minute = open_ms // 60_000 % 1440
+        return start <= minute < end if start <= end else minute >= start or minute < end
+
+    def _error(self, stage, message):
+        count('live_order_errors_total', stage=stage)
+        self.errors.append((stage, message))
+
+    def _settle(self, open_ms, open_):
+        # Applies the pending order once the exchange reports it final
+        side, order, reason = self.pending
+        if order.get('status') not in FINAL_STATUSES:
+            try:
+                order = self.trader.fetch_order(order['id'], self.symbol)
+            except BaseError as exc:
+                self._error('fetch', f"{type(exc).__name__}: {exc}")
+                return
+            if order.get('status') not in FINAL_STATUSES:
+                self.pending = (side, order, reason)
+                return
+        self.pending = None
+        filled = order.get('filled')
+        if filled is None:
+            filled = order['amount'] if order['status'] == 'closed' else 0.0
+        if not filled:
+            self._error('fill', f"order {order.get('id')} {order['status']} without a fill")
+            return
+        price = order.get('average') or open_
+        if reason is None:
+            self.position = side * filled
+            self.entry_price, self.entry_ms = price, open_ms
+            self.extreme = price
+            return
+        # A partial exit closes that much; the rest stays open and is exited
+        # again on the next bar's check
+        size = math.copysign(min(filled, abs(self.position)), self.position)
+        pnl = size * (price - self.entry_price) * 1.0
+        entry = (self.entry_ms, self.entry_price, size)
+        exit_ = (open_ms, price, -size)
+        buy, sell = (entry, exit_) if size > 0 else (exit_, entry)
+        self.trades.append(self.entry_ms, open_ms, 0, self.entry_price, pnl, reason, buy, sell)
+        self.position -= size
+        if not self.position:
+            self.entry_price, self.entry_ms = None, None
+
+    def _send(self, side, reason, received):
+        decided = time.perf_counter()
+        observe('bar_to_order_seconds', decided - received, stage='decided')
+        amount = self.amount if reason is None else abs(self.position)
+        try:
+            order = self.trader.create_order(self.symbol, 'market', 'buy' if side > 0 else 'sell', amount)
+        except BaseError as exc:
+            self._error('create', f"{type(exc).__name__}: {exc}")
+            return None
+        observe('bar_to_order_seconds', time.perf_counter() - received, stage='acknowledged')
+        self.pending = (side, order, reason)
+        return order
+
+    def on_bar(self, bar, received=None):
+        # Feeds one closed bar; returns the order it sent, if any. received
+        # is when the bar arrived (time.perf_counter()), for the latency
+        # metrics; by default now.
+        received = time.perf_counter() if received is None else received
+        open_ms, open_, high, low, close = bar[0], float(bar[1]), float(bar[2]), float(bar[3]), float(bar[4])
+        if self.pending is not None:
+            self._settle(open_ms, open_)
+        for ema in (self.emaLongFast, self.emaLongSlow, self.emaShortFast, self.emaShortSlow):
+            ema.update(close)
+        if self.atr is not None:
+            self.atr.update(high, low, close)
+        self.bars += 1
+        self.last_close = close
+        if self.pending is not None:
+            return None
+        if self.position:
+            reason = self.exit_reason(close)
+            if reason is not None:
+                return self._send(-1 if self.position > 0 else 1, reason, received)
+            return None
+        long_signal, short_signal = self.signals()
+        if not self.in_session(open_ms):
+            return None
+        if long_signal:
+            return self._send(1, None, received)
+        if short_signal and not self.long_only:
+            return self._send(-1, None, received)
+        return None
+
+    def run(self, bars):
+        for bar in bars:
+            self.on_bar(bar)
+
+
+class ReplayTrader:
+    # Accepts every order and reports it filled in full without a price, so
+    # fills happen at the next bar's open like in the backtest
+    def __init__(self):
+        self.orders = []
+
+    def create_order(self, symbol, order_type, side, amount, price=None):
+        order = {'id': str(len(self.orders) + 1), 'symbol': symbol, 'type': order_type, 'side': side,
+                 'amount': amount, 'status': 'open'}
+        self.orders.append(order)
+        return dict(order)
+
+    def fetch_order(self, order_id, symbol=None):
+        order = self.orders[int(order_id) - 1]
+        order.update(status='closed', filled=order['amount'], average=None)
+        return dict(order)
+
+
+def frame_bars(df):
+    # A DataFrame of bars (get_historical_data's shape) as engine bars
+    open_ms = df.index.as_unit('ms').asi8.tolist()
+    columns = [df[name].to_numpy(dtype=float).tolist() for name in ('open', 'high', 'low', 'close', 'volume')]
+    return zip(open_ms, *columns)
+
+
+def replay(df, strategy_params=None, symbol='REPLAY'):
+    # Runs the engine over historical bars; returns it with its trade log
+    engine = LiveSignalEngine(ReplayTrader(), symbol, strategy_params)
+    engine.run(frame_bars(df))
+    return engine
+
+
+def _kline_bar(k):
+    return (int(k[0]), float(k[1]), float(k[2]), float(k[3]), float(k[4]), float(k[5]))
+
+
+def poll_closed_bars(symbol, interval, since_ms=None, poll_s=None, base_url=None):
+    # Closed bars from the REST endpoint, each once, oldest first; starts
+    # with the bar closing next unless since_ms is given. Checks every poll_s
+    # seconds (by default a tenth of the interval, at most 5s).
+    from data import fetch_klines, BINANCE_KLINES_URL
+    step = interval_to_ms(interval)
+    poll_s = poll_s if poll_s is not None else min(step / 10000.0, 5.0)
+    next_open = since_ms
+    while True:
+        now = int(time.time() * 1000)
+        if next_open is None:
+            next_open = now // step * step
+        if next_open + step <= now:
+            for k in fetch_klines(symbol, interval, next_open, base_url=base_url or BINANCE_KLINES_URL):
+                if k[0] >= next_open and k[6] < now:
+                    yield _kline_bar(k)
+                    next_open = int(k[0]) + step
+        time.sleep(poll_s)
+
+
+def stream_closed_bars(symbol, interval, url=BINANCE_WS_URL):
+    # Closed bars from Binance's kline websocket stream, as they close
+    from websockets.sync.client import connect
+    with connect(f"{url}/{symbol.lower()}@kline_{interval}") as ws:
+        for message in ws:
+            k = json.loads(message)['k']
+            if k['x']:
+                yield (int(k['t']), float(k['o']), float(k['h']), float(k['l']), float(k['c']), float(k['v']))
@@ -2,17 +2,23 @@
 import dash
 from dash import dcc, html, Input, Output, State, dash_table
 import plotly.graph_objects as go
-import pandas as pd
 import json
 
 # Our local modules (assuming they are separate files, or we unify them).
-from backtesting import run_backtest
-from ga_optimization import run_optimization, PARAM_BOUNDARIES
-from data import get_historical_data
-from strategy import PineStrategy
+from ga_optimization import PARAM_BOUNDARIES
+from jobs import get_job_queue, FAILED, CANCELLED, FINISHED
+from chart import price_figure, relayout_range
+from runs import get_run_store, add_routes, trades_csv_url, DEFAULT_PAGE_SIZE
+from instrumentation import timed, add_metrics_route
+from trade_log import TABLE_COLUMNS
 
 app = dash.Dash(__name__)
 server = app.server
+add_routes(server)
+add_metrics_route(server)
+
+# Every timeframe in the dropdown is resampled locally from cached 1m bars
+BASE_TIMEFRAME = '1m'
 
 # Default Strategy Params
 DEFAULT_PARAMS = {
@@ -62,8 +68,15 @@ app.layout = html.Div(
                 style={'width': '150px', 'display': 'inline-block', 'marginRight': '30px'}
             ),
             html.Button("Run Backtest", id="run-backtest", n_clicks=0, style={'padding': '10px 20px', 'fontSize': '16px', 'marginRight': '10px'}),
-            html.Button("Run Optimization", id="run-optimization", n_clicks=0, style={'padding': '10px 20px', 'fontSize': '16px'}),
-        ], style={'textAlign': 'center', 'marginBottom': '40px'}),
+            html.Button("Run Optimization", id="run-optimization", n_clicks=0, style={'padding': '10px 20px', 'fontSize': '16px', 'marginRight': '10px'}),
+            html.Button("Cancel", id="cancel-job", n_clicks=0, style={'padding': '10px 20px', 'fontSize': '16px'}),
+        ], style={'textAlign': 'center', 'marginBottom': '20px'}),
+
+        # Background job status, refreshed by the poll interval
+        html.Div(id='job-status', style={'textAlign': 'center', 'marginBottom': '20px'}),
+        html.Div(id='cancel-status', style={'display': 'none'}),
+        dcc.Interval(id='job-poll', interval=1000, disabled=True),
+        dcc.Store(id='job-id-store'),
 
         # Chart
         dcc.Loading(
@@ -77,45 +90,113 @@ app.layout = html.Div(
         html.Hr(style={'borderColor': '#FFC107'}),
         # Trades Section
         html.Div(id="trade-log-div"),
+        # Pages are sorted and cut on the server from the run (see runs.py)
+        dash_table.DataTable(
+            id='trade-table',
+            columns=[{"name": title, "id": title} for title, _ in TABLE_COLUMNS],
+            data=[],
+            page_action='custom',
+            page_current=0,
+            page_size=DEFAULT_PAGE_SIZE,
+            page_count=1,
+            sort_action='custom',
+            sort_mode='multi',
+            sort_by=[],
+            style_table={'overflowX': 'auto'},
+            style_cell={'textAlign': 'left', 'backgroundColor': '#222', 'color': '#FFC107'}
+        ),
         html.Br(),
         html.Div([
-            html.Button("Download Trade Log CSV", id="download-btn", n_clicks=0,
-                        style={'padding': '10px 20px', 'fontSize': '16px'}),
-            dcc.Download(id="download-trade-log")
+            # The CSV is streamed from the server's copy of the run
+            html.A(html.Button("Download Trade Log CSV", id="download-btn", n_clicks=0,
+                               style={'padding': '10px 20px', 'fontSize': '16px'}),
+                   id="download-link", href="", download="trade_log.csv")
         ], style={'textAlign': 'center', 'marginTop': '20px'}),
 
-        # Hidden Storage
-        dcc.Store(id='trade-log-store')
+        # Hidden Storage: only the id of the run on screen
+        dcc.Store(id='run-id-store')
     ]
 )
 
 @app.callback(
-    [Output("output-metrics", "children"),
-     Output("price-chart", "figure"),
-     Output("trade-log-div", "children"),
-     Output("trade-log-store", "data")],
+    [Output("job-id-store", "data"),
+     Output("job-poll", "disabled")],
     [Input("run-backtest", "n_clicks"),
      Input("run-optimization", "n_clicks")],
     [State("symbol", "value"),
-     State("timeframe", "value")]
+     State("timeframe", "value")],
+    prevent_initial_call=True
 )
+@timed('callback.run_actions')
 def run_actions(n_backtest, n_opt, symbol, timeframe):
-    ctx = dash.callback_context
-    if not ctx.triggered:
-        return "", go.Figure(), "", []
-    
-    button_id = ctx.triggered[0]['prop_id'].split('.')[0]
+    # Submits a background job and starts polling it; returns immediately
+    button_id = dash.callback_context.triggered[0]['prop_id'].split('.')[0]
+    if button_id == "run-backtest":
+        job_id = get_job_queue().submit(
+            'backtest', symbol=symbol, timeframe=timeframe, start_str='1 month ago UTC',
+            strategy_params=DEFAULT_PARAMS, base_timeframe=BASE_TIMEFRAME, incremental=True)
+    else:
+        job_id = get_job_queue().submit('optimization', symbol=symbol, timeframe=timeframe,
+                                        base_timeframe=BASE_TIMEFRAME)
+    return job_id, False
+
+@app.callback(
+    Output("cancel-status", "children"),
+    Input("cancel-job", "n_clicks"),
+    State("job-id-store", "data"),
+    prevent_initial_call=True
+)
+@timed('callback.cancel_job')
+def cancel_job(n_clicks, job_id):
+    if job_id:
+        get_job_queue().cancel(job_id)
+    return job_id
+
+def describe_progress(job):
+    progress = job.get('progress') or {}
+    if 'generation' in progress:
+        return (f"generation {progress['generation']}, best {progress['best_value']:.2f}, "
+                f"{progress['gens_per_sec']:.2f} gens/s")
+    if progress.get('bars_total'):
+        return f"{progress.get('stage', '')}: {progress['bars_processed']}/{progress['bars_total']} bars"
+    return ""
+
+@app.callback(
+    [Output("output-metrics", "children"),
+     Output("price-chart", "figure"),
+     Output("trade-log-div", "children"),
+     Output("run-id-store", "data"),
+     Output("trade-table", "page_current"),
+     Output("job-status", "children"),
+     Output("job-poll", "disabled", allow_duplicate=True)],
+    Input("job-poll", "n_intervals"),
+    State("job-id-store", "data"),
+    prevent_initial_call=True
+)
+@timed('callback.poll_job')
+def poll_job(n_intervals, job_id):
+    no_update = dash.no_update
+    job = get_job_queue().status(job_id) if job_id else None
+    if job is None:
+        return no_update, no_update, no_update, no_update, no_update, "", True
+    if job['status'] not in FINISHED:
+        return no_update, no_update, no_update, no_update, no_update, f"{job['kind']} {job['status']} {describe_progress(job)}", False
+    if job['status'] == FAILED:
+        return no_update, no_update, no_update, no_update, no_update, f"{job['kind']} failed: {job['error']}", True
+    if job['status'] == CANCELLED:
+        return no_update, no_update, no_update, no_update, no_update, f"{job['kind']} cancelled", True
+    return (*render_job(job), f"{job['kind']} done", True)
+
+def render_job(job):
+    run = get_run_store().get(job['id'])
+    symbol, timeframe = run.symbol, run.timeframe
     metrics_html = ""
     fig = go.Figure()
     trades_html = ""
-    trades_store = []
 
-    if button_id == "run-backtest":
-        # Actually run the backtest
-        init_val, final_val, trade_log, cerebro = run_backtest(
-            symbol=symbol, timeframe=timeframe, start_str='1 month ago UTC',
-            strategy_params=DEFAULT_PARAMS
-        )
+    if run.kind == "backtest":
+        init_val, final_val = run.result['initial_value'], run.result['final_value']
+        trade_log = run.trade_log
         net_profit = final_val - init_val
         # Build metrics
         metrics_list = [
@@ -126,111 +207,79 @@ def run_actions(n_backtest, n_opt, symbol, timeframe):
             html.P(f"Net Profit: {net_profit:.2f}"),
             html.P(f"Number of Trades: {len(trade_log)}"),
             html.H3("Parameters Used:"),
-            html.Pre(json.dumps(DEFAULT_PARAMS, indent=2))
+            html.Pre(json.dumps(run.params['strategy_params'], indent=2))
         ]
         metrics_html = html.Div(metrics_list, style={'border': '1px solid #FFC107', 'padding': '10px'})
 
-        # Build chart
-        df = get_historical_data(symbol=symbol, interval=timeframe, start_str='1 month ago UTC')
-        fig = go.Figure(data=[go.Candlestick(
-            x=df.index,
-            open=df['open'],
-            high=df['high'],
-            low=df['low'],
-            close=df['close']
-        )])
-        fig.update_layout(template='plotly_dark', title=f"{symbol} Price Chart ({timeframe})")
-
-        # Add trade markers to the chart if we have trades
-        if trade_log and len(trade_log) > 0:
-            # Convert trade times to actual x-values in the df
-            # We'll do a simple approach: for each trade, add a scatter marker for entry & exit
-            entries_x = []
-            entries_y = []
-            exits_x = []
-            exits_y = []
-            for t in trade_log:
-                # If we want to match them with df index, we can do approximate matching
-                # or we can just place them by date. We'll do a direct approach
-                ent_date = t["Entry Date"]
-                exit_date = t["Exit Date"]
-                # We won't do an exact match of index. We'll do a fallback approach: just place them if they exist in df
-                try:
-                    ent_ts = pd.to_datetime(ent_date)
-                    exit_ts = pd.to_datetime(exit_date)
-                    if ent_ts in df.index:
-                        entries_x.append(ent_ts)
-                        # approximate price
-                        # We might guess the open price
-                        entries_y.append(df.loc[ent_ts, 'close'])
-                    if exit_ts in df.index:
-                        exits_x.append(exit_ts)
-                        exits_y.append(df.loc[exit_ts, 'close'])
-                except:
-                    pass
-            
-            fig.add_trace(go.Scatter(
-                x=entries_x,
-                y=entries_y,
-                mode='markers',
-                marker=dict(symbol='triangle-up', color='green', size=12),
-                name='Entries'
-            ))
-            fig.add_trace(go.Scatter(
-                x=exits_x,
-                y=exits_y,
-                mode='markers',
-                marker=dict(symbol='triangle-down', color='red', size=12),
-                name='Exits'
-            ))
-
-        # Build trades log table if trades exist
-        if trade_log and len(trade_log) > 0:
-            table = dash_table.DataTable(
-                columns=[{"name": col, "id": col} for col in trade_log[0].keys()],
-                data=trade_log,
-                style_table={'overflowX': 'auto'},
-                style_cell={'textAlign': 'left', 'backgroundColor': '#222', 'color': '#FFC107'},
-                page_size=10
-            )
-            trades_html = html.Div([
-                html.H3("Trade Log:"),
-                table
-            ], style={'border': '1px solid #FFC107', 'padding': '10px'})
-            trades_store = trade_log
+        # Chart from the bars the backtest job already loaded, decimated;
+        # zooming in re-renders the visible window at full resolution
+        if run.bars is not None:
+            fig = price_figure(run.bars, symbol, timeframe, trade_log)
+
+        # The table below pages through the trades server-side
+        if len(trade_log) > 0:
+            trades_html = html.H3(f"Trade Log ({len(trade_log)} trades):")
         else:
             trades_html = html.Div([
                 html.P("No trades executed or no trade log generated.")
             ], style={'border': '1px solid #FFC107', 'padding': '10px'})
-            trades_store = []
 
-    elif button_id == "run-optimization":
-        best_val, best_params = run_optimization(symbol=symbol, timeframe=timeframe)
+    elif run.kind == "optimization":
+        best_val, best_params = run.result['best_value'], run.result['best_params']
         metrics_html = html.Div([
             html.P("Optimization Results:"),
             html.P(f"Best Value: {best_val:.2f}"),
             html.Pre(json.dumps(best_params, indent=2))
         ], style={'border': '1px solid #FFC107', 'padding': '10px'})
-        fig = go.Figure()
         trades_html = html.Div([
             html.P("No trade log for optimization runs.")
         ], style={'border': '1px solid #FFC107', 'padding': '10px'})
-        trades_store = []
 
-    return metrics_html, fig, trades_html, trades_store
+    return metrics_html, fig, trades_html, run.id, 0
+
+@app.callback(
+    [Output("trade-table", "data"),
+     Output("trade-table", "page_count")],
+    [Input("run-id-store", "data"),
+     Input("trade-table", "page_current"),
+     Input("trade-table", "page_size"),
+     Input("trade-table", "sort_by")]
+)
+@timed('callback.trade_table_page')
+def trade_table_page(run_id, page_current, page_size, sort_by):
+    # One page of the run's trades; only that page travels to the browser
+    run = get_run_store().get(run_id)
+    if run is None:
+        return [], 1
+    return run.trade_page(page_current or 0, page_size, sort_by)
 
-# Download CSV
 @app.callback(
-    Output("download-trade-log", "data"),
-    Input("download-btn", "n_clicks"),
-    State("trade-log-store", "data"),
+    Output("price-chart", "figure", allow_duplicate=True),
+    Input("price-chart", "relayoutData"),
+    State("run-id-store", "data"),
     prevent_initial_call=True
 )
-def download_log_as_csv(n_clicks, trade_data):
-    if not trade_data or len(trade_data) == 0:
-        return None
-    df = pd.DataFrame(trade_data)
-    return dcc.send_data_frame(df.to_csv, "trade_log.csv", index=False)
+@timed('callback.zoom_chart')
+def zoom_chart(relayout, run_id):
+    # Re-renders the chart for the new x range from the bars kept server-side
+    x_range = relayout_range(relayout)
+    run = get_run_store().get(run_id) if x_range is not None else None
+    if run is None or run.bars is None:
+        return dash.no_update
+    return price_figure(run.bars, run.symbol, run.timeframe, run.trade_log, x_range)
+
+# Download CSV
+@app.callback(
+    Output("download-link", "href"),
+    Input("run-id-store", "data")
+)
+@timed('callback.download_log_as_csv')
+def download_log_as_csv(run_id):
+    # Points the download button at the run's streamed CSV
+    run = get_run_store().get(run_id)
+    if run is None or run.kind != "backtest":
+        return ""
+    return trades_csv_url(run_id)
 
 if __name__ == "__main__":
     app.run_server(debug=True)
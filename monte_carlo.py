@@ -0,0 +1,130 @@
+# monte_carlo.py
+import numpy as np
+
+# Robustness of a backtest beyond its single path: the trade P&Ls of a trade
+# log are reordered or resampled into thousands of alternative equity
+# curves, and each curve's final equity, maximum drawdown and whether it hit
+# the ruin level are collected into distributions.
+#   permutation      the same trades in a random order; the final equity is
+#                    always the same, the drawdowns are not
+#   bootstrap        trades drawn with replacement
+#   block_bootstrap  runs of block_size consecutive trades (wrapping around)
+#                    drawn with replacement, keeping streaks together
+# Simulations are rows of a (simulations x trades) matrix, processed a chunk
+# of rows at a time so memory stays at a few CHUNK_ELEMENTS-sized arrays.
+# Backtest jobs run the default methods and keep only the summary and
+# histograms (see jobs.backtest_job).
+
+METHODS = ('permutation', 'bootstrap', 'block_bootstrap')
+DEFAULT_METHODS = METHODS
+DEFAULT_SIMULATIONS = 10_000
+# Permutation costs about twice the others per path (NumPy's row-wise
+# shuffle), so it runs fewer paths unless simulations is given
+METHOD_SIMULATIONS = {'permutation': 5_000}
+HISTOGRAM_BINS = 50
+# Equity at or below (1 - RUIN_FRACTION) x initial counts as ruin
+RUIN_FRACTION = 0.5
+CHUNK_ELEMENTS = 1 << 18
+PERCENTILES = (5, 25, 50, 75, 95)
+
+
+def trade_pnl(trades):
+    # P&L per trade, in order, from a TradeLog or anything array-like
+    if hasattr(trades, 'columns'):
+        return np.asarray(trades.columns['profit'], dtype=np.float64)
+    return np.asarray(trades, dtype=np.float64)
+
+
+def default_block_size(n):
+    return max(1, int(round(n ** (1 / 3))))
+
+
+def _resample(pnl, method, rows, rng, block_size):
+    n = len(pnl)
+    if method == 'permutation':
+        return rng.permuted(np.broadcast_to(pnl, (rows, n)), axis=1)
+    if method == 'bootstrap':
+        return pnl.take(rng.integers(0, n, size=(rows, n), dtype=np.int32))
+    if method == 'block_bootstrap':
+        # Blocks are read from the P&L with its start appended, to wrap
+        wrapped = np.r_[pnl, pnl[:block_size - 1]]
+        blocks = -(-n // block_size)
+        starts = rng.integers(0, n, size=(rows, blocks, 1), dtype=np.int32)
+        idx = (starts + np.arange(block_size, dtype=np.int32)).reshape(rows, blocks * block_size)
+        return wrapped.take(idx[:, :n])
+    raise ValueError(f"Unknown Monte Carlo method: {method}")
+
+
+def _paths(paths, initial_value, ruin_level):
+    # paths: (rows x trades) P&L, overwritten. Returns final equity, max
+    # drawdown, max drawdown as a fraction of the peak, and ruin. Works on
+    # the P&L sums and adds initial_value only where needed, to save passes.
+    gain = np.cumsum(paths, axis=1, out=paths)
+    final = initial_value + gain[:, -1]
+    ruined = gain.min(axis=1) <= ruin_level - initial_value
+    peak = np.maximum.accumulate(gain, axis=1)
+    np.maximum(peak, 0.0, out=peak)
+    drawdown = np.subtract(peak, gain, out=gain)
+    max_drawdown = drawdown.max(axis=1)
+    peak += initial_value
+    max_drawdown_pct = np.divide(drawdown, peak, out=drawdown).max(axis=1)
+    return final, max_drawdown, max_drawdown_pct, ruined
+
+
+def simulate(trades, initial_value, method='bootstrap', simulations=DEFAULT_SIMULATIONS, block_size=None,
+             ruin_fraction=RUIN_FRACTION, seed=None):
+    # One method's distributions as arrays of length `simulations`:
+    # 'final_equity', 'max_drawdown', 'max_drawdown_pct' and 'ruined'
+    pnl = trade_pnl(trades)
+    n = len(pnl)
+    if n == 0:
+        raise ValueError("Monte Carlo needs at least one trade")
+    rng = np.random.default_rng(seed)
+    block_size = min(block_size or default_block_size(n), n)
+    ruin_level = initial_value * (1.0 - ruin_fraction)
+    out = {'final_equity': np.empty(simulations), 'max_drawdown': np.empty(simulations),
+           'max_drawdown_pct': np.empty(simulations), 'ruined': np.empty(simulations, dtype=bool)}
+    rows = max(1, CHUNK_ELEMENTS // n)
+    for lo in range(0, simulations, rows):
+        hi = min(simulations, lo + rows)
+        paths = _resample(pnl, method, hi - lo, rng, block_size)
+        for name, values in zip(out, _paths(paths, initial_value, ruin_level)):
+            out[name][lo:hi] = values
+    return out
+
+
+def monte_carlo(trades, initial_value, simulations=None, methods=DEFAULT_METHODS, block_size=None,
+                ruin_fraction=RUIN_FRACTION, seed=None):
+    # simulate() for each method; method -> distributions. Without
+    # simulations each method runs its METHOD_SIMULATIONS default.
+    rng = np.random.default_rng(seed)
+    return {method: simulate(trades, initial_value, method,
+                             simulations or METHOD_SIMULATIONS.get(method, DEFAULT_SIMULATIONS),
+                             block_size, ruin_fraction, seed=rng.integers(1 << 63))
+            for method in methods}
+
+
+def summarize(results, initial_value):
+    # JSON-friendly percentiles per method and metric, plus the share of
+    # paths that were ruined or ended below initial_value
+    summary = {}
+    for method, dist in results.items():
+        entry = {}
+        for metric in ('final_equity', 'max_drawdown', 'max_drawdown_pct'):
+            values = np.percentile(dist[metric], PERCENTILES)
+            entry[metric] = {f"p{p}": float(v) for p, v in zip(PERCENTILES, values)}
+            entry[metric]['mean'] = float(dist[metric].mean())
+        entry['risk_of_ruin'] = float(dist['ruined'].mean())
+        entry['probability_of_loss'] = float((dist['final_equity'] < initial_value).mean())
+        entry['simulations'] = len(dist['ruined'])
+        summary[method] = entry
+    return summary
+
+
+def histograms(results, bins=HISTOGRAM_BINS):
+    # JSON-friendly bin counts and edges per method for final equity and max
+    # drawdown (fraction of the peak), enough to draw the distributions
+    return {method: {metric: dict(zip(('counts', 'edges'),
+                                      (a.tolist() for a in np.histogram(dist[metric], bins=bins))))
+                     for metric in ('final_equity', 'max_drawdown_pct')}
+            for method, dist in results.items()}
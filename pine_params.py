@@ -0,0 +1,87 @@
+# pine_params.py
+# PineStrategy's parameters and defaults, importable without backtrader so the
+# vectorized engines and optimizer workers can share them.
+PINE_PARAMS = dict(
+    # EMA parameters
+    longTermFastLen=50,
+    longTermSlowLen=200,
+    shortTermFastLen=10,
+    shortTermSlowLen=20,
+    # Exit method: "Fixed", "Trailing", or "ATR"
+    exitMethod="Fixed",
+    fixedStopLossPct=1,      # e.g. 1% 
+    fixedTakeProfitPct=2,    # e.g. 2%
+    fixedTrailingPct=1.5,    # e.g. 1.5%
+    atrPeriod=14,
+    atrStopLossFactor=1.0,
+    atrTakeProfitFactor=2.0,
+    useAtrStopLoss=False,    # Fixed exits: stop atrStopLossFactor x ATR away instead
+    # Filter parameters (disabled by default)
+    useAdxFilter=False,
+    adxPeriod=14,
+    adxThreshold=20.0,
+    useVolumeFilter=False,
+    volumeMALen=20,
+    useRSIFilter=False,
+    rsiPeriod=14,
+    rsiLongThreshold=50.0,
+    rsiShortThreshold=50.0,
+    useAtrFilter=False,
+    atrFilterThreshold=0.01,
+    enableHigherTFFilter=False,
+    higherTimeframe="1h",
+    enableSessionFilter=False,
+    sessionHours="0800-2000"  # UTC, HHMM-HHMM; may wrap past midnight
+)
+
+# Entry filters; each one's indicator is only computed when its flag is on
+FILTER_FLAGS = ('useAdxFilter', 'useVolumeFilter', 'useRSIFilter', 'useAtrFilter', 'enableSessionFilter')
+# The params each filter's mask depends on
+FILTER_PARAMS = {
+    'useAdxFilter': ('adxPeriod', 'adxThreshold'),
+    'useVolumeFilter': ('volumeMALen',),
+    'useRSIFilter': ('rsiPeriod', 'rsiLongThreshold', 'rsiShortThreshold'),
+    'useAtrFilter': ('atrPeriod', 'atrFilterThreshold'),
+    'enableSessionFilter': ('sessionHours',),
+}
+
+
+def resolve_params(strategy_params=None):
+    # Defaults overlaid with strategy_params; unknown names are rejected the
+    # same way backtrader rejects unknown strategy kwargs.
+    strategy_params = strategy_params or {}
+    unknown = set(strategy_params) - set(PINE_PARAMS)
+    if unknown:
+        raise TypeError(f"Unknown PineStrategy parameter(s): {', '.join(sorted(unknown))}")
+    params = dict(PINE_PARAMS)
+    params.update(strategy_params)
+    return params
+
+
+def filters_enabled(params):
+    return any(params[flag] for flag in FILTER_FLAGS)
+
+
+def _key_value(value):
+    # 14 and 14.0 build the same mask
+    return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else value
+
+
+def filter_key(params):
+    # What the entry filter masks depend on: the enabled filters and their
+    # params, None with none enabled. Frames with precomputed filter columns
+    # carry it (see vector_engine.with_filter_columns).
+    key = tuple((flag,) + tuple(_key_value(params[name]) for name in FILTER_PARAMS[flag])
+                for flag in FILTER_FLAGS if params[flag])
+    return key or None
+
+
+def htf_key(params):
+    # What the higher-timeframe trend column depends on
+    return (params['higherTimeframe'], int(params['longTermFastLen']), int(params['longTermSlowLen']))
+
+
+def needs_atr(params):
+    # Whether the exits use PineStrategy's ATR line (the ATR filter's ATR is
+    # part of the filter masks instead)
+    return params['exitMethod'] == "ATR" or bool(params['useAtrStopLoss'])
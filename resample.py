@@ -0,0 +1,171 @@
+# resample.py
+import numpy as np
+import pandas as pd
+import indicators
+from downloader import interval_to_ms
+
+# Binance bars are aligned to multiples of the interval since the epoch,
+# except weekly bars which open on Monday 00:00 UTC (the epoch was a Thursday).
+WEEK_OFFSET_MS = 4 * 86_400_000
+
+
+def bar_offset(interval):
+    return WEEK_OFFSET_MS if interval == '1w' else 0
+
+
+def index_ms(index):
+    return np.asarray(pd.DatetimeIndex(index).as_unit('ms').asi8)
+
+
+def _aggregate(t, o, h, l, c, v, interval):
+    # First open, max high, min low, last close, summed volume per bucket.
+    step, off = interval_to_ms(interval), bar_offset(interval)
+    buckets = (t - off) // step
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(t)] - 1
+    return {
+        'open_time': buckets[starts] * step + off,
+        'open': o[starts],
+        'high': np.maximum.reduceat(h, starts),
+        'low': np.minimum.reduceat(l, starts),
+        'close': c[ends],
+        'volume': np.add.reduceat(v, starts),
+    }
+
+
+def _frame(columns):
+    index = pd.DatetimeIndex(np.asarray(columns['open_time']).view('datetime64[ms]'), name='open_time')
+    return pd.DataFrame({name: columns[name] for name in ('open', 'high', 'low', 'close', 'volume')},
+                        index=index)
+
+
+def resample_ohlcv(df, interval, drop_partial=True):
+    # Build a coarser timeframe from a base OHLCV frame. With drop_partial a
+    # leading bucket that the base series starts in the middle of is dropped,
+    # since its open would be wrong. The last bucket may still be forming,
+    # just like the exchange's own last bar.
+    if df.empty:
+        return df.copy()
+    t = index_ms(df.index)
+    columns = _aggregate(
+        t, df['open'].to_numpy(), df['high'].to_numpy(), df['low'].to_numpy(),
+        df['close'].to_numpy(), df['volume'].to_numpy(), interval
+    )
+    if drop_partial and t[0] != columns['open_time'][0]:
+        columns = {name: col[1:] for name, col in columns.items()}
+    return _frame(columns)
+
+
+class Resampler:
+    # Keeps a resampled series up to date as base bars are appended.
+    # update() accepts either the whole base frame again (e.g. a fresh
+    # get_historical_data result) or only the newly appended bars, which may
+    # start with a fresh copy of the last bar sent before; only the last,
+    # possibly unfinished, output bar and anything after it is rebuilt. The
+    # base bars of that last output bar are kept for the rebuild, since an
+    # update need not contain them all.
+    def __init__(self, interval, drop_partial=True):
+        self.interval = interval
+        self.drop_partial = drop_partial
+        self.columns = None
+        self._tail_t = None
+        self._tail = None
+
+    def update(self, base):
+        if base.empty:
+            return self.frame()
+        t, arrays = index_ms(base.index), self._arrays(base)
+        if self.columns is None or not len(self.columns['open_time']):
+            frame = resample_ohlcv(base, self.interval, self.drop_partial)
+            self._set(frame, t, arrays)
+            return self.frame()
+
+        last_start = self.columns['open_time'][-1]
+        if t[0] > last_start:
+            # The update starts inside the last output bar: its earlier base
+            # bars come from the ones kept, up to the update's first bar (a bar
+            # sent again replaces the version kept, which may have been forming)
+            kept = self._tail_t < t[0]
+            t = np.r_[self._tail_t[kept], t]
+            arrays = tuple(np.r_[old[kept], a] for old, a in zip(self._tail, arrays))
+        first = int(np.searchsorted(t, last_start))
+        if first == len(t):
+            return self.frame()
+        # The last output bar is rebuilt from scratch from its base bars
+        t, arrays = t[first:], tuple(a[first:] for a in arrays)
+        new = _aggregate(t, *arrays, self.interval)
+        self.columns = {name: np.concatenate([col[:-1], new[name]]) for name, col in self.columns.items()}
+        self._keep_tail(t, arrays)
+        return self.frame()
+
+    @staticmethod
+    def _arrays(df):
+        return (df['open'].to_numpy(), df['high'].to_numpy(), df['low'].to_numpy(),
+                df['close'].to_numpy(), df['volume'].to_numpy())
+
+    def covers(self, base):
+        # Whether update(base) followed by trim() gives what resampling the
+        # whole of base would: base reaches the last output bar, and none of
+        # the output bars it needs opens before the first one kept
+        if self.columns is None or not len(self.columns['open_time']) or base.empty:
+            return False
+        t0, t_last = index_ms(base.index[[0, -1]])
+        step, off = interval_to_ms(self.interval), bar_offset(self.interval)
+        first_full = -(-(t0 - off) // step) * step + off
+        open_time = self.columns['open_time']
+        return first_full >= open_time[0] and t_last >= open_time[-1]
+
+    def trim(self, start_ms):
+        # Drops output bars opening before start_ms, e.g. once a rolling
+        # window has moved past them
+        first = int(np.searchsorted(self.columns['open_time'], start_ms))
+        if first:
+            self.columns = {name: col[first:] for name, col in self.columns.items()}
+
+    def _keep_tail(self, t, arrays):
+        # Base bars of the last output bar
+        open_time = self.columns['open_time']
+        first = int(np.searchsorted(t, open_time[-1])) if len(open_time) else len(t)
+        self._tail_t = t[first:].copy()
+        self._tail = tuple(a[first:].copy() for a in arrays)
+
+    def _set(self, frame, t, arrays):
+        self.columns = {'open_time': index_ms(frame.index)}
+        for name in ('open', 'high', 'low', 'close', 'volume'):
+            self.columns[name] = frame[name].to_numpy().copy()
+        self._keep_tail(t, arrays)
+
+    def frame(self):
+        if self.columns is None:
+            return None
+        return _frame(self.columns)
+
+
+def completed_htf_values(values, htf_open_ms, base_open_ms, base_interval, htf_interval):
+    # For every base bar, the value of the last higher-timeframe bar that had
+    # closed by the time the base bar closed (no look-ahead). NaN before the
+    # first completed HTF bar.
+    step, off = interval_to_ms(htf_interval), bar_offset(htf_interval)
+    base_close = base_open_ms + interval_to_ms(base_interval)
+    last_done_start = ((base_close - off) // step - 1) * step + off
+    pos = np.searchsorted(htf_open_ms, last_done_start, side='right') - 1
+    out = np.full(len(base_open_ms), np.nan)
+    valid = pos >= 0
+    out[valid] = np.asarray(values, dtype=np.float64)[pos[valid]]
+    return out
+
+
+def higher_tf_trend(df, base_interval, htf_interval, fast_len, slow_len):
+    # +1 when the HTF fast EMA is above the slow one, -1 when below, 0 while
+    # either is still warming up. Computed from df itself, no extra download.
+    htf = resample_ohlcv(df, htf_interval, drop_partial=False)
+    close = htf['close'].to_numpy()
+    # SMA-seeded like backtrader's EMA, as the strategy's own EMAs are
+    fast = indicators.ema(close, fast_len)
+    slow = indicators.ema(close, slow_len)
+    trend = np.sign(fast - slow)
+    trend[np.isnan(trend)] = 0.0
+    aligned = completed_htf_values(trend, index_ms(htf.index), index_ms(df.index),
+                                   base_interval, htf_interval)
+    aligned[np.isnan(aligned)] = 0.0
+    return aligned
@@ -0,0 +1,209 @@
+# result_cache.py
+import os
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+import threading
+from kline_cache import DEFAULT_CACHE_DIR
+from indicator_cache import fingerprint
+from pine_params import resolve_params
+from trade_log import TradeLog
+from instrumentation import count
+
+# Backtest results on local disk, keyed by what determines them: a content
+# fingerprint of the bars, the resolved strategy params, the commission and
+# the version of the strategy code. Entries carry symbol/timeframe/window as
+# metadata for invalidation. The least recently used rows are evicted once
+# the stored payloads exceed max_bytes.
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# Modules whose source decides a backtest's outcome
+STRATEGY_MODULES = ('strategy', 'pine_params', 'indicators', 'indicator_cache', 'resample', 'vector_engine',
+                    'backtesting', 'trade_log')
+
+# Orders fill at the next bar's open, so a result depends on every OHLCV column
+BAR_COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    symbol TEXT,
+    timeframe TEXT,
+    start_ms INTEGER,
+    end_ms INTEGER,
+    fingerprint TEXT,
+    strategy_version TEXT,
+    params TEXT,
+    commission REAL,
+    initial_value REAL,
+    final_value REAL,
+    metrics TEXT,
+    trade_log BLOB,
+    size INTEGER,
+    created REAL,
+    last_access REAL
+);
+CREATE INDEX IF NOT EXISTS results_access ON results (last_access);
+CREATE INDEX IF NOT EXISTS results_series ON results (symbol, timeframe);
+"""
+
+_version = None
+
+
+def strategy_version():
+    # Hash of the strategy code's source; editing any of it retires old rows
+    global _version
+    if _version is None:
+        h = hashlib.blake2b(digest_size=12)
+        here = os.path.dirname(os.path.abspath(__file__))
+        for name in STRATEGY_MODULES:
+            with open(os.path.join(here, f"{name}.py"), 'rb') as f:
+                h.update(f.read())
+        _version = h.hexdigest()
+    return _version
+
+
+def bars_fingerprint(df):
+    # Content hash of the bars for result keys; indicator_cache.fingerprint
+    # leaves out the open, which the indicators never read
+    return fingerprint(df, BAR_COLUMNS)
+
+
+def _canonical(params):
+    # 1 and 1.0 run the same backtest, so numbers are compared as floats
+    resolved = resolve_params(params)
+    return {k: (float(v) if isinstance(v, (int, float)) and not isinstance(v, bool) else v)
+            for k, v in sorted(resolved.items())}
+
+
+def result_key(fingerprint, params, commission, version=None):
+    payload = json.dumps({
+        'fingerprint': fingerprint,
+        'params': _canonical(params),
+        'commission': float(commission),
+        'version': version or strategy_version(),
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def summarize(initial_value, final_value, trade_log=None):
+    metrics = {
+        'Initial Value': initial_value,
+        'Final Value': final_value,
+        'Net Profit': final_value - initial_value,
+    }
+    if trade_log is not None:
+        metrics['Number of Trades'] = len(trade_log)
+    return metrics
+
+
+class ResultCache:
+    def __init__(self, path=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path or os.path.join(DEFAULT_CACHE_DIR, 'results.sqlite')
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with self._conn() as conn:
+            conn.executescript(SCHEMA)
+
+    def _conn(self):
+        # One connection per thread; WAL lets the dashboard and optimizer
+        # processes read while another writes
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key, need_trades=True):
+        # Returns (initial_value, final_value, metrics, trade_log) or None.
+        # Rows stored without a trade log only satisfy need_trades=False.
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT initial_value, final_value, metrics, trade_log FROM results WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or (need_trades and row[3] is None):
+            self.misses += 1
+            count('cache_lookups_total', cache='result', result='miss')
+            return None
+        with conn:
+            conn.execute("UPDATE results SET last_access = ? WHERE key = ?", (time.time(), key))
+        self.hits += 1
+        count('cache_lookups_total', cache='result', result='hit')
+        trade_log = TradeLog.from_columns(json.loads(zlib.decompress(row[3]))) if row[3] is not None else None
+        return row[0], row[1], json.loads(row[2]), trade_log
+
+    def put(self, key, initial_value, final_value, metrics, trade_log=None, fingerprint=None,
+            params=None, commission=None, symbol=None, timeframe=None, start_ms=None, end_ms=None):
+        # The trade log is stored as columns (see trade_log.TradeLog)
+        blob = zlib.compress(json.dumps(trade_log.to_columns()).encode()) if trade_log is not None else None
+        metrics_json = json.dumps(metrics)
+        params_json = json.dumps(_canonical(params)) if params is not None else None
+        size = len(metrics_json) + len(params_json or '') + (len(blob) if blob is not None else 0)
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            if trade_log is None:
+                # Never replace a full row with a summary-only one
+                existing = conn.execute("SELECT trade_log FROM results WHERE key = ?", (key,)).fetchone()
+                if existing is not None and existing[0] is not None:
+                    return
+            conn.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, symbol, timeframe, start_ms, end_ms, fingerprint, strategy_version(), params_json,
+                 commission, initial_value, final_value, metrics_json, blob, size, now, now)
+            )
+        self._evict()
+
+    def _evict(self):
+        conn = self._conn()
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        with conn:
+            for key, size in conn.execute("SELECT key, size FROM results ORDER BY last_access").fetchall():
+                conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                total -= size
+                if total <= self.max_bytes:
+                    break
+
+    def invalidate(self, symbol=None, timeframe=None, fingerprint=None, stale_only=False):
+        # Deletes matching rows (all rows when nothing is given). stale_only
+        # restricts it to rows written by other strategy code versions.
+        clauses, args = [], []
+        for column, value in (('symbol', symbol), ('timeframe', timeframe), ('fingerprint', fingerprint)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                args.append(value)
+        if stale_only:
+            clauses.append("strategy_version != ?")
+            args.append(strategy_version())
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        conn = self._conn()
+        with conn:
+            return conn.execute(f"DELETE FROM results{where}", args).rowcount
+
+    def clear(self):
+        return self.invalidate()
+
+    def stats(self):
+        count, total = self._conn().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+        return {'hits': self.hits, 'misses': self.misses, 'entries': count, 'bytes': total,
+                'max_bytes': self.max_bytes}
+
+
+_default_cache = None
+
+
+def get_result_cache():
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ResultCache()
+    return _default_cache
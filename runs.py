@@ -0,0 +1,129 @@
+# runs.py
+import math
+import threading
+from collections import OrderedDict
+from flask import Response, abort, jsonify, stream_with_context
+from chart import chart_frame
+from trade_log import TradeLog
+from jobs import get_job_queue, DONE
+
+# Finished backtests and optimizations, kept on the server under their run
+# id (the id of the job that produced them). The dashboards only hold the
+# run id: pages of the trade table, zoomed chart windows and CSV exports are
+# cut from the run here, so callback payloads stay the same size however
+# many trades a run has.
+
+DEFAULT_PAGE_SIZE = 10
+CSV_CHUNK_ROWS = 5000
+
+
+class Run:
+    def __init__(self, job):
+        params, result = job['params'], job['result']
+        self.id = job['id']
+        self.kind = job['kind']
+        self.params = params
+        self.symbol = params.get('symbol')
+        self.timeframe = params.get('timeframe')
+        self.result = {k: v for k, v in result.items()
+                       if k not in ('trade_log', 'chart', 'profile', 'monte_carlo')}
+        # Phase timings and counters the job recorded (see instrumentation)
+        self.profile = result.get('profile')
+        self.trade_log = TradeLog.from_columns(result.get('trade_log'))
+        # Full-resolution bars behind the price chart
+        self.bars = chart_frame(result['chart']) if result.get('chart') else None
+        # Monte Carlo summary and histograms computed by the backtest job
+        # (see jobs.monte_carlo_result), None without trades
+        self.monte_carlo = result.get('monte_carlo')
+
+    def trade_page(self, page_current=0, page_size=DEFAULT_PAGE_SIZE, sort_by=None):
+        # (rows, page_count) for a DataTable with custom paging and sorting
+        order = self.trade_log.order(sort_by)
+        start = page_current * page_size
+        rows = self.trade_log.table(order[start:start + page_size])
+        return rows, max(1, math.ceil(len(self.trade_log) / page_size))
+
+    def csv_chunks(self, chunk_rows=CSV_CHUNK_ROWS):
+        # The trade log as CSV text, a slice of rows at a time
+        table = self.trade_log.frame()
+        yield table.iloc[:0].to_csv(index=False)
+        for start in range(0, len(table), chunk_rows):
+            yield table.iloc[start:start + chunk_rows].to_csv(index=False, header=False)
+
+
+class RunStore:
+    # Recently viewed runs, loaded from the job store on first use; least
+    # recently used first out
+    def __init__(self, max_entries=16, queue=None):
+        self.max_entries = max_entries
+        self.queue = queue
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, run_id):
+        # The run, or None while its job is unknown or not done
+        if not run_id:
+            return None
+        with self._lock:
+            run = self._entries.get(run_id)
+            if run is not None:
+                self._entries.move_to_end(run_id)
+                return run
+        job = (self.queue or get_job_queue()).status(run_id)
+        if job is None or job['status'] != DONE:
+            return None
+        run = Run(job)
+        with self._lock:
+            self._entries[run_id] = run
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return run
+
+
+_default_store = None
+
+
+def get_run_store():
+    global _default_store
+    if _default_store is None:
+        _default_store = RunStore()
+    return _default_store
+
+
+def trades_csv_url(run_id):
+    return f"/runs/{run_id}/trades.csv"
+
+
+def profile_url(run_id):
+    return f"/runs/{run_id}/profile.json"
+
+
+def monte_carlo_url(run_id):
+    return f"/runs/{run_id}/monte_carlo.json"
+
+
+def add_routes(server):
+    # Streams a run's trade log as CSV from the Flask server behind a Dash
+    # app, and serves the profile its job recorded and its Monte Carlo
+    # summary
+    @server.route("/runs/<run_id>/trades.csv")
+    def trades_csv(run_id):
+        run = get_run_store().get(run_id)
+        if run is None:
+            abort(404)
+        return Response(stream_with_context(run.csv_chunks()), mimetype='text/csv',
+                        headers={'Content-Disposition': f'attachment; filename=trade_log_{run_id}.csv'})
+
+    @server.route("/runs/<run_id>/profile.json")
+    def run_profile(run_id):
+        run = get_run_store().get(run_id)
+        if run is None or run.profile is None:
+            abort(404)
+        return jsonify(run.profile)
+
+    @server.route("/runs/<run_id>/monte_carlo.json")
+    def run_monte_carlo(run_id):
+        run = get_run_store().get(run_id)
+        if run is None or run.monte_carlo is None:
+            abort(404)
+        return jsonify(run.monte_carlo['summary'])
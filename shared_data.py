@@ -0,0 +1,85 @@
+# shared_data.py
+import sys
+from multiprocessing import shared_memory, resource_tracker
+import numpy as np
+import pandas as pd
+
+VALUE_COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+
+
+def _layout(buf, rows):
+    # open_time (int64) followed by a (5, rows) float64 block, so a frame can
+    # be built on top of the buffer exactly like data.KlineColumns.frame does.
+    open_time = np.ndarray((rows,), dtype=np.int64, buffer=buf, offset=0)
+    values = np.ndarray((len(VALUE_COLUMNS), rows), dtype=np.float64, buffer=buf, offset=rows * 8)
+    return open_time, values
+
+
+def _frame(open_time, values):
+    index = pd.DatetimeIndex(open_time.view('datetime64[ms]'), name='open_time', copy=False)
+    return pd.DataFrame(values.T, index=index, columns=list(VALUE_COLUMNS), copy=False)
+
+
+class SharedOHLCV:
+    # An OHLCV frame published once by the parent process into a shared
+    # memory block. Pass .handle to workers (it is a tiny picklable tuple)
+    # and have them call attach(handle); they get a read-only DataFrame view
+    # of the same pages instead of their own copy.
+    def __init__(self, df):
+        rows = len(df)
+        self.shm = shared_memory.SharedMemory(create=True, size=max(rows * 8 * (len(VALUE_COLUMNS) + 1), 1))
+        open_time, values = _layout(self.shm.buf, rows)
+        open_time[:] = pd.DatetimeIndex(df.index).as_unit('ms').asi8
+        for i, name in enumerate(VALUE_COLUMNS):
+            values[i] = df[name].to_numpy(dtype=np.float64)
+        self.handle = (self.shm.name, rows)
+
+    def frame(self):
+        return _frame(*_layout(self.shm.buf, self.handle[1]))
+
+    def close(self):
+        # Only the publisher unlinks; attached workers just drop their mapping
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Worker-side mappings are kept alive for the life of the process
+_attached = {}
+
+
+def _attach_untracked(name):
+    # Before 3.13 attaching registers the segment with the resource tracker,
+    # which unlinks it (warning of a leak) when a worker with a tracker of
+    # its own exits, though the publisher owns it. Unregistering afterwards
+    # is no better when the worker shares the publisher's tracker (pool
+    # workers do): it drops the publisher's registration instead. So the
+    # registration is skipped, as track=False does.
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+def attach(handle):
+    name, rows = handle
+    if name not in _attached:
+        if sys.version_info >= (3, 13):
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        else:
+            shm = _attach_untracked(name)
+        open_time, values = _layout(shm.buf, rows)
+        open_time.flags.writeable = False
+        values.flags.writeable = False
+        _attached[name] = (shm, _frame(open_time, values))
+    return _attached[name][1]
+
@@ -0,0 +1,289 @@
+# sim_exchange.py
+import time
+import asyncio
+import threading
+import pandas as pd
+from ccxt.base.errors import InsufficientFunds, InvalidOrder, OrderNotFound
+from downloader import interval_to_ms
+from kline_cache import KlineCache
+
+# Offline stand-in for the exchange behind live_api.LiveTrader. It replays
+# historical bars (e.g. from the kline cache) at a chosen speed-up, or as
+# fast as they can be consumed, and trades against them: market orders fill
+# at the next bar's open (the first price after the order, as in the
+# backtests) moved against the taker by `slippage`; limit orders rest until
+# a bar trades through their price and fill at it, or at the bar's open if
+# that is already better. Fees are charged in the quote currency and
+# balances are kept per currency. Spot by default; allow_short lets the
+# base balance go negative, for PineStrategy's short trades.
+
+QUOTES = ('USDT', 'USDC', 'BUSD', 'FDUSD', 'BTC', 'ETH', 'BNB')
+DEFAULT_TAKER_FEE = 0.001
+DEFAULT_MAKER_FEE = 0.001
+
+
+def market_symbol(symbol):
+    # 'BTCUSDT' -> 'BTC/USDT'; ccxt-style symbols are returned as they are
+    if '/' in symbol:
+        return symbol
+    for quote in QUOTES:
+        if symbol.endswith(quote) and len(symbol) > len(quote):
+            return f"{symbol[:-len(quote)]}/{quote}"
+    raise ValueError(f"Cannot tell base and quote of {symbol}")
+
+
+class SimExchange:
+    # bars: a DataFrame shaped like get_historical_data's output.
+    # balances: starting balance per currency. latency: seconds every call
+    # waits before it is served, to emulate the network.
+    rateLimit = 0
+
+    def __init__(self, bars, symbol='BTC/USDT', interval='1m', balances=None, taker_fee=DEFAULT_TAKER_FEE,
+                 maker_fee=DEFAULT_MAKER_FEE, slippage=0.0, allow_short=False, latency=0.0):
+        self.symbol = market_symbol(symbol)
+        self.base, self.quote = self.symbol.split('/')
+        self.interval_ms = interval_to_ms(interval)
+        self.open_time = bars.index.as_unit('ms').asi8
+        self.columns = {name: bars[name].to_numpy(dtype=float) for name in ('open', 'high', 'low', 'close', 'volume')}
+        self.taker_fee = taker_fee
+        self.maker_fee = maker_fee
+        self.slippage = slippage
+        self.allow_short = allow_short
+        self.latency = latency
+        self.markets = {self.symbol: {
+            'symbol': self.symbol, 'base': self.base, 'quote': self.quote, 'spot': True,
+            'precision': {'amount': None, 'price': None}, 'limits': {'amount': {'min': None}},
+        }}
+        self.free = {self.base: 0.0, self.quote: 10000.0}
+        self.free.update(balances or {})
+        self.used = {currency: 0.0 for currency in self.free}
+        # Index of the next bar to replay; orders placed now see that bar first
+        self.cursor = 0
+        self.orders = {}
+        self._open = []
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_cache(cls, symbol='BTCUSDT', interval='1m', start=None, end=None, cache=None, **kwargs):
+        # Bars from the local kline cache (see kline_cache); start / end are
+        # epoch ms bounds on the bars' open times
+        columns, _ = (cache or KlineCache()).load(symbol, interval)
+        if columns is None:
+            raise ValueError(f"No cached klines for {symbol} {interval}")
+        t = columns['open_time']
+        lo = 0 if start is None else int(t.searchsorted(start))
+        hi = len(t) if end is None else int(t.searchsorted(end, side='right'))
+        index = pd.DatetimeIndex(t[lo:hi].astype('datetime64[ms]'), name='open_time')
+        bars = pd.DataFrame({name: columns[name][lo:hi] for name in ('open', 'high', 'low', 'close', 'volume')},
+                            index=index)
+        return cls(bars, market_symbol(symbol), interval, **kwargs)
+
+    def __len__(self):
+        return len(self.open_time)
+
+    def now_ms(self):
+        # The close time of the last bar replayed
+        if self.cursor == 0:
+            return int(self.open_time[0]) if len(self.open_time) else 0
+        return int(self.open_time[self.cursor - 1]) + self.interval_ms - 1
+
+    def last_price(self):
+        return float(self.columns['close'][self.cursor - 1]) if self.cursor else float(self.columns['open'][0])
+
+    def step(self):
+        # Replays one bar: fills the orders it trades through, then returns
+        # it as (open time ms, open, high, low, close, volume), or None at
+        # the end of the data
+        with self._lock:
+            i = self.cursor
+            if i >= len(self.open_time):
+                return None
+            c = self.columns
+            bar = (int(self.open_time[i]), float(c['open'][i]), float(c['high'][i]), float(c['low'][i]),
+                   float(c['close'][i]), float(c['volume'][i]))
+            self._match(bar)
+            self.cursor = i + 1
+            return bar
+
+    def replay(self, speed=None):
+        # Yields bars as they close. speed is how many times faster than
+        # real time the bars come; None replays them as fast as possible.
+        started = time.monotonic()
+        first = self.cursor
+        while True:
+            bar = self.step()
+            if bar is None:
+                return
+            if speed:
+                due = started + (self.cursor - first) * self.interval_ms / 1000.0 / speed
+                delay = due - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            yield bar
+
+    def _match(self, bar):
+        open_ms, open_, high, low = bar[0], bar[1], bar[2], bar[3]
+        still_open = []
+        for order in self._open:
+            if order['type'] == 'market':
+                slip = self.slippage if order['side'] == 'buy' else -self.slippage
+                self._fill(order, open_ * (1 + slip), self.taker_fee, open_ms)
+            elif order['side'] == 'buy' and low <= order['price']:
+                self._fill(order, min(order['price'], open_), self.maker_fee, open_ms)
+            elif order['side'] == 'sell' and high >= order['price']:
+                self._fill(order, max(order['price'], open_), self.maker_fee, open_ms)
+            else:
+                still_open.append(order)
+        self._open = still_open
+
+    def _reserve(self, order, sign):
+        # Moves what a resting order may spend between free and used
+        if order['side'] == 'buy':
+            currency, amount = self.quote, order['amount'] * order['reserve_price'] * (1 + self.taker_fee)
+        elif not self.allow_short:
+            currency, amount = self.base, order['amount']
+        else:
+            return
+        self.free[currency] -= sign * amount
+        self.used[currency] += sign * amount
+
+    def _check_funds(self, side, amount, price):
+        if side == 'buy':
+            need, have, currency = amount * price * (1 + self.taker_fee), self.free[self.quote], self.quote
+        elif not self.allow_short:
+            need, have, currency = amount, self.free[self.base], self.base
+        else:
+            return
+        if need > have:
+            raise InsufficientFunds(f"{currency} balance {have} is short of {need}")
+
+    def _fill(self, order, price, fee_rate, timestamp):
+        # Releases the order's reservation and settles it at price, unless
+        # the balance can no longer cover it
+        self._reserve(order, -1)
+        cost = order['amount'] * price
+        fee = cost * fee_rate
+        if order['side'] == 'buy':
+            covered = self.free[self.quote] >= cost + fee
+        else:
+            covered = self.allow_short or self.free[self.base] >= order['amount']
+        if not covered:
+            order.update(status='rejected', lastTradeTimestamp=timestamp)
+            return
+        if order['side'] == 'buy':
+            self.free[self.quote] -= cost + fee
+            self.free[self.base] += order['amount']
+        else:
+            self.free[self.base] -= order['amount']
+            self.free[self.quote] += cost - fee
+        order.update(status='closed', average=price, filled=order['amount'], remaining=0.0, cost=cost,
+                     fee={'cost': fee, 'currency': self.quote}, lastTradeTimestamp=timestamp)
+
+    def _wait(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def load_markets(self, reload=False):
+        self._wait()
+        return self.markets
+
+    def fetch_balance(self):
+        self._wait()
+        with self._lock:
+            currencies = sorted(set(self.free) | set(self.used))
+            balance = {'free': {}, 'used': {}, 'total': {}}
+            for currency in currencies:
+                free, used = self.free.get(currency, 0.0), self.used.get(currency, 0.0)
+                balance[currency] = {'free': free, 'used': used, 'total': free + used}
+                for key, value in (('free', free), ('used', used), ('total', free + used)):
+                    balance[key][currency] = value
+            return balance
+
+    def create_order(self, symbol, order_type, side, amount, price=None):
+        self._wait()
+        symbol = market_symbol(symbol)
+        if symbol != self.symbol:
+            raise InvalidOrder(f"{symbol} is not traded here, only {self.symbol}")
+        if order_type not in ('market', 'limit') or side not in ('buy', 'sell'):
+            raise InvalidOrder(f"Unsupported order: {order_type} {side}")
+        if amount <= 0 or (order_type == 'limit' and not price):
+            raise InvalidOrder("Orders need a positive amount, and limit orders a price")
+        with self._lock:
+            reserve_price = price if order_type == 'limit' else self.last_price()
+            self._check_funds(side, amount, reserve_price)
+            timestamp = self.now_ms()
+            order = {
+                'id': str(len(self.orders) + 1), 'clientOrderId': None, 'timestamp': timestamp,
+                'datetime': pd.Timestamp(timestamp, unit='ms').isoformat(), 'lastTradeTimestamp': None,
+                'symbol': symbol, 'type': order_type, 'side': side, 'price': price, 'average': None,
+                'amount': amount, 'filled': 0.0, 'remaining': amount, 'cost': 0.0, 'status': 'open',
+                'fee': None, 'reserve_price': reserve_price,
+            }
+            self.orders[order['id']] = order
+            self._reserve(order, 1)
+            self._open.append(order)
+            return self._public(order)
+
+    def create_market_order(self, symbol, side, amount):
+        return self.create_order(symbol, 'market', side, amount)
+
+    def create_limit_order(self, symbol, side, amount, price):
+        return self.create_order(symbol, 'limit', side, amount, price)
+
+    def _public(self, order):
+        return {k: v for k, v in order.items() if k != 'reserve_price'}
+
+    def fetch_order(self, order_id, symbol=None):
+        self._wait()
+        with self._lock:
+            if order_id not in self.orders:
+                raise OrderNotFound(order_id)
+            return self._public(self.orders[order_id])
+
+    def fetch_open_orders(self, symbol=None):
+        self._wait()
+        with self._lock:
+            return [self._public(order) for order in self._open]
+
+    def cancel_order(self, order_id, symbol=None):
+        self._wait()
+        with self._lock:
+            order = self.orders.get(order_id)
+            if order is None or order not in self._open:
+                raise OrderNotFound(order_id)
+            self._open.remove(order)
+            self._reserve(order, -1)
+            order['status'] = 'canceled'
+            return self._public(order)
+
+
+class AsyncSimExchange:
+    # The same simulator behind coroutines, for live_api.AsyncLiveTrader;
+    # latency is awaited here instead of slept in the simulator
+    def __init__(self, sim, latency=0.0):
+        self.sim = sim
+        self.latency = latency
+        self.rateLimit = sim.rateLimit
+
+    async def _call(self, method, *args):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return getattr(self.sim, method)(*args)
+
+    async def load_markets(self, reload=False):
+        return await self._call('load_markets', reload)
+
+    async def fetch_balance(self):
+        return await self._call('fetch_balance')
+
+    async def create_order(self, symbol, order_type, side, amount, price=None):
+        return await self._call('create_order', symbol, order_type, side, amount, price)
+
+    async def fetch_order(self, order_id, symbol=None):
+        return await self._call('fetch_order', order_id, symbol)
+
+    async def cancel_order(self, order_id, symbol=None):
+        return await self._call('cancel_order', order_id, symbol)
+
+    async def close(self):
+        pass
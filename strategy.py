@@ -1,69 +1,100 @@
 # strategy.py
+import time
+from array import array
 import backtrader as bt
+from pine_params import PINE_PARAMS, filters_enabled, needs_atr
+from indicator_cache import minperiod
+from trade_log import TradeRecorder
+
+# backtrader date numbers count days from 0001-01-01; day 719163 is 1970-01-01
+EPOCH_DAYS = 719163
+
+
+def num2ms(num):
+    # backtrader date number -> epoch ms, rounded to the second like num2date
+    return int(round((num - EPOCH_DAYS) * 86400.0)) * 1000
+
+
+# Extra feed columns: the higher-timeframe trend (+1 bull, -1 bear, 0
+# unknown) used by enableHigherTFFilter, and the entry filter masks (1.0 where
+# a long / short entry is allowed, see vector_engine.filter_masks)
+PINE_COLUMNS = ('htf_trend', 'filter_long', 'filter_short')
+
+
+class PineData(bt.feeds.PandasData):
+    # PandasData plus the precomputed PINE_COLUMNS; make_feed names the ones
+    # present and passes None for the others.
+    lines = PINE_COLUMNS
+    params = tuple((name, -1) for name in PINE_COLUMNS)
+
+
+class CachedLine(bt.Indicator):
+    # Replays a precomputed indicator array (see indicator_cache) as a line.
+    # minperiod must match the backtrader indicator it stands in for.
+    lines = ('value',)
+    params = (('values', None), ('minperiod', 1))
+
+    def __init__(self):
+        self.addminperiod(self.p.minperiod)
+
+    def next(self):
+        self.lines.value[0] = float(self.p.values[len(self.data) - 1])
+
+    def once(self, start, end):
+        self.lines.value.array[start:end] = array('d', self.p.values[start:end].tolist())
+
 
 class PineStrategy(bt.Strategy):
-    params = dict(
-        # EMA parameters
-        longTermFastLen=50,
-        longTermSlowLen=200,
-        shortTermFastLen=10,
-        shortTermSlowLen=20,
-        # Exit method: "Fixed", "Trailing", or "ATR"
-        exitMethod="Fixed",
-        fixedStopLossPct=1,      # e.g. 1% 
-        fixedTakeProfitPct=2,    # e.g. 2%
-        fixedTrailingPct=1.5,    # e.g. 1.5%
-        atrPeriod=14,
-        atrStopLossFactor=1.0,
-        atrTakeProfitFactor=2.0,
-        useAtrStopLoss=False,
-        # Filter parameters (disabled by default)
-        useAdxFilter=False,
-        adxPeriod=14,
-        adxThreshold=20.0,
-        useVolumeFilter=False,
-        volumeMALen=20,
-        useRSIFilter=False,
-        rsiPeriod=14,
-        rsiLongThreshold=50.0,
-        rsiShortThreshold=50.0,
-        useAtrFilter=False,
-        atrFilterThreshold=0.01,
-        enableHigherTFFilter=False,
-        enableSessionFilter=False
-    )
+    # indicatorCache: optional indicator_cache view bound to this strategy's
+    # data; indicators are then looked up instead of recomputed
+    params = dict(PINE_PARAMS, indicatorCache=None)
 
     def __init__(self):
         # Compute EMAs
-        self.emaLongFast = bt.indicators.ExponentialMovingAverage(self.data.close, period=self.params.longTermFastLen)
-        self.emaLongSlow = bt.indicators.ExponentialMovingAverage(self.data.close, period=self.params.longTermSlowLen)
-        self.emaShortFast = bt.indicators.ExponentialMovingAverage(self.data.close, period=self.params.shortTermFastLen)
-        self.emaShortSlow = bt.indicators.ExponentialMovingAverage(self.data.close, period=self.params.shortTermSlowLen)
-        # ATR indicator
-        self.atr = bt.indicators.ATR(self.data, period=self.params.atrPeriod)
-        # Trade log
-        self.trade_log = []
-        # Temporary containers
-        self.entry_order_info = {}
-        self.exit_order_info = {}
+        self.emaLongFast = self._indicator('ema', self.params.longTermFastLen)
+        self.emaLongSlow = self._indicator('ema', self.params.longTermSlowLen)
+        self.emaShortFast = self._indicator('ema', self.params.shortTermFastLen)
+        self.emaShortSlow = self._indicator('ema', self.params.shortTermSlowLen)
+        # ATR indicator, only for the exits that use it (its minperiod delays
+        # the first next() call)
+        params = self.params._getkwargs()
+        self.atr = self._indicator('atr', self.params.atrPeriod) if needs_atr(params) else None
+        # Higher timeframe trend and entry filters come precomputed with the
+        # feed (see PineData)
+        if self.params.enableHigherTFFilter and getattr(self.data.p, 'htf_trend', None) is None:
+            raise ValueError("enableHigherTFFilter needs a PineData feed with an htf_trend column")
+        self.use_filters = filters_enabled(params)
+        if self.use_filters and getattr(self.data.p, 'filter_long', None) is None:
+            raise ValueError("Entry filters need a PineData feed with filter columns "
+                             "(see backtesting.prepare_frame)")
+        # Trade log, columnar; dates are formatted only for display
+        self.trades = TradeRecorder()
+        # Last buy / sell fill as (epoch ms, price, size)
+        self.buy_fill = None
+        self.sell_fill = None
         self._exit_reason = None
+        # Best close since the entry fill, for the trailing stop
+        self._extreme = None
+
+    def _indicator(self, name, period):
+        cache = self.params.indicatorCache
+        if cache is not None:
+            return CachedLine(self.data, values=cache.get(name, period), minperiod=minperiod(name, period))
+        if name == 'ema':
+            return bt.indicators.ExponentialMovingAverage(self.data.close, period=period)
+        return bt.indicators.ATR(self.data, period=period)
+
+    @property
+    def trade_log(self):
+        return self.trades.log()
 
     def notify_order(self, order):
         if order.status == order.Completed:
+            fill = (num2ms(order.executed.dt), order.executed.price, order.executed.size)
             if order.isbuy():
-                self.entry_order_info = {
-                    "Type": "Buy",
-                    "Price": order.executed.price,
-                    "Size": order.executed.size,
-                    "Datetime": self.data.num2date(order.executed.dt).strftime("%Y-%m-%d %H:%M:%S")
-                }
+                self.buy_fill = fill
             elif order.issell():
-                self.exit_order_info = {
-                    "Type": "Sell",
-                    "Price": order.executed.price,
-                    "Size": order.executed.size,
-                    "Datetime": self.data.num2date(order.executed.dt).strftime("%Y-%m-%d %H:%M:%S")
-                }
+                self.sell_fill = fill
 
     def next(self):
         bullTrend = self.emaLongFast[0] > self.emaLongSlow[0]
@@ -73,6 +104,12 @@ class PineStrategy(bt.Strategy):
                      self.emaShortFast[-1] <= self.emaShortSlow[-1]
         shortSignal = bearTrend and self.emaShortFast[0] < self.emaShortSlow[0] and \
                       self.emaShortFast[-1] >= self.emaShortSlow[-1]
+        if self.params.enableHigherTFFilter:
+            longSignal = longSignal and self.data.htf_trend[0] > 0
+            shortSignal = shortSignal and self.data.htf_trend[0] < 0
+        if self.use_filters:
+            longSignal = longSignal and self.data.filter_long[0] > 0
+            shortSignal = shortSignal and self.data.filter_short[0] > 0
         
         if not self.position:
             if longSignal:
@@ -80,45 +117,90 @@ class PineStrategy(bt.Strategy):
             elif shortSignal:
                 self.sell()
         else:
-            entry_price = self.position.price
-            if self.position.size > 0 and self.params.exitMethod == "Fixed":
-                stop = entry_price * (1 - self.params.fixedStopLossPct / 100)
-                target = entry_price * (1 + self.params.fixedTakeProfitPct / 100)
-                if self.data.close[0] <= stop:
-                    self._exit_reason = "Stop Loss"
-                    self.close()
-                elif self.data.close[0] >= target:
-                    self._exit_reason = "Take Profit"
-                    self.close()
-            elif self.position.size < 0 and self.params.exitMethod == "Fixed":
-                stop = entry_price * (1 + self.params.fixedStopLossPct / 100)
-                target = entry_price * (1 - self.params.fixedTakeProfitPct / 100)
-                if self.data.close[0] >= stop:
-                    self._exit_reason = "Stop Loss"
-                    self.close()
-                elif self.data.close[0] <= target:
-                    self._exit_reason = "Take Profit"
-                    self.close()
+            reason = self._exit_check(self.data.close[0])
+            if reason is not None:
+                self._exit_reason = reason
+                self.close()
+
+    def _exit_check(self, close):
+        # Exit triggered by this bar's close, if any
+        p = self.params
+        entry_price = self.position.price
+        is_long = self.position.size > 0
+        if p.exitMethod == "Trailing":
+            if self._extreme is None:
+                self._extreme = entry_price
+            if is_long:
+                self._extreme = max(self._extreme, close)
+                hit = close <= self._extreme * (1 - p.fixedTrailingPct / 100)
+            else:
+                self._extreme = min(self._extreme, close)
+                hit = close >= self._extreme * (1 + p.fixedTrailingPct / 100)
+            return "Trailing Stop" if hit else None
+        if p.exitMethod == "ATR":
+            stop_dist = p.atrStopLossFactor * self.atr[0]
+            target_dist = p.atrTakeProfitFactor * self.atr[0]
+            if is_long:
+                stop, target = entry_price - stop_dist, entry_price + target_dist
+            else:
+                stop, target = entry_price + stop_dist, entry_price - target_dist
+        elif p.exitMethod == "Fixed":
+            if is_long:
+                stop = entry_price * (1 - p.fixedStopLossPct / 100)
+                target = entry_price * (1 + p.fixedTakeProfitPct / 100)
+            else:
+                stop = entry_price * (1 + p.fixedStopLossPct / 100)
+                target = entry_price * (1 - p.fixedTakeProfitPct / 100)
+            if p.useAtrStopLoss:
+                stop_dist = p.atrStopLossFactor * self.atr[0]
+                stop = entry_price - stop_dist if is_long else entry_price + stop_dist
+        else:
+            return None
+        if is_long:
+            if close <= stop:
+                return "Stop Loss"
+            if close >= target:
+                return "Take Profit"
+        else:
+            if close >= stop:
+                return "Stop Loss"
+            if close <= target:
+                return "Take Profit"
+        return None
 
     def notify_trade(self, trade):
         if trade.isclosed:
-            log_entry = {
-                'Entry Date': self.data.num2date(trade.dtopen).strftime("%Y-%m-%d %H:%M:%S"),
-                'Exit Date': self.data.num2date(trade.dtclose).strftime("%Y-%m-%d %H:%M:%S"),
-                'Size': trade.size,
-                'Entry Price': trade.price,
-                'Profit': trade.pnl,
-                'Exit Reason': self._exit_reason if self._exit_reason else "N/A",
-                'Entry Order': self.entry_order_info,
-                'Exit Order': self.exit_order_info
-            }
-            self.trade_log.append(log_entry)
+            self.trades.append(num2ms(trade.dtopen), num2ms(trade.dtclose), trade.size, trade.price, trade.pnl,
+                               self._exit_reason, self.buy_fill, self.sell_fill)
             self._exit_reason = None
-            self.entry_order_info = {}
-            self.exit_order_info = {}
+            self._extreme = None
+            self.buy_fill = None
+            self.sell_fill = None
 
     def stop(self):
         # Force-close any open position at end of data
         if self.position:
             self._exit_reason = "End of Data"
             self.close()
+
+
+class ProgressAnalyzer(bt.Analyzer):
+    # Reports bars processed to a callback every `every` bars
+    params = (('callback', None), ('every', 1000), ('total', None))
+
+    def next(self):
+        bars = len(self.data)
+        if bars % self.p.every == 0:
+            self.p.callback({'stage': 'backtest', 'bars_total': self.p.total, 'bars_processed': bars})
+
+
+class ProfiledPineStrategy(PineStrategy):
+    # PineStrategy that times each next() call, for the latency histogram
+    def __init__(self):
+        super().__init__()
+        self.next_seconds = array('d')
+
+    def next(self):
+        started = time.perf_counter()
+        super().next()
+        self.next_seconds.append(time.perf_counter() - started)
@@ -0,0 +1,68 @@
+# synthetic.py
+import numpy as np
+import pandas as pd
+from downloader import interval_to_ms
+
+# Regimes for regime_switching_ohlcv: (drift, volatility) of the per-bar log return
+REGIMES = (
+    (0.0003, 0.0015),   # trending up
+    (-0.0003, 0.0015),  # trending down
+    (0.0, 0.0006),      # quiet range
+    (0.0, 0.004),       # volatile chop
+)
+
+
+def _frame(rng, log_returns, volatility, interval, start, start_price):
+    # Bars around a close path: each bar opens at the previous close, with
+    # wicks and volume drawn from rng
+    bars = len(log_returns)
+    close = start_price * np.exp(np.cumsum(log_returns))
+    open_ = np.empty(bars)
+    open_[0] = start_price
+    open_[1:] = close[:-1]
+    wick = np.abs(rng.normal(0.0, volatility / 2, (2, bars)))
+    high = np.maximum(open_, close) * (1 + wick[0])
+    low = np.minimum(open_, close) * (1 - wick[1])
+    volume = rng.lognormal(2.0, 0.5, bars)
+    start_ms = int(pd.Timestamp(start, tz='UTC').timestamp() * 1000)
+    open_time = start_ms + np.arange(bars, dtype=np.int64) * interval_to_ms(interval)
+    index = pd.DatetimeIndex(open_time.view('datetime64[ms]'), name='open_time')
+    return pd.DataFrame({'open': open_, 'high': high, 'low': low, 'close': close, 'volume': volume},
+                        index=index)
+
+
+def random_walk_ohlcv(bars, interval='1m', start='2024-01-01', seed=0, start_price=30000.0,
+                      volatility=0.002):
+    # Deterministic geometric random walk shaped like get_historical_data output
+    rng = np.random.default_rng(seed)
+    return _frame(rng, rng.normal(0.0, volatility, bars), volatility, interval, start, start_price)
+
+
+def regime_switching_ohlcv(bars, interval='1m', start='2024-01-01', seed=0, start_price=30000.0,
+                           mean_regime_bars=2000, regimes=REGIMES):
+    # Random walk that switches between trending, ranging and volatile
+    # regimes; regime lengths are geometric with mean mean_regime_bars. A
+    # trend leading away from start_price is likely to be turned around, the
+    # more so the further the price has wandered, so millions of bars stay in
+    # a plausible price range. Deterministic for a given seed.
+    rng = np.random.default_rng(seed)
+    lengths = rng.geometric(1.0 / mean_regime_bars, bars // mean_regime_bars * 2 + 8)
+    while lengths.sum() < bars:
+        lengths = np.r_[lengths, rng.geometric(1.0 / mean_regime_bars, len(lengths))]
+    labels = rng.integers(len(regimes), size=len(lengths))
+    params = np.asarray(regimes, dtype=np.float64)
+    volatility = np.repeat(params[labels, 1], lengths)[:bars]
+    log_returns = rng.normal(0.0, volatility)
+    flips = rng.random(len(lengths))
+    level, lo = 0.0, 0
+    for label, length, flip in zip(labels, lengths, flips):
+        if lo >= bars:
+            break
+        hi = min(lo + length, bars)
+        drift = params[label, 0]
+        if drift * level > 0 and flip < np.tanh(abs(level)):
+            drift = -drift
+        log_returns[lo:hi] += drift
+        level += log_returns[lo:hi].sum()
+        lo = hi
+    return _frame(rng, log_returns, volatility, interval, start, start_price)
@@ -0,0 +1,96 @@
+# tests/test_kline_cache.py
+import numpy as np
+import pytest
+import data
+from kline_cache import KlineCache, COLUMNS
+
+T0 = 1_700_000_040_000 // 60_000 * 60_000
+MINUTE = 60_000
+
+
+class FakeMarket:
+    # 1m klines from T0 up to `now`; the bar containing now is still forming
+    # and has different prices than its final version
+    def __init__(self):
+        self.now = T0
+        self.requests = []
+
+    def kline(self, i):
+        open_ms = T0 + i * MINUTE
+        forming = open_ms + MINUTE > self.now
+        price = 100.0 + i + (0.5 if forming else 0.0)
+        return [open_ms, str(price), str(price + 1), str(price - 1), str(price + 0.25), str(10.0 + i),
+                open_ms + MINUTE - 1]
+
+    def iter_kline_pages(self, symbol, interval, start_ts, end_ts=None, **kwargs):
+        self.requests.append((start_ts, end_ts))
+        last = min(self.now, end_ts if end_ts is not None else self.now)
+        first = max(0, -(-(start_ts - T0) // MINUTE))
+        count = (last - T0) // MINUTE + 1 - first
+        return [[self.kline(first + i) for i in range(count)]] if count > 0 else []
+
+
+@pytest.fixture
+def market(monkeypatch):
+    market = FakeMarket()
+    monkeypatch.setattr(data, 'iter_kline_pages', market.iter_kline_pages)
+    monkeypatch.setattr(data, 'parse_start', lambda start_str: T0)
+    monkeypatch.setattr(data.time, 'time', lambda: market.now / 1000.0)
+    return market
+
+
+def test_store_load_round_trip(tmp_path):
+    cache = KlineCache(str(tmp_path))
+    n = 5
+    columns = {'open_time': T0 + np.arange(n, dtype=np.int64) * MINUTE}
+    for k, name in enumerate(COLUMNS[1:]):
+        columns[name] = np.linspace(1.0, 2.0, n) + k
+    cache.store('btcusdt', '1m', columns, T0, T0 + n * MINUTE - 1)
+
+    loaded, meta = cache.load('BTCUSDT', '1m')
+    assert meta == {'start': T0, 'end': T0 + n * MINUTE - 1, 'rows': n}
+    assert loaded['open_time'].dtype == np.int64
+    for name in COLUMNS:
+        np.testing.assert_array_equal(loaded[name], columns[name])
+    assert all(loaded[name].dtype == np.float64 for name in COLUMNS[1:])
+
+
+def test_load_rejects_mismatched_columns(tmp_path):
+    cache = KlineCache(str(tmp_path))
+    columns = {name: np.arange(3) for name in COLUMNS}
+    cache.store('BTCUSDT', '1m', columns, T0, T0 + 3 * MINUTE - 1)
+    np.save(tmp_path / 'klines' / 'BTCUSDT_1m' / 'close.npy', np.arange(2.0))
+    assert cache.load('BTCUSDT', '1m') == (None, None)
+
+
+def test_forming_bar_is_returned_but_not_cached(tmp_path, market):
+    cache = KlineCache(str(tmp_path))
+    market.now = T0 + 10 * MINUTE + 30_000
+    df = data.get_historical_data('BTCUSDT', '1m', 'start', cache=cache)
+    assert len(df) == 11
+    assert df['open'].iat[-1] == 110.5
+
+    cached, meta = cache.load('BTCUSDT', '1m')
+    assert meta['rows'] == 10
+    assert meta['end'] == T0 + 10 * MINUTE - 1
+    assert cached['open_time'][-1] == T0 + 9 * MINUTE
+
+
+def test_refresh_refetches_only_after_the_cached_range(tmp_path, market):
+    cache = KlineCache(str(tmp_path))
+    market.now = T0 + 10 * MINUTE + 30_000
+    data.get_historical_data('BTCUSDT', '1m', 'start', cache=cache)
+
+    # The forming bar has closed since, with other prices than were seen
+    market.now = T0 + 12 * MINUTE + 30_000
+    market.requests.clear()
+    df = data.get_historical_data('BTCUSDT', '1m', 'start', cache=cache)
+    assert market.requests == [(T0 + 10 * MINUTE, None)]
+    assert len(df) == 13
+    assert df['open'].iat[10] == 110.0
+    assert df['open'].iat[-1] == 112.5
+    np.testing.assert_array_equal(df['close'].to_numpy()[:12], 100.25 + np.arange(12))
+
+    cached, meta = cache.load('BTCUSDT', '1m')
+    assert meta['rows'] == 12
+    assert cached['open'][10] == 110.0
@@ -0,0 +1,75 @@
+# tests/test_kline_columns.py
+import gc
+import tracemalloc
+import numpy as np
+from data import KlineColumns, VALUE_COLUMNS
+
+MINUTE = 60_000
+
+
+def klines(first, count, t0=1_700_000_000_000):
+    # Raw Binance rows: prices and volume as strings, close time at index 6
+    return [[t0 + i * MINUTE, str(1.0 + i), str(2.0 + i), str(0.5 + i), str(1.5 + i), str(10.0 * i),
+             t0 + (i + 1) * MINUTE - 1, "0", 0, "0", "0", "0"]
+            for i in range(first, first + count)]
+
+
+def test_frame_wraps_the_buffers_without_copying():
+    buf = KlineColumns(capacity=8)
+    buf.append_klines(klines(0, 5))
+    df = buf.frame()
+    assert len(df) == 5
+    assert list(df.columns) == list(VALUE_COLUMNS)
+    for name in VALUE_COLUMNS:
+        assert df[name].dtype == np.float64
+        assert np.shares_memory(df[name].to_numpy(), buf.values)
+    assert df.index.dtype == np.dtype('datetime64[ms]')
+    assert np.shares_memory(df.index.asi8, buf.open_time)
+    np.testing.assert_array_equal(df['close'].to_numpy(), 1.5 + np.arange(5))
+    np.testing.assert_array_equal(df['volume'].to_numpy(), 10.0 * np.arange(5))
+
+
+def test_frame_from_start_is_still_a_view():
+    buf = KlineColumns(capacity=8)
+    buf.append_klines(klines(0, 6))
+    df = buf.frame(start_ts=buf.open_time[2])
+    assert len(df) == 4
+    assert df.index[0].value // 1_000_000 == buf.open_time[2]
+    assert np.shares_memory(df['open'].to_numpy(), buf.values)
+
+
+def test_growing_keeps_rows_and_drops_overlap():
+    buf = KlineColumns(capacity=2)
+    buf.append_klines(klines(0, 3))
+    # Pages overlap at their edges
+    buf.append_klines(klines(2, 4))
+    assert len(buf) == 6
+    np.testing.assert_array_equal(np.diff(buf.open_time[:buf.n]), MINUTE)
+    np.testing.assert_array_equal(buf.frame()['open'].to_numpy(), 1.0 + np.arange(6))
+
+
+def test_bars_closing_after_closed_before_are_volatile():
+    rows = klines(0, 5)
+    buf = KlineColumns(capacity=8, closed_before=rows[3][6])
+    buf.append_klines(rows)
+    assert buf.n == 5
+    assert buf.n_closed == 3
+    assert buf.closed_end == rows[2][6]
+    assert len(buf.columns(buf.n_closed)['open_time']) == 3
+
+
+def test_parsing_pages_peaks_near_the_output_size():
+    # Pages are built lazily inside the traced region, as a download hands
+    # them over; only the parser decides how many are alive at once
+    bars, page = 100_000, 1000
+    gc.collect()
+    tracemalloc.start()
+    buf = KlineColumns(capacity=bars)
+    for first in range(0, bars, page):
+        buf.append_klines(klines(first, page))
+    df = buf.frame()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(df) == bars
+    output = buf.open_time.nbytes + buf.values.nbytes
+    assert peak < 1.5 * output
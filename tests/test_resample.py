@@ -0,0 +1,32 @@
+# tests/test_resample.py
+import pandas as pd
+import pytest
+from data import resample_base
+from resample import resample_ohlcv
+from synthetic import random_walk_ohlcv
+
+
+def _forming(df, close):
+    # The same bars with the last one still forming at another close
+    out = df.copy()
+    out.iloc[-1, out.columns.get_loc('close')] = close
+    return out
+
+
+@pytest.mark.parametrize('interval', ['15m', '1h'])
+def test_kept_resampler_matches_resampling_each_window(interval):
+    base = random_walk_ohlcv(3000, seed=5)
+    windows = [
+        _forming(base.iloc[:1000], 1.0),
+        base.iloc[:1000],              # the forming bar closed
+        base.iloc[:1003],
+        base.iloc[200:1800],           # a rolling window moved on, mid-bucket
+        base.iloc[100:1800],           # an earlier start than what is kept
+        base.iloc[300:900],            # ends before the kept bars
+        base.iloc[950:2990],
+        base.iloc[2990:2995],          # inside one bucket
+        base.iloc[2990:],
+    ]
+    for window in windows:
+        pd.testing.assert_frame_equal(resample_base(window, interval, key=('test', interval)),
+                                      resample_ohlcv(window, interval), check_freq=False)
@@ -0,0 +1,95 @@
+# tests/test_shared_data.py
+import os
+import mmap
+import multiprocessing
+import numpy as np
+import pandas as pd
+import pytest
+import shared_data
+from shared_data import SharedOHLCV, attach, VALUE_COLUMNS
+from synthetic import random_walk_ohlcv
+from benchmarks.bench_shared_memory import _init_shared, _init_empty, _touch
+
+
+def _root(array):
+    # The array a view was cut from (pandas hands out read-only views of
+    # everything, so the flags that matter are on this one)
+    while isinstance(array.base, np.ndarray):
+        array = array.base
+    return array
+
+
+@pytest.fixture
+def shared():
+    with SharedOHLCV(random_walk_ohlcv(500, seed=3)) as shared:
+        yield shared
+        entry = shared_data._attached.pop(shared.handle[0], None)
+        if entry is not None:
+            entry[0].close()
+
+
+def test_published_frame_matches_source(shared):
+    df = random_walk_ohlcv(500, seed=3)
+    pd.testing.assert_frame_equal(shared.frame(), df[list(VALUE_COLUMNS)], check_names=False,
+                                  check_freq=False)
+
+
+def test_attach_is_a_read_only_view_of_the_segment(shared):
+    df = attach(shared.handle)
+    assert attach(shared.handle) is df
+    for array in [df[name].to_numpy() for name in VALUE_COLUMNS] + [df.index.asi8]:
+        root = _root(array)
+        assert isinstance(root.base, mmap.mmap)
+        assert not root.flags.writeable
+
+
+def test_attach_sees_the_published_pages(shared):
+    # A write through the publisher shows up in the attached view, so the
+    # view is the segment itself and not a copy
+    df = attach(shared.handle)
+    _, values = shared_data._layout(shared.shm.buf, shared.handle[1])
+    values[VALUE_COLUMNS.index('close'), 7] = -1.0
+    assert df['close'].iat[7] == -1.0
+
+
+def _close_sum(handle):
+    return float(attach(handle)['close'].sum())
+
+
+def test_spawned_workers_attach(shared):
+    expected = float(shared.frame()['close'].sum())
+    with multiprocessing.get_context('spawn').Pool(2) as pool:
+        assert pool.map(_close_sum, [shared.handle] * 2) == [expected, expected]
+    # The workers did not take the segment with them
+    assert float(attach(shared.handle)['close'].sum()) == expected
+
+
+def _footprint(_):
+    # Unique (private) and proportional set size after reading every column
+    _touch(None)
+    fields = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            name, _, value = line.partition(':')
+            if value.strip().endswith('kB'):
+                fields[name] = int(value.split()[0]) * 1024
+    return fields['Private_Clean'] + fields['Private_Dirty'], fields['Pss']
+
+
+@pytest.mark.skipif(not os.path.exists('/proc/self/smaps_rollup'), reason="needs Linux smaps_rollup")
+@pytest.mark.parametrize('processes', [1, 3])
+def test_workers_share_the_dataset_pages(processes):
+    # Against workers that hold no data, attaching and reading the whole
+    # frame adds almost no private memory per worker, and the workers' PSS
+    # growth together stays below one copy of the dataset
+    df = random_walk_ohlcv(1_000_000)
+    dataset = int(df.memory_usage(index=True).sum())
+    ctx = multiprocessing.get_context('spawn')
+    with SharedOHLCV(df) as shared:
+        runs = {}
+        for label, initializer, initargs in (('empty', _init_empty, ()), ('shared', _init_shared, (shared.handle,))):
+            with ctx.Pool(processes, initializer=initializer, initargs=initargs) as pool:
+                runs[label] = np.array(pool.map(_footprint, range(processes), chunksize=1), dtype=np.float64)
+    uss_growth, pss_growth = (runs['shared'] - runs['empty'].mean(axis=0)).T
+    assert (uss_growth < 0.1 * dataset).all()
+    assert pss_growth.sum() < dataset
@@ -0,0 +1,14 @@
+# tests/test_trade_log.py
+from trade_log import TradeLog, TradeRecorder
+
+
+def test_iterating_a_trade_log_yields_its_records():
+    recorder = TradeRecorder()
+    recorder.append(0, 60_000, 1, 100.0, 5.0, 'Take Profit', buy=(0, 100.0, 1), sell=(60_000, 105.0, -1))
+    recorder.append(120_000, 180_000, -2, 104.0, -3.0, 'Stop Loss', buy=(180_000, 105.5, 2), sell=(120_000, 104.0, -2))
+    log = recorder.log()
+    trades = [t for t in log]
+    assert trades == log.records()
+    assert [t['Exit Reason'] for t in trades] == ['Take Profit', 'Stop Loss']
+    assert trades[1]['Entry Order']['Type'] == 'Buy'
+    assert list(TradeLog()) == []
@@ -0,0 +1,57 @@
+# tests/test_vector_engine.py
+import pytest
+from backtesting import run_backtrader, prepare_frame
+from vector_engine import run_vector_backtest, run_vector_batch
+from synthetic import random_walk_ohlcv
+
+FAST = {'longTermFastLen': 10, 'longTermSlowLen': 30, 'shortTermFastLen': 3, 'shortTermSlowLen': 8}
+
+PARAM_SETS = [
+    FAST,
+    dict(FAST, fixedStopLossPct=0.3, fixedTakeProfitPct=0.5),
+    dict(FAST, exitMethod='Trailing', fixedTrailingPct=0.5),
+    dict(FAST, exitMethod='ATR', atrPeriod=10),
+    dict(FAST, useAtrStopLoss=True, atrPeriod=10),
+    dict(FAST, useRSIFilter=True, useVolumeFilter=True),
+]
+
+
+@pytest.mark.parametrize('start_price', [100.0, 30000.0])
+@pytest.mark.parametrize('params', PARAM_SETS)
+def test_vector_engine_matches_backtrader(params, start_price):
+    # Cheap bars let every order fill; expensive ones run into the broker's
+    # margin rejections
+    df = prepare_frame(random_walk_ohlcv(1500, seed=1, start_price=start_price), '1m', params)
+    bt_initial, bt_final, bt_log, _ = run_backtrader(df, params)
+    initial, final, log = run_vector_backtest(df, params)
+    assert len(bt_log) > 0
+    assert (initial, final) == (bt_initial, bt_final)
+    assert log.records() == bt_log.records()
+
+
+def test_prepared_filter_columns_are_not_reused_for_other_filter_params():
+    # A frame prepared for one RSI filter, run with another: the masks must
+    # be rebuilt, not taken from the frame
+    df = random_walk_ohlcv(3000, seed=1)
+    rsi = dict(FAST, useRSIFilter=True, rsiLongThreshold=60.0, rsiShortThreshold=40.0)
+    other = dict(rsi, rsiPeriod=5)
+    prepared = prepare_frame(df, '1m', rsi)
+    expected = run_vector_backtest(prepare_frame(df, '1m', other), other)
+    assert run_vector_backtest(prepared, other) != run_vector_backtest(prepared, rsi)
+    assert run_vector_backtest(prepared, other) == expected
+    assert run_vector_batch(prepared, [rsi, other])[1] == expected
+    _, bt_final, bt_log, _ = run_backtrader(prepare_frame(prepared, '1m', other), other)
+    assert (bt_final, bt_log.records()) == (expected[1], expected[2].records())
+
+
+def test_batch_equals_single_runs_with_mixed_htf_sets():
+    df = random_walk_ohlcv(4000, seed=2)
+    htf = dict(FAST, enableHigherTFFilter=True)
+    sets = [dict(htf, higherTimeframe='15m'), dict(htf, higherTimeframe='5m'),
+            dict(htf, higherTimeframe='15m', longTermFastLen=5, longTermSlowLen=12), FAST]
+    single = [run_vector_backtest(prepare_frame(df, '1m', p), p) for p in sets]
+    assert run_vector_batch(df, sets, timeframe='1m') == single
+    # A frame prepared for the first set must not lend its trend to the others
+    assert run_vector_batch(prepare_frame(df, '1m', sets[0]), sets, timeframe='1m') == single
+    with pytest.raises(ValueError):
+        run_vector_batch(prepare_frame(df, '1m', sets[0]), sets)
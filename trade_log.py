@@ -0,0 +1,193 @@
+# trade_log.py
+from array import array
+import numpy as np
+import pandas as pd
+
+# Closed trades as columns instead of one nested dict per trade: epoch-ms
+# timestamps, prices, sizes, P&L and an exit-reason code per trade, plus the
+# buy and sell fills (which side opened the trade decides which one is the
+# entry). Dates are only formatted when records(), frame(), table() or
+# iteration asks for them, for display or export. A log costs ~90 bytes per
+# trade and its columns are read-only numpy arrays.
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+REASONS = ('N/A', 'Stop Loss', 'Take Profit', 'End of Data', 'Trailing Stop')
+
+# name -> array typecode; fills that never happened have a NaN price
+COLUMNS = (
+    ('entry_ms', 'q'), ('exit_ms', 'q'), ('size', 'd'), ('entry_price', 'd'), ('profit', 'd'), ('reason', 'b'),
+    ('buy_ms', 'q'), ('buy_price', 'd'), ('buy_size', 'd'),
+    ('sell_ms', 'q'), ('sell_price', 'd'), ('sell_size', 'd'),
+)
+DTYPES = {'q': np.int64, 'd': np.float64, 'b': np.int8}
+
+# Column titles of frame() and table(), and the field each one shows
+TABLE_COLUMNS = (
+    ('Entry Date', 'entry_ms'), ('Exit Date', 'exit_ms'), ('Size', 'size'), ('Entry Price', 'entry_price'),
+    ('Profit', 'profit'), ('Exit Reason', 'reason'),
+    ('Buy Date', 'buy_ms'), ('Buy Price', 'buy_price'), ('Buy Size', 'buy_size'),
+    ('Sell Date', 'sell_ms'), ('Sell Price', 'sell_price'), ('Sell Size', 'sell_size'),
+)
+# Exit reasons sort alphabetically in the trade table
+REASON_RANK = np.argsort(np.argsort(REASONS)).astype(np.int8)
+
+
+def reason_code(reason):
+    return REASONS.index(reason) if reason else 0
+
+
+def _number(x):
+    # Whole-number sizes read back as ints, as backtrader reports them
+    x = float(x)
+    return int(x) if x.is_integer() else x
+
+
+class TradeLog:
+    def __init__(self, **columns):
+        n = len(next(iter(columns.values()))) if columns else 0
+        self.columns = {}
+        for name, code in COLUMNS:
+            values = columns.get(name)
+            if values is None:
+                values = np.zeros(n) if code != 'd' else np.full(n, np.nan)
+            values = np.array(values, dtype=DTYPES[code])
+            values.setflags(write=False)
+            self.columns[name] = values
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __len__(self):
+        return len(self.columns['entry_ms'])
+
+    def __iter__(self):
+        # Trades as records(), so loops written for the old list of dicts
+        # still work (indexing by name returns a column)
+        return iter(self.records())
+
+    def __eq__(self, other):
+        if not isinstance(other, TradeLog):
+            return NotImplemented
+        return all(np.array_equal(self.columns[name], other.columns[name], equal_nan=(code == 'd'))
+                   for name, code in COLUMNS)
+
+    def __add__(self, other):
+        return TradeLog(**{name: np.concatenate([self.columns[name], other.columns[name]])
+                           for name, _ in COLUMNS})
+
+    def __repr__(self):
+        return f"TradeLog({len(self)} trades)"
+
+    def slice(self, start=0, stop=None):
+        return TradeLog(**{name: values[start:stop] for name, values in self.columns.items()})
+
+    def take(self, positions):
+        return TradeLog(**{name: values[positions] for name, values in self.columns.items()})
+
+    def to_columns(self):
+        # JSON-friendly; from_columns reverses it
+        return {name: values.tolist() for name, values in self.columns.items()}
+
+    @classmethod
+    def from_columns(cls, data):
+        return cls(**data) if data else cls()
+
+    def _dates(self, name):
+        return pd.to_datetime(self.columns[name], unit='ms').strftime(DATE_FORMAT).tolist()
+
+    def records(self, start=0, stop=None):
+        # One dict per trade, as PineStrategy used to log them
+        part = self.slice(start, stop)
+        c = part.columns
+        entry, exit_, buy, sell = (part._dates(name) for name in ('entry_ms', 'exit_ms', 'buy_ms', 'sell_ms'))
+        out = []
+        for k in range(len(part)):
+            buy_order = sell_order = {}
+            if not np.isnan(c['buy_price'][k]):
+                buy_order = {"Type": "Buy", "Price": float(c['buy_price'][k]),
+                             "Size": _number(c['buy_size'][k]), "Datetime": buy[k]}
+            if not np.isnan(c['sell_price'][k]):
+                sell_order = {"Type": "Sell", "Price": float(c['sell_price'][k]),
+                              "Size": _number(c['sell_size'][k]), "Datetime": sell[k]}
+            out.append({
+                'Entry Date': entry[k],
+                'Exit Date': exit_[k],
+                'Size': _number(c['size'][k]),
+                'Entry Price': float(c['entry_price'][k]),
+                'Profit': float(c['profit'][k]),
+                'Exit Reason': REASONS[c['reason'][k]],
+                'Entry Order': buy_order,
+                'Exit Order': sell_order,
+            })
+        return out
+
+    def frame(self, positions=None):
+        # Flat table with one row per trade (all of them, or those at
+        # positions, in that order); used for CSV export and the trade table
+        c = self.columns if positions is None else {name: v[positions] for name, v in self.columns.items()}
+        out = {}
+        for title, name in TABLE_COLUMNS:
+            values = c[name]
+            if name.endswith('_ms'):
+                values = pd.to_datetime(values, unit='ms')
+                fill = name[:-3]
+                if fill in ('buy', 'sell'):
+                    values = values.where(~np.isnan(c[f'{fill}_price']))
+            elif name == 'reason':
+                values = np.asarray(REASONS, dtype=object)[values]
+            out[title] = values
+        return pd.DataFrame(out)
+
+    def table(self, positions):
+        # frame() rows as JSON-friendly dicts with formatted dates
+        df = self.frame(positions)
+        for title, name in TABLE_COLUMNS:
+            if name.endswith('_ms'):
+                df[title] = df[title].dt.strftime(DATE_FORMAT)
+        return df.astype(object).where(df.notna(), None).to_dict('records')
+
+    def order(self, sort_by=None):
+        # Trade positions sorted by DataTable-style sort_by entries
+        # ({'column_id': title, 'direction': 'asc' | 'desc'}, first entry
+        # first); unsorted without any
+        if not sort_by:
+            return np.arange(len(self))
+        fields = dict(TABLE_COLUMNS)
+        keys = []
+        # lexsort sorts by its last key first
+        for spec in reversed(sort_by):
+            name = fields[spec['column_id']]
+            values = self.columns[name]
+            if name == 'reason':
+                values = REASON_RANK[values]
+            keys.append(-values if spec['direction'] == 'desc' else values)
+        return np.lexsort(keys)
+
+
+class TradeRecorder:
+    # Appends trades one at a time into typed arrays; log() freezes them into
+    # a TradeLog
+    def __init__(self):
+        self._columns = {name: array(code) for name, code in COLUMNS}
+
+    def __len__(self):
+        return len(self._columns['entry_ms'])
+
+    def append(self, entry_ms, exit_ms, size, entry_price, profit, reason, buy=None, sell=None):
+        # buy / sell: (epoch ms, price, size) of the fills, None if missing
+        c = self._columns
+        c['entry_ms'].append(entry_ms)
+        c['exit_ms'].append(exit_ms)
+        c['size'].append(size)
+        c['entry_price'].append(entry_price)
+        c['profit'].append(profit)
+        c['reason'].append(reason_code(reason))
+        for side, fill in (('buy', buy), ('sell', sell)):
+            ms, price, fill_size = fill if fill is not None else (0, np.nan, np.nan)
+            c[f'{side}_ms'].append(ms)
+            c[f'{side}_price'].append(price)
+            c[f'{side}_size'].append(fill_size)
+
+    def log(self):
+        return TradeLog(**{name: np.frombuffer(values, dtype=DTYPES[code]) if len(values) else []
+                           for (name, code), values in zip(COLUMNS, self._columns.values())})
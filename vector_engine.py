@@ -0,0 +1,495 @@
+# vector_engine.py
+import numpy as np
+import pandas as pd
+import indicators
+from pine_params import resolve_params, filters_enabled, needs_atr, filter_key, htf_key
+from indicator_cache import INDICATORS, SOURCE_COLUMNS
+from resample import index_ms
+from trade_log import TradeLog, reason_code
+
+# Array implementation of PineStrategy + backtrader's BackBroker as configured
+# by backtesting.run_backtest: market orders of one unit that fill at the next
+# bar's open, percentage commission, 10000 starting cash, margin checks on
+# submission (at the signal bar's close) and on execution. Indicators and
+# signals are whole-array operations; only the exit state machine loops, and
+# it jumps from signal to signal instead of visiting every bar.
+
+DEFAULT_CASH = 10000.0
+DEFAULT_COMMISSION = 0.00055
+STAKE = 1
+
+
+def _series(df, cache=None):
+    # name, period -> indicator array (see indicator_cache.INDICATORS), via
+    # the cache when there is one and otherwise computed once per call here
+    if cache is not None:
+        bound = cache.bind(df) if hasattr(cache, 'bind') else cache
+        return bound.get
+    columns = {name: df[name].to_numpy(dtype=np.float64) for name in SOURCE_COLUMNS}
+    computed = {}
+
+    def get(name, period):
+        key = (name, int(period))
+        if key not in computed:
+            computed[key] = INDICATORS[name][0](columns, int(period))
+        return computed[key]
+    return get
+
+
+def compute_indicators(df, params, cache=None):
+    # cache is an optional indicator_cache.IndicatorCache (or a view already
+    # bound to df); cached arrays are shared, read-only and bit-identical.
+    # The ATR is only computed for the exits that use it.
+    series = _series(df, cache)
+    ind = {
+        'emaLongFast': series('ema', params['longTermFastLen']),
+        'emaLongSlow': series('ema', params['longTermSlowLen']),
+        'emaShortFast': series('ema', params['shortTermFastLen']),
+        'emaShortSlow': series('ema', params['shortTermSlowLen']),
+    }
+    if needs_atr(params):
+        ind['atr'] = series('atr', params['atrPeriod'])
+    return ind
+
+
+def first_bar(params):
+    # Index of the first bar PineStrategy.next() runs on (backtrader minperiod)
+    periods = [int(params['longTermFastLen']), int(params['longTermSlowLen']),
+               int(params['shortTermFastLen']), int(params['shortTermSlowLen'])]
+    if needs_atr(params):
+        periods.append(indicators.minperiod_atr(int(params['atrPeriod'])))
+    return max(periods) - 1
+
+
+def session_bounds(hours):
+    # "HHMM-HHMM" -> (start, end) in minutes of the UTC day
+    start, end = (int(t[:2]) * 60 + int(t[2:]) for t in hours.split('-'))
+    return start, end
+
+
+def session_mask(index, hours):
+    # Bars opening inside the session; an end before the start wraps past
+    # midnight
+    start, end = session_bounds(hours)
+    minute = index_ms(index) // 60_000 % 1440
+    if start <= end:
+        return (minute >= start) & (minute < end)
+    return (minute >= start) | (minute < end)
+
+
+def _has_filter_columns(df, key):
+    # Columns added by with_filter_columns for the same filter params
+    return 'filter_long' in df and df.attrs.get('filter_key') == key
+
+
+def _filter_masks(df, params, series):
+    key = filter_key(params)
+    if key is None:
+        return None
+    if _has_filter_columns(df, key):
+        return df['filter_long'].to_numpy() > 0, df['filter_short'].to_numpy() > 0
+    close = df['close'].to_numpy(dtype=np.float64)
+    ok = np.ones(len(close), dtype=bool)
+    # NaN comparisons are False, so no bar passes a filter before its
+    # indicator is warmed up
+    with np.errstate(invalid='ignore', divide='ignore'):
+        if params['useAdxFilter']:
+            ok &= series('adx', params['adxPeriod']) > params['adxThreshold']
+        if params['useVolumeFilter']:
+            ok &= df['volume'].to_numpy(dtype=np.float64) > series('volume_ma', params['volumeMALen'])
+        if params['useAtrFilter']:
+            ok &= series('atr', params['atrPeriod']) / close > params['atrFilterThreshold']
+        if params['enableSessionFilter']:
+            ok &= session_mask(df.index, params['sessionHours'])
+        long_ok, short_ok = ok, ok.copy()
+        if params['useRSIFilter']:
+            rsi = series('rsi', params['rsiPeriod'])
+            long_ok &= rsi > params['rsiLongThreshold']
+            short_ok &= rsi < params['rsiShortThreshold']
+    return long_ok, short_ok
+
+
+def filter_masks(df, params, cache=None):
+    # (long allowed, short allowed) per bar from the enabled entry filters:
+    # ADX above adxThreshold, volume above its volumeMALen SMA, RSI above
+    # rsiLongThreshold (longs) / below rsiShortThreshold (shorts), ATR over
+    # close above atrFilterThreshold, bar inside sessionHours. None with no
+    # filter enabled. Masks added by with_filter_columns for the same filter
+    # params are reused, so a slice of a prepared frame keeps its
+    # full-history warm-up; masks built for other params are not.
+    return _filter_masks(df, resolve_params(params), _series(df, cache))
+
+
+def with_filter_columns(df, params, cache=None):
+    # df plus filter_long / filter_short columns (1.0 or 0.0) when filters are
+    # enabled, for the backtrader feed (see strategy.PineData). The frame is
+    # tagged with the filter params' key in df.attrs, which slices keep.
+    params = resolve_params(params)
+    key = filter_key(params)
+    if key is None or _has_filter_columns(df, key):
+        return df
+    long_ok, short_ok = _filter_masks(df, params, _series(df, cache))
+    out = df.assign(filter_long=long_ok.astype(np.float64), filter_short=short_ok.astype(np.float64))
+    out.attrs = dict(df.attrs, filter_key=key)
+    return out
+
+
+def _htf_column(df, params):
+    # df's htf_trend, unless backtesting.prepare_frame built it for another
+    # higherTimeframe or long EMA pair (it tags the frame with htf_key)
+    if df is None or 'htf_trend' not in df or df.attrs.get('htf_key', htf_key(params)) != htf_key(params):
+        return None
+    return df['htf_trend'].to_numpy()
+
+
+def entry_signals(ind, params, df=None, cache=None):
+    lf, ls = ind['emaLongFast'], ind['emaLongSlow']
+    sf, ss = ind['emaShortFast'], ind['emaShortSlow']
+    n = len(lf)
+    long_sig = np.zeros(n, dtype=bool)
+    short_sig = np.zeros(n, dtype=bool)
+    if n < 2:
+        return long_sig, short_sig
+    # NaN comparisons are False, exactly like the warm-up bars in backtrader
+    with np.errstate(invalid='ignore'):
+        long_sig[1:] = (lf[1:] > ls[1:]) & (sf[1:] > ss[1:]) & (sf[:-1] <= ss[:-1])
+        short_sig[1:] = (lf[1:] < ls[1:]) & (sf[1:] < ss[1:]) & (sf[:-1] >= ss[:-1])
+    if params['enableHigherTFFilter']:
+        htf = _htf_column(df, params)
+        if htf is None:
+            raise ValueError("enableHigherTFFilter needs an htf_trend column built for these params "
+                             "(see backtesting.prepare_frame)")
+        long_sig &= htf > 0
+        short_sig &= htf < 0
+    if filters_enabled(params):
+        if df is None:
+            raise ValueError("Entry filters need the bars they are computed from")
+        long_ok, short_ok = _filter_masks(df, params, _series(df, cache))
+        long_sig &= long_ok
+        short_sig &= short_ok
+    return long_sig, short_sig
+
+
+def _first_hit(cond, start, n, chunk=256):
+    # First index >= start where cond(lo, hi) is True, scanning in chunks that
+    # double in size so short trades stay cheap and long ones stay vectorized.
+    while start < n:
+        stop = min(n, start + chunk)
+        hits = np.flatnonzero(cond(start, stop))
+        if len(hits):
+            return start + int(hits[0])
+        start = stop
+        chunk *= 2
+    return None
+
+
+def _bands(params, side, entry_price, atr, lo, hi):
+    # Stop and target of a position for bars lo..hi-1: scalars for fixed
+    # percentages, arrays where they follow the ATR
+    if params['exitMethod'] == "ATR":
+        stop_dist = params['atrStopLossFactor'] * atr[lo:hi]
+        target_dist = params['atrTakeProfitFactor'] * atr[lo:hi]
+        if side > 0:
+            return entry_price - stop_dist, entry_price + target_dist
+        return entry_price + stop_dist, entry_price - target_dist
+    if side > 0:
+        stop = entry_price * (1 - params['fixedStopLossPct'] / 100)
+        target = entry_price * (1 + params['fixedTakeProfitPct'] / 100)
+    else:
+        stop = entry_price * (1 + params['fixedStopLossPct'] / 100)
+        target = entry_price * (1 - params['fixedTakeProfitPct'] / 100)
+    if params['useAtrStopLoss']:
+        stop_dist = params['atrStopLossFactor'] * atr[lo:hi]
+        stop = entry_price - stop_dist if side > 0 else entry_price + stop_dist
+    return stop, target
+
+
+def _trailing_exit(close, side, start, params, trail, chunk=256):
+    # trail[0] is the best close since the entry fill (the fill price to
+    # begin with); it is carried across calls for the same position
+    n = len(close)
+    if side > 0:
+        keep, best = 1 - params['fixedTrailingPct'] / 100, np.maximum
+    else:
+        keep, best = 1 + params['fixedTrailingPct'] / 100, np.minimum
+    while start < n:
+        stop = min(n, start + chunk)
+        seg = close[start:stop]
+        extreme = best.accumulate(np.r_[trail[0], seg])[1:]
+        hits = np.flatnonzero(seg <= extreme * keep if side > 0 else seg >= extreme * keep)
+        if len(hits):
+            k = int(hits[0])
+            trail[0] = extreme[k]
+            return start + k, "Trailing Stop"
+        trail[0] = extreme[-1]
+        start = stop
+        chunk *= 2
+    return None, None
+
+
+def _exit(close, atr, side, entry_price, start, params, trail):
+    # First bar >= start whose close triggers the position's exit, and why
+    method = params['exitMethod']
+    if method == "Trailing":
+        return _trailing_exit(close, side, start, params, trail)
+    if method not in ("Fixed", "ATR"):
+        return None, None
+
+    def hit(lo, hi):
+        stop, target = _bands(params, side, entry_price, atr, lo, hi)
+        c = close[lo:hi]
+        return (c <= stop) | (c >= target) if side > 0 else (c >= stop) | (c <= target)
+    j = _first_hit(hit, start, len(close))
+    if j is None:
+        return None, None
+    stop, _ = _bands(params, side, entry_price, atr, j, j + 1)
+    stopped = np.any(close[j:j + 1] <= stop) if side > 0 else np.any(close[j:j + 1] >= stop)
+    return j, "Stop Loss" if stopped else "Take Profit"
+
+
+def simulate(open_, close, long_sig, short_sig, start, params, commission=DEFAULT_COMMISSION,
+             cash=DEFAULT_CASH, fills=None, state=None, atr=None):
+    # Returns (final cash, position size, entry price, trades). Each trade is
+    # (entry bar, exit bar, side, entry price, exit price, pnl, exit reason)
+    # with bars being the fill bars. Cash arithmetic follows BackBroker._execute
+    # step by step so final values match to the last bit. If a fills list is
+    # given, (bar, cash, position, entry price) after every fill is appended.
+    # A state dict carries the open position in ('pos', 'entry_price',
+    # 'entry_bar', 'extreme': the trailing stop's best close) and gets it back
+    # together with 'resume_at': the bar to restart from once more bars exist
+    # (a signal on the last bar is still waiting for its fill). atr is the
+    # ATR line, needed by the exits that use it (see needs_atr).
+    n = len(close)
+    entry_bars = np.flatnonzero(long_sig | short_sig)
+    trades = []
+    pos, entry_price, entry_bar = 0, 0.0, -1
+    if state:
+        pos, entry_price, entry_bar = state['pos'], state['entry_price'], state['entry_bar']
+    trail = [state.get('extreme', entry_price) if state else entry_price]
+    i = start
+    while i < n:
+        if pos == 0:
+            k = int(np.searchsorted(entry_bars, i))
+            if k == len(entry_bars):
+                i = n
+                break
+            s = int(entry_bars[k])
+            side = STAKE if long_sig[s] else -STAKE
+            # Submission check at the price the order was created with
+            price = close[s]
+            if (cash - side * price) - abs(side) * commission * price < 0.0:
+                i = s + 1
+                continue
+            if s + 1 >= n:
+                i = s
+                break
+            i = s + 1
+            price = open_[s + 1]
+            new_cash = (cash - side * price) - abs(side) * commission * price
+            if new_cash < 0.0:
+                continue
+            cash, pos, entry_price, entry_bar = new_cash, side, price, s + 1
+            trail[0] = price
+            if fills is not None:
+                fills.append((entry_bar, cash, pos, entry_price))
+        else:
+            j, reason = _exit(close, atr, pos, entry_price, i, params, trail)
+            if j is None:
+                i = n
+                break
+            size = -pos
+            price = close[j]
+            if (cash + (-size * price + 0)) - abs(size) * commission * price < 0.0:
+                i = j + 1
+                continue
+            if j + 1 >= n:
+                i = j
+                break
+            i = j + 1
+            price = open_[j + 1]
+            pnl = -size * (price - entry_price) * 1.0
+            cash += -size * entry_price + pnl
+            cash -= abs(size) * commission * price
+            trades.append((entry_bar, j + 1, pos, entry_price, price, pnl, reason))
+            pos, entry_price = 0, 0.0
+            if fills is not None:
+                fills.append((j + 1, cash, pos, entry_price))
+    if state is not None:
+        state.update(pos=pos, entry_price=entry_price, entry_bar=entry_bar, extreme=trail[0],
+                     resume_at=max(i, start))
+    return cash, pos, entry_price, trades
+
+
+def portfolio_value(cash, pos, entry_price, last_close):
+    # BackBroker._get_value with shortcash=True and leverage 1
+    if pos == 0:
+        return cash + 0.0
+    value = pos * last_close
+    if value > 0:
+        unrealized = pos * (last_close - entry_price) * 1.0
+        return cash + ((value - unrealized) / 1.0 + unrealized)
+    return cash + value
+
+
+def equity_curve(close, fills, cash=DEFAULT_CASH):
+    # Broker value at every bar's close, given simulate()'s fills. Uses the
+    # same operations as portfolio_value, element by element.
+    n = len(close)
+    bars = np.array([f[0] for f in fills], dtype=np.int64)
+    state = np.searchsorted(bars, np.arange(n), side='right')
+    cash_t = np.r_[cash, [f[1] for f in fills]][state]
+    pos_t = np.r_[0.0, [float(f[2]) for f in fills]][state]
+    entry_t = np.r_[0.0, [f[3] for f in fills]][state]
+    value = pos_t * close
+    unrealized = pos_t * (close - entry_t) * 1.0
+    equity = np.where(value > 0, cash_t + ((value - unrealized) / 1.0 + unrealized), cash_t + value)
+    return np.where(pos_t == 0, cash_t + 0.0, equity)
+
+
+def trade_log_from(trades, index):
+    # Same trades PineStrategy records, as a TradeLog. Its notify_order keeps
+    # the buy fill and the sell fill apart, whatever the trade's direction,
+    # so the entry fill is the buy of a long and the sell of a short.
+    if not trades:
+        return TradeLog()
+    entry_bar, exit_bar, side, entry_price, exit_price, pnl, reason = (np.array(c) for c in zip(*trades))
+    t = index_ms(index)
+    entry_ms, exit_ms = t[entry_bar], t[exit_bar]
+    side = side.astype(np.float64)
+    long_ = side > 0
+    return TradeLog(
+        entry_ms=entry_ms, exit_ms=exit_ms, size=np.zeros(len(trades)), entry_price=entry_price, profit=pnl,
+        reason=[reason_code(r) for r in reason],
+        buy_ms=np.where(long_, entry_ms, exit_ms), buy_price=np.where(long_, entry_price, exit_price),
+        buy_size=np.where(long_, side, -side),
+        sell_ms=np.where(long_, exit_ms, entry_ms), sell_price=np.where(long_, exit_price, entry_price),
+        sell_size=np.where(long_, -side, side),
+    )
+
+
+def run_vector_backtest(df, strategy_params=None, commission=DEFAULT_COMMISSION, cash=DEFAULT_CASH,
+                        cache=None):
+    params = resolve_params(strategy_params)
+    ind = compute_indicators(df, params, cache)
+    long_sig, short_sig = entry_signals(ind, params, df, cache)
+    open_ = df['open'].to_numpy(dtype=np.float64)
+    close = df['close'].to_numpy(dtype=np.float64)
+    final_cash, pos, entry_price, trades = simulate(
+        open_, close, long_sig, short_sig, first_bar(params), params, commission, cash, atr=ind.get('atr'))
+    final_value = portfolio_value(final_cash, pos, entry_price, close[-1]) if len(close) else cash
+    return cash, final_value, trade_log_from(trades, df.index)
+
+
+def run_vector_equity(df, strategy_params=None, commission=DEFAULT_COMMISSION, cash=DEFAULT_CASH,
+                      trade_from=0, cache=None):
+    # run_vector_backtest plus the equity curve (a Series on df's index).
+    # No signal before bar trade_from is acted on, so earlier bars only warm
+    # up the indicators, e.g. the training window ahead of a test window.
+    params = resolve_params(strategy_params)
+    ind = compute_indicators(df, params, cache)
+    long_sig, short_sig = entry_signals(ind, params, df, cache)
+    open_ = df['open'].to_numpy(dtype=np.float64)
+    close = df['close'].to_numpy(dtype=np.float64)
+    fills = []
+    final_cash, pos, entry_price, trades = simulate(
+        open_, close, long_sig, short_sig, max(first_bar(params), trade_from), params, commission, cash, fills,
+        atr=ind.get('atr'))
+    final_value = portfolio_value(final_cash, pos, entry_price, close[-1]) if len(close) else cash
+    equity = pd.Series(equity_curve(close, fills, cash), index=df.index, name='equity')
+    return cash, final_value, trade_log_from(trades, df.index), equity
+
+
+EMA_PARAMS = ('longTermFastLen', 'longTermSlowLen', 'shortTermFastLen', 'shortTermSlowLen')
+
+
+def _pair_masks(emas, pairs, n):
+    # For each distinct (fast, slow) period pair: fast above slow, fast below
+    # slow, crossed up on this bar, crossed down on this bar.
+    above = np.zeros((len(pairs), n), dtype=bool)
+    below = np.zeros((len(pairs), n), dtype=bool)
+    up = np.zeros((len(pairs), n), dtype=bool)
+    down = np.zeros((len(pairs), n), dtype=bool)
+    with np.errstate(invalid='ignore'):
+        for row, (fast, slow) in enumerate(pairs):
+            f, s = emas[fast], emas[slow]
+            above[row] = f > s
+            below[row] = f < s
+            up[row, 1:] = above[row, 1:] & (f[:-1] <= s[:-1])
+            down[row, 1:] = below[row, 1:] & (f[:-1] >= s[:-1])
+    return above, below, up, down
+
+
+def _batch_signals(emas, chunk, n, htf_trend, filters):
+    # (params x bars) signal matrices for one chunk. Masks are built once per
+    # distinct period pair in the chunk and broadcast to every parameter set
+    # that uses the pair.
+    trend_pairs = sorted({(int(p['longTermFastLen']), int(p['longTermSlowLen'])) for p in chunk})
+    cross_pairs = sorted({(int(p['shortTermFastLen']), int(p['shortTermSlowLen'])) for p in chunk})
+    bull, bear, _, _ = _pair_masks(emas, trend_pairs, n)
+    _, _, cross_up, cross_down = _pair_masks(emas, cross_pairs, n)
+    trend_idx = np.array([trend_pairs.index((int(p['longTermFastLen']), int(p['longTermSlowLen'])))
+                          for p in chunk])
+    cross_idx = np.array([cross_pairs.index((int(p['shortTermFastLen']), int(p['shortTermSlowLen'])))
+                          for p in chunk])
+    long_m = bull[trend_idx] & cross_up[cross_idx]
+    short_m = bear[trend_idx] & cross_down[cross_idx]
+    for row, params in enumerate(chunk):
+        if params['enableHigherTFFilter']:
+            trend = htf_trend(params)
+            long_m[row] &= trend > 0
+            short_m[row] &= trend < 0
+        if filters_enabled(params):
+            long_ok, short_ok = filters(params)
+            long_m[row] &= long_ok
+            short_m[row] &= short_ok
+    return long_m, short_m
+
+
+def run_vector_batch(df, param_sets, commission=DEFAULT_COMMISSION, cash=DEFAULT_CASH,
+                     chunk_size=32, timeframe=None, with_trades=True, cache=None):
+    # Evaluates many PineStrategy parameter sets over the same bars in one
+    # pass. Each distinct EMA period is computed once, signals are computed
+    # for chunk_size parameter sets at a time (bounding memory to a few
+    # chunk_size x bars matrices), and the exit state machine runs per set.
+    # Returns one (initial_value, final_value, trade_log) per parameter set,
+    # identical to run_vector_backtest. With with_trades=False the trade log
+    # is replaced by simulate()'s raw trade tuples, which skips formatting.
+    # With an indicator cache, indicators computed by earlier batches are
+    # reused.
+    resolved = [resolve_params(p) for p in param_sets]
+    open_ = df['open'].to_numpy(dtype=np.float64)
+    close = df['close'].to_numpy(dtype=np.float64)
+    n = len(close)
+    series = _series(df, cache)
+    periods = {int(p[name]) for p in resolved for name in EMA_PARAMS}
+    emas = {period: series('ema', period) for period in periods}
+
+    htf_cache = {}
+
+    def htf_trend(params):
+        # Each set's own trend, computed once per htf_key; without the bars'
+        # timeframe only a column built for the same key can stand in
+        key = htf_key(params)
+        if key not in htf_cache:
+            if timeframe is not None:
+                from resample import higher_tf_trend
+                htf_cache[key] = higher_tf_trend(df, timeframe, *key)
+            else:
+                htf_cache[key] = _htf_column(df, params)
+                if htf_cache[key] is None:
+                    raise ValueError("enableHigherTFFilter needs the bars' timeframe or an htf_trend column "
+                                     "built for these params")
+        return htf_cache[key]
+
+    results = []
+    for lo in range(0, len(resolved), chunk_size):
+        chunk = resolved[lo:lo + chunk_size]
+        long_m, short_m = _batch_signals(emas, chunk, n, htf_trend,
+                                         lambda params: _filter_masks(df, params, series))
+        for row, params in enumerate(chunk):
+            atr = series('atr', params['atrPeriod']) if needs_atr(params) else None
+            final_cash, pos, entry_price, trades = simulate(
+                open_, close, long_m[row], short_m[row], first_bar(params), params, commission, cash, atr=atr)
+            final_value = portfolio_value(final_cash, pos, entry_price, close[-1]) if n else cash
+            results.append((cash, final_value, trade_log_from(trades, df.index) if with_trades else trades))
+    return results
@@ -0,0 +1,175 @@
+# walk_forward.py
+import os
+import json
+import multiprocessing
+import numpy as np
+import pandas as pd
+from data import get_ohlcv
+from backtesting import COMMISSION, closed_bars
+from vector_engine import run_vector_equity, DEFAULT_CASH
+from indicator_cache import get_indicator_cache
+from result_cache import get_result_cache, bars_fingerprint
+from shared_data import SharedOHLCV, attach
+import ga_optimization
+
+# Walk-forward optimization: the GA is fitted on every training window and
+# its best params are then traded on the following, unseen test window.
+# Folds are optimized concurrently, one per pool worker; every worker maps
+# the whole history from shared memory and slices its fold out of it.
+# Finished folds are written to a JSON checkpoint so an interrupted run picks
+# up where it stopped.
+
+
+def make_folds(index, train='21D', test='7D', step=None):
+    # (train_lo, test_lo, test_hi) bar positions; training covers
+    # [train_lo, test_lo) and testing [test_lo, test_hi). Windows roll
+    # forward by `step` (default: the test length).
+    train, test = pd.Timedelta(train), pd.Timedelta(test)
+    step = pd.Timedelta(step) if step is not None else test
+    index = pd.DatetimeIndex(index)
+    folds = []
+    if len(index) < 2:
+        return folds
+    # Close time of the last bar
+    end = index[-1] + (index[-1] - index[-2])
+    train_start = index[0]
+    while train_start + train + test <= end:
+        train_lo, test_lo, test_hi = index.searchsorted([train_start, train_start + train,
+                                                         train_start + train + test])
+        if test_lo > train_lo and test_hi > test_lo:
+            folds.append((int(train_lo), int(test_lo), int(test_hi)))
+        train_start += step
+    return folds
+
+
+_history = None
+
+
+def _init_worker(handle):
+    global _history
+    _history = attach(handle)
+
+
+def run_fold(task):
+    # Optimize on the training slice, then trade the best params over the
+    # test slice with the training bars as indicator warm-up
+    fold, (train_lo, test_lo, test_hi), strategy_params, ga_kwargs, use_result_cache = task
+    if ga_kwargs.get('seed') is not None:
+        ga_kwargs = dict(ga_kwargs, seed=ga_kwargs['seed'] + fold)
+    train_df = _history.iloc[train_lo:test_lo]
+    result_cache = get_result_cache() if use_result_cache else None
+    train_value, best = ga_optimization.optimize_frame(
+        train_df, strategy_params, processes=1, result_cache=result_cache, **ga_kwargs)
+    params = dict(strategy_params, **best)
+    window = _history.iloc[train_lo:test_hi]
+    initial, final, trade_log, equity = run_vector_equity(
+        window, params, commission=COMMISSION, trade_from=test_lo - train_lo, cache=get_indicator_cache())
+    test_equity = equity.iloc[test_lo - train_lo:]
+    return {
+        'fold': fold,
+        'train_start': str(_history.index[train_lo]),
+        'test_start': str(_history.index[test_lo]),
+        'test_end': str(_history.index[test_hi - 1]),
+        'best_params': best,
+        'train_value': train_value,
+        'test_initial': initial,
+        'test_final': final,
+        'test_trades': len(trade_log),
+        'equity_ms': [int(t) for t in test_equity.index.as_unit('ms').asi8],
+        'equity': test_equity.tolist(),
+    }
+
+
+def _load_checkpoint(path, config):
+    if not path or not os.path.exists(path):
+        return {}
+    try:
+        with open(path) as f:
+            saved = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if saved.get('config') != config:
+        # Different data or settings; start over
+        return {}
+    return {int(k): v for k, v in saved.get('folds', {}).items()}
+
+
+def _save_checkpoint(path, config, done):
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump({'config': config, 'folds': {str(k): v for k, v in done.items()}}, f)
+    os.replace(tmp, path)
+
+
+def stitch(fold_results, cash=DEFAULT_CASH):
+    # Out-of-sample equity across folds: each fold's P&L is added on top of
+    # where the previous fold ended. With overlapping test windows a fold
+    # only contributes the bars before the next fold's test window.
+    pieces, offset = [], 0.0
+    ordered = sorted(fold_results, key=lambda r: r['fold'])
+    for k, result in enumerate(ordered):
+        times = np.asarray(result['equity_ms'], dtype=np.int64)
+        values = np.asarray(result['equity'], dtype=np.float64)
+        if k + 1 < len(ordered):
+            keep = times < ordered[k + 1]['equity_ms'][0]
+            times, values = times[keep], values[keep]
+        if not len(values):
+            continue
+        pieces.append(pd.Series(values + offset, index=pd.DatetimeIndex(times.view('datetime64[ms]'))))
+        offset += values[-1] - cash
+    if not pieces:
+        return pd.Series(dtype=np.float64, name='equity')
+    return pd.concat(pieces).rename('equity')
+
+
+def walk_forward_frame(df, train='21D', test='7D', step=None, strategy_params=None, processes=None,
+                       checkpoint=None, use_result_cache=True, progress=None, **ga_kwargs):
+    # Returns {'folds': [per-fold result, ...], 'equity': stitched out-of-sample Series}
+    strategy_params = dict(strategy_params or {})
+    ga_optimization.check_params(strategy_params)
+    folds = make_folds(df.index, train, test, step)
+    config = {
+        'fingerprint': bars_fingerprint(df),
+        'train': str(train), 'test': str(test), 'step': str(step),
+        'strategy_params': strategy_params,
+        'ga': ga_kwargs,
+        'folds': folds,
+    }
+    config = json.loads(json.dumps(config))
+    done = _load_checkpoint(checkpoint, config)
+    tasks = [(k, fold, strategy_params, ga_kwargs, use_result_cache)
+             for k, fold in enumerate(folds) if k not in done]
+
+    if tasks:
+        with SharedOHLCV(df) as shared:
+            with multiprocessing.Pool(min(processes or os.cpu_count() or 1, len(tasks)),
+                                      initializer=_init_worker, initargs=(shared.handle,)) as pool:
+                for result in pool.imap_unordered(run_fold, tasks):
+                    done[result['fold']] = result
+                    if checkpoint:
+                        _save_checkpoint(checkpoint, config, done)
+                    if progress is not None:
+                        progress(result, len(done), len(folds))
+
+    results = [done[k] for k in sorted(done)]
+    return {'folds': results, 'equity': stitch(results)}
+
+
+def walk_forward(symbol='BTCUSDT', timeframe='5m', start_str='3 months ago UTC', base_timeframe=None,
+                 train='21D', test='7D', step=None, strategy_params=None, processes=None, checkpoint=None,
+                 use_result_cache=True, progress=None, **ga_kwargs):
+    # ga_kwargs (population_size, generations, patience, seed) go to each
+    # fold's optimize_frame
+    ga_optimization.check_params(strategy_params)
+    df = get_ohlcv(symbol=symbol, interval=timeframe, start_str=start_str, base_interval=base_timeframe)
+    df = closed_bars(df, timeframe)
+    return walk_forward_frame(df, train, test, step, strategy_params, processes, checkpoint,
+                              use_result_cache, progress, **ga_kwargs)
+
+
+if __name__ == "__main__":
+    def report(result, finished, total):
+        print(f"fold {result['fold']} done ({finished}/{total}): test {result['test_start']} -> "
+              f"{result['test_end']}  final {result['test_final']:.2f}  {result['best_params']}")
+    out = walk_forward(checkpoint='walk_forward.json', progress=report)
+    print(out['equity'].iloc[-1] if len(out['equity']) else "no folds")